@@ -1,13 +1,33 @@
 import os
+import io
+import json
+import stat
+import mimetypes
+import unicodedata
+import socket
+import sqlite3
 import uuid
 import threading
 import time
 import random
-from datetime import datetime, timedelta
+import heapq
+import itertools
+import re
+import shutil
+import subprocess
+import math
+import hmac
+import importlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from enum import Enum
 from pathlib import Path
-import yt_dlp
-from flask import Flask, request, jsonify, send_file
+from urllib.parse import urlparse, parse_qs, quote
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, redirect
 from flask_cors import CORS
+from werkzeug.http import http_date
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -22,58 +42,2019 @@ CONFIG = {
     'DOWNLOADS_DIR': '/app/downloads',
     'CLEANUP_INTERVAL_HOURS': 24,
     'FILE_RETENTION_HOURS': 72,
-    'LOCAL_SERVER_URL': 'http://localhost:8000'
+    'LOCAL_SERVER_URL': 'http://localhost:8000',
+    'VIDEO_INFO_CACHE_MAX_ENTRIES': 256,
+    'VIDEO_INFO_CACHE_TTL_SECONDS': 3600,
+    'VIDEO_INFO_CACHE_ESTIMATE_TTL_SECONDS': 60,
+    'VIDEO_INFO_CACHE_URL_EXPIRY_MARGIN_SECONDS': 300,
+    'MAX_CONCURRENT_VIDEO_DOWNLOADS': 2,
+    'MAX_CONCURRENT_AUDIO_DOWNLOADS': 3,
+    'SCHEDULER_DURATION_WEIGHT': 0.5,  # queue seconds charged per second of media
+    'SCHEDULER_DEFAULT_DURATION': 600,
+    'SCHEDULER_INITIAL_SECONDS_PER_MEDIA_SECOND': 0.1,
+    'JOB_STORE': 'sqlite',  # 'sqlite' or 'memory'
+    'JOB_STORE_PATH': '/app/data/jobs.db',
+    'JOB_STORE_HEARTBEAT_SECONDS': 15,
+    'JOB_STORE_OWNER_LEASE_SECONDS': 60,
+    'PROGRESS_UPDATE_INTERVAL_SECONDS': 1.0,
+    'EVENT_STREAM_POLL_SECONDS': 2.0,  # store re-check for updates made by other worker processes
+    'EVENT_STREAM_KEEPALIVE_SECONDS': 15,
+    # 'sendfile' serves from this process (zero-copy under gunicorn), 'x-accel' and 'x-sendfile'
+    # hand the body to a front proxy, 'flask' is the plain send_file path
+    'FILE_SERVING_MODE': 'sendfile',
+    'X_ACCEL_REDIRECT_PREFIX': '/protected-downloads/',
+    'FILE_SERVING_CHUNK_BYTES': 1024 * 1024,
+    'STREAM_START_TIMEOUT_SECONDS': 30,
+    'STREAM_TAIL_POLL_SECONDS': 0.25,
+    'DOWNLOADS_MAX_BYTES': 50 * 1024 ** 3,
+    'PROTECTED_FILE_RECHECK_SECONDS': 300,
+    'YTDL_POOL_MAX_IDLE_PER_PROFILE': 4,
+    'BATCH_MAX_ITEMS': 500,
+    'STATUS_PAGE_DEFAULT_LIMIT': 100,
+    'STATUS_PAGE_MAX_LIMIT': 500,
+    # asgi.py serving mode
+    'ASYNC_INFO_WORKERS': 8,
+    'ASYNC_INFO_MAX_PENDING': 64,
+    'ASYNC_INFO_DEADLINE_SECONDS': 300,
+    'ASGI_WSGI_THREADS': 32,
+    'INFO_REFINEMENT_WORKERS': 4,
+    'INFO_REFINEMENT_TTL_SECONDS': 600,
+    'RETRY_BASE_DELAY_SECONDS': 2,
+    'RETRY_MAX_DELAY_SECONDS': 60,
+    'RETRY_MAX_ATTEMPTS': 5,
+    'INFO_RETRY_BUDGET_SECONDS': 90,
+    'DOWNLOAD_RETRY_BUDGET_SECONDS': 1800,
+    'CIRCUIT_BREAKER_THRESHOLD': 3,  # consecutive 429 responses that open the breaker
+    'CIRCUIT_BREAKER_COOLDOWN_SECONDS': 60,
+    'CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS': 900,
+    'BITRATE_MODEL_PATH': '/app/data/bitrates.db',  # None keeps learned bitrates in memory only
+    'BITRATE_MODEL_MIN_SAMPLES': 5,
+    'BITRATE_MODEL_MAX_RELATIVE_CI': 0.15,  # 95% interval half-width, relative to the mean, that counts as confident
+    'BITRATE_MODEL_REFRESH_SECONDS': 300,
+    'AUDIO_POSTPROCESS_WORKERS': None,  # concurrent ffmpeg encodes; None means one per CPU core
+    'AUDIO_POSTPROCESS_TIMEOUT_SECONDS': 1800,
+    'AUDIO_REMUX_BITRATE_TOLERANCE': 0.1,  # a source within this share of the requested bitrate, either way, is remuxed
+    # Download bandwidth in bytes per second; None is unlimited. Changeable at runtime through /api/admin/bandwidth
+    'BANDWIDTH_TOTAL_BYTES_PER_SECOND': None,
+    'BANDWIDTH_PER_ORIGIN_BYTES_PER_SECOND': None,  # cap for each client origin (Origin header, else remote address)
+    'BANDWIDTH_ORIGIN_BYTES_PER_SECOND': {},  # origin -> cap, overriding the per-origin default
+    'BANDWIDTH_WEIGHTS': {'video': 1, 'audio': 2, 'prefetch': 0.25},  # fair-share weight of a running job by type
+    'BANDWIDTH_BURST_SECONDS': 0.5,
+    'BANDWIDTH_REBALANCE_SECONDS': 1.0,
+    # Speculative download of the most requested format once /api/video_info has the exact formats
+    'PREFETCH_ENABLED': False,
+    'PREFETCH_WINDOW_SECONDS': 120,  # unrequested prefetches are cancelled and their partial files removed after this
+    'PREFETCH_MIN_HISTORY': 5,  # downloads seen before the most requested format is trusted
+    'PREFETCH_MAX_BYTES': 500 * 1024 ** 2,
+    'PREFETCH_MAX_CONCURRENT': 1,
+    'PREFETCH_MAX_PENDING': 8,
+    # Active jobs nobody has polled, streamed or subscribed to for this long are cancelled; None disables
+    'JOB_ABANDON_TIMEOUT_SECONDS': 1800,
+    'ADMIN_TOKEN': None,  # /api/admin/* requires "Authorization: Bearer <token>" and is disabled while unset
+    # Requests that need the job store wait this long for startup to open it before getting a 503
+    'STARTUP_REQUEST_WAIT_SECONDS': 10,
 }
 
-download_status = {}
-download_lock = threading.Lock()
-final_filenames_store = {}
+ACTIVE_JOB_STATUSES = ('pending', 'processing')
+TERMINAL_JOB_STATUSES = ('complete', 'failed')
+
+FFMPEG_PATH = shutil.which('ffmpeg')
+# Audio codec family -> (extension, ffmpeg muxer) for sources that are kept as they are
+AUDIO_REMUX_CONTAINERS = {'mp3': ('mp3', 'mp3'), 'mp4a': ('m4a', 'ipod')}
+# Files under a job's stem that a re-run picks up again: .part files, per-format intermediates and audio sources
+RESUMABLE_FILE_RE = re.compile(r'\.(?:part|f[\w-]+\.\w+|source\.\w+)$')
+
+class _LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    yt-dlp takes a large share of the process start-up time; with this, the HTTP
+    server binds and /health answers without it. First uses from several threads
+    wait for a single import: importing one package's submodules from two threads
+    at once can trip importlib's deadlock detection.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+yt_dlp = _LazyModule('yt_dlp')
+
+class MetricsRegistry:
+    """In-process counters and histograms rendered in the Prometheus text exposition format.
+
+    Hot paths only do a dict update under a lock; values that already live in
+    other components (cache, schedulers, catalog) are read by collectors at
+    scrape time.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> (type, help, buckets)
+        self._values = {}  # name -> {labels tuple: value, or [bucket counts..., sum, count] for histograms}
+        self._collectors = []
+
+    def counter(self, name, help_text):
+        self._metrics[name] = ('counter', help_text, None)
+        self._values[name] = {}
+
+    def histogram(self, name, help_text, buckets):
+        self._metrics[name] = ('histogram', help_text, tuple(buckets))
+        self._values[name] = {}
+
+    def register_collector(self, collector):
+        """collector() yields (name, type, help, [(labels dict, value), ...]) at scrape time"""
+        self._collectors.append(collector)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        buckets = self._metrics[name][2]
+        with self._lock:
+            series = self._values[name]
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ''
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in pairs) + '}'
+
+    def render(self):
+        lines = []
+        with self._lock:
+            snapshot = {name: {key: list(value) if isinstance(value, list) else value for key, value in series.items()}
+                        for name, series in self._values.items()}
+        for name, (metric_type, help_text, buckets) in self._metrics.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+            for key, value in snapshot[name].items():
+                if metric_type != 'histogram':
+                    lines.append(f'{name}{self._labels(key)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(key + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_bucket{self._labels(key + (("le", "+Inf"),))} {value[-1]}')
+                lines.append(f'{name}_sum{self._labels(key)} {round(value[-2], 6)}')
+                lines.append(f'{name}_count{self._labels(key)} {value[-1]}')
+        for collector in self._collectors:
+            for name, metric_type, help_text, samples in collector():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+                lines += [f'{name}{self._labels(tuple(sorted(labels.items())))} {value}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS = MetricsRegistry()
+METRICS.histogram('ytdl_extract_info_seconds', 'yt-dlp extract_info duration by option profile and outcome', LATENCY_BUCKETS)
+METRICS.histogram('format_resolution_seconds', 'Local format selector resolution time for one extraction', (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+METRICS.histogram('http_request_duration_seconds', 'Time to produce a response, by route', LATENCY_BUCKETS)
+METRICS.histogram('download_speed_bytes_per_second', 'Average speed of each finished yt-dlp download, by stream kind',
+                  (64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2))
+METRICS.counter('downloaded_bytes_total', 'Bytes fetched by yt-dlp, by stream kind')
+METRICS.histogram('postprocess_seconds', 'Merge and post-processing time, by postprocessor', (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300))
+METRICS.histogram('scheduler_queue_wait_seconds', 'Time jobs waited in a scheduler queue', (1, 5, 15, 60, 300, 900, 3600))
+METRICS.histogram('scheduler_job_seconds', 'Time a scheduler worker spent on a job', (1, 5, 15, 60, 300, 900, 3600))
+METRICS.counter('job_failures_total', 'Failed download jobs by type and classified cause')
+METRICS.counter('upstream_retries_total', 'Retries of upstream calls by classified cause')
+METRICS.counter('prefetch_jobs_total', 'Speculative downloads by outcome')
+METRICS.counter('jobs_cancelled_total', 'Jobs cancelled, by reason')
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class VideoInfoCache:
+    """Bounded TTL/LRU cache that coalesces concurrent lookups for the same key"""
+    def __init__(self, max_entries, ttl_for):
+        self.max_entries = max_entries
+        self.ttl_for = ttl_for
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            flight = self._in_flight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _InFlight()
+                self._in_flight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            ttl = self.ttl_for(flight.value)
+            if ttl > 0:
+                with self._lock:
+                    self._entries[key] = (time.time() + ttl, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.event.set()
+
+    def peek(self, key):
+        """Return a live cached value without computing or touching counters"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.time():
+                return entry[1]
+            return None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'in_flight': len(self._in_flight),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_ratio': round((self.hits + self.coalesced) / lookups, 3) if lookups else None,
+            }
+
+class DownloadScheduler:
+    """Fixed pool of worker threads fed from a priority queue.
+
+    Jobs are ordered by enqueue time plus a penalty proportional to media
+    duration, so short jobs overtake long ones without starving them.
+    """
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self._queue = []  # heap of (priority, seq, request_id)
+        self._jobs = {}  # request_id -> (target, args, media_seconds, enqueued_at)
+        self._running = {}  # request_id -> (started_at, estimated_seconds)
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self.seconds_per_media_second = CONFIG['SCHEDULER_INITIAL_SECONDS_PER_MEDIA_SECOND']
+
+        for i in range(max_workers):
+            threading.Thread(target=self._worker_loop, name=f"{name}-worker-{i}", daemon=True).start()
+
+    def submit(self, request_id, target, args, duration=None, queue_delay=0):
+        """queue_delay pushes the job back by that many seconds of queue priority"""
+        media_seconds = duration or CONFIG['SCHEDULER_DEFAULT_DURATION']
+        priority = time.time() + queue_delay + media_seconds * CONFIG['SCHEDULER_DURATION_WEIGHT']
+        with self._condition:
+            self._jobs[request_id] = (target, args, media_seconds, time.time())
+            heapq.heappush(self._queue, (priority, next(self._seq), request_id))
+            self._condition.notify()
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                while not self._queue:
+                    self._condition.wait()
+                _, _, request_id = heapq.heappop(self._queue)
+                target, args, media_seconds, enqueued_at = self._jobs.pop(request_id)
+                started_at = time.time()
+                self._running[request_id] = (started_at, media_seconds * self.seconds_per_media_second)
+            METRICS.observe('scheduler_queue_wait_seconds', started_at - enqueued_at, scheduler=self.name)
+
+            try:
+                target(*args)
+            except Exception as e:
+                print(f"Scheduler {self.name}: job {request_id} raised: {e}")
+            finally:
+                METRICS.observe('scheduler_job_seconds', time.time() - started_at, scheduler=self.name)
+                with self._condition:
+                    self._running.pop(request_id, None)
+                    observed = (time.time() - started_at) / media_seconds
+                    self.seconds_per_media_second = 0.8 * self.seconds_per_media_second + 0.2 * observed
+
+    def cancel(self, request_id):
+        """Drop a job that has not started yet; False if it is not queued here"""
+        with self._condition:
+            if self._jobs.pop(request_id, None) is None:
+                return False
+            self._queue = [item for item in self._queue if item[2] != request_id]
+            heapq.heapify(self._queue)
+            return True
+
+    def queue_info(self, request_id):
+        """Queue position and estimated start time for a job that has not started yet"""
+        with self._condition:
+            if request_id not in self._jobs:
+                return None
+            now = time.time()
+            worker_free_at = [
+                max(started_at + estimated, now) for started_at, estimated in self._running.values()
+            ]
+            worker_free_at += [now] * (self.max_workers - len(worker_free_at))
+            heapq.heapify(worker_free_at)
+
+            for position, (_, _, queued_id) in enumerate(sorted(self._queue), start=1):
+                start_at = heapq.heappop(worker_free_at)
+                if queued_id == request_id:
+                    return {'queue_position': position, 'estimated_start_at': datetime.fromtimestamp(start_at).isoformat()}
+                queued_seconds = self._jobs[queued_id][2] * self.seconds_per_media_second
+                heapq.heappush(worker_free_at, start_at + queued_seconds)
+            return None
+
+    def stats(self):
+        with self._condition:
+            return {'max_workers': self.max_workers, 'running': len(self._running), 'queued': len(self._queue)}
+
+class InfoRefinement:
+    """Video info for one background lookup, filled in as the extraction and each format resolve"""
+    def __init__(self, video_id):
+        self.video_id = video_id
+        self.status = 'pending'
+        self.info = {}
+        self.version = 0
+        self.created_at = time.time()
+        self._condition = threading.Condition()
+
+    def update(self, fields, status=None):
+        with self._condition:
+            for key, value in fields.items():
+                if key in ('video_formats', 'audio_formats') and key in self.info:
+                    self.info[key] = {**self.info[key], **value}
+                else:
+                    self.info[key] = value
+            if status:
+                self.status = status
+            self.version += 1
+            self._condition.notify_all()
+
+    def snapshot(self):
+        with self._condition:
+            info = {key: dict(value) if isinstance(value, dict) else value for key, value in self.info.items()}
+            return {'video_id': self.video_id, 'status': self.status, 'version': self.version, 'info': info}
+
+    def wait(self, version, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+class Prefetch:
+    """A speculative download waiting for the request it anticipates"""
+    def __init__(self, request_id, job_type, timer):
+        self.request_id = request_id
+        self.job_type = job_type
+        self.timer = timer  # cancels the download when the window closes
+
+class StatusBroker:
+    """Wakes event stream subscribers when any job status changes in this process"""
+    def __init__(self):
+        self.version = 0
+        self._condition = threading.Condition()
+
+    def publish(self):
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def wait(self, version, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+class JobStore:
+    """Persistence for download job status entries.
+
+    Entries are the JSON-ready dicts served by the status endpoints. A job
+    created with a job_key while an active job with the same key exists is
+    stored as a follower of it and receives every later update of that job.
+
+    Cancel requests and watch times are kept apart from the entries: they are
+    signals between worker processes, not part of the status clients see.
+    """
+    ALL_JOBS = '*'  # watch key for a listing of every job
+
+    def create(self, request_id, entry, job_key=None, owner=None):
+        """Store a new entry; return the primary request_id if it was attached to one"""
+        raise NotImplementedError
+
+    def update(self, request_id, mutate):
+        """Apply mutate(entry) to the job and its followers"""
+        raise NotImplementedError
+
+    def detach(self, request_id, mutate):
+        """Stop a follower receiving its primary's updates and apply mutate(entry) to it alone"""
+        raise NotImplementedError
+
+    def followers(self, request_id):
+        """request_ids of the jobs attached to this one"""
+        raise NotImplementedError
+
+    def request_cancel(self, request_id, message):
+        """Ask whichever process runs this active job to stop it; False if it is not active or already asked"""
+        raise NotImplementedError
+
+    def cancel_requests(self, request_ids):
+        """Messages of the cancel requests recorded for the given jobs, as {request_id: message}"""
+        raise NotImplementedError
+
+    def mark_watched(self, request_ids, ts):
+        """Record that a client asked about these jobs (or ALL_JOBS) at ts"""
+        raise NotImplementedError
+
+    def watched_at(self, request_ids):
+        """Last time each of the given jobs (or ALL_JOBS) was marked watched, as {request_id: ts}"""
+        raise NotImplementedError
+
+    def get(self, request_id):
+        raise NotImplementedError
+
+    def all(self):
+        raise NotImplementedError
+
+    def version(self):
+        """Counter bumped by every change and removal; while it is unchanged so is every listing"""
+        raise NotImplementedError
+
+    def changes(self, since=0, limit=None, status=None, job_type=None, video_id=None):
+        """Jobs whose last change is after version `since`, oldest change first, as [(version, request_id, entry)]"""
+        raise NotImplementedError
+
+    def get_many(self, request_ids):
+        """Entries of the given jobs that still exist, as {request_id: entry}"""
+        raise NotImplementedError
+
+    def active_job(self, job_key):
+        """request_id of the active primary job with this key, if any"""
+        raise NotImplementedError
+
+    def create_batch(self, batch_id, entry):
+        raise NotImplementedError
+
+    def get_batch(self, batch_id):
+        raise NotImplementedError
+
+    def delete_created_before(self, cutoff_ts):
+        """Remove jobs and batches created before cutoff_ts"""
+        raise NotImplementedError
+
+    def heartbeat(self, owner):
+        pass
+
+    def claim_orphans(self, owner, lease_seconds):
+        """Take over active primary jobs whose owning process stopped heartbeating"""
+        return []
+
+class JobStatus(Enum):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+
+    @property
+    def active(self):
+        return self.value in ACTIVE_JOB_STATUSES
+
+class JobRecord:
+    """One job in MemoryJobStore.
+
+    entry is the working dict and is only touched under the job's stripe lock;
+    snapshot is the published copy, replaced whole after every change so status
+    reads need no lock.
+    """
+    __slots__ = ('request_id', 'job_key', 'primary_id', 'status', 'created_ts', 'updated_ts', 'version', 'entry', 'snapshot')
+
+    def __init__(self, request_id, entry, job_key, primary_id, created_ts):
+        self.request_id = request_id
+        self.job_key = job_key
+        self.primary_id = primary_id
+        self.status = JobStatus(entry['status'])
+        self.created_ts = created_ts
+        self.updated_ts = created_ts
+        self.version = 0
+        self.entry = entry
+        self.snapshot = None
+
+    def render(self):
+        return {
+            **self.entry,
+            'status': self.status.value,
+            'created_at': datetime.fromtimestamp(self.created_ts).isoformat(),
+            'updated_at': datetime.fromtimestamp(self.updated_ts).isoformat(),
+        }
+
+class MemoryJobStore(JobStore):
+    """Process-local store; state is lost on restart and not shared between workers.
+
+    A job and its followers share one of STRIPES locks, so updates of different
+    jobs don't contend. _index_lock only guards the job maps and the change
+    index, and is never held while waiting for a stripe.
+    """
+    STRIPES = 64
+
+    def __init__(self):
+        self._jobs = {}  # request_id -> JobRecord
+        self._followers = {}  # primary request_id -> follower request_ids
+        self._active_by_key = {}  # job_key -> request_id of the active primary job
+        self._batches = {}  # batch_id -> {'entry', 'created_ts'}
+        self._cancel_requested = {}  # request_id -> message of the cancel request for it
+        self._watches = {}  # request_id or ALL_JOBS -> last time a client asked about it
+        self._by_version = OrderedDict()  # request_id -> version of its last change, oldest change first
+        self._version = 0
+        self._index_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(self.STRIPES)]
+
+    def _stripe(self, primary_id):
+        return self._stripes[hash(primary_id) % self.STRIPES]
+
+    def _publish(self, record):
+        snapshot = record.render()
+        with self._index_lock:
+            if self._jobs.get(record.request_id) is not record:
+                return  # removed by cleanup meanwhile
+            # Set together so a change listed under a version always shows the state of that version
+            self._version += 1
+            record.version = self._version
+            record.snapshot = snapshot
+            self._by_version[record.request_id] = record.version
+            self._by_version.move_to_end(record.request_id)
+
+    def create(self, request_id, entry, job_key=None, owner=None):
+        entry = dict(entry)
+        now = time.time()
+        while True:
+            with self._index_lock:
+                primary_id = self._active_by_key.get(job_key) if job_key else None
+                if not primary_id:
+                    record = JobRecord(request_id, entry, job_key, None, now)
+                    self._jobs[request_id] = record
+                    if job_key and record.status.active:
+                        self._active_by_key[job_key] = request_id
+                    break
+            with self._stripe(primary_id):
+                primary = self._jobs.get(primary_id)
+                if not primary or not primary.status.active:
+                    continue  # finished while we waited for its stripe; look again
+                entry['status'] = primary.entry['status']
+                entry['message'] = primary.entry['message']
+                entry['attached_to'] = primary_id
+                record = JobRecord(request_id, entry, job_key, primary_id, now)
+                with self._index_lock:
+                    self._jobs[request_id] = record
+                    self._followers.setdefault(primary_id, []).append(request_id)
+                self._publish(record)
+                return primary_id
+        self._publish(record)
+        return None
+
+    def update(self, request_id, mutate):
+        record = self._jobs.get(request_id)
+        if not record:
+            return
+        with self._stripe(record.primary_id or request_id):
+            now = time.time()
+            targets = [record] + [self._jobs[rid] for rid in self._followers.get(request_id, ()) if rid in self._jobs]
+            for target in targets:
+                mutate(target.entry)
+                target.status = JobStatus(target.entry['status'])
+                target.updated_ts = now
+                self._publish(target)
+            if not record.status.active and record.job_key:
+                with self._index_lock:
+                    if self._active_by_key.get(record.job_key) == request_id:
+                        del self._active_by_key[record.job_key]
+
+    def detach(self, request_id, mutate):
+        record = self._jobs.get(request_id)
+        if not record or not record.primary_id:
+            return
+        with self._stripe(record.primary_id):
+            with self._index_lock:
+                followers = self._followers.get(record.primary_id, [])
+                if request_id in followers:
+                    followers.remove(request_id)
+            # Later updates of this record take its own stripe
+            record.primary_id = None
+            record.job_key = None
+            record.entry.pop('attached_to', None)
+            mutate(record.entry)
+            record.status = JobStatus(record.entry['status'])
+            record.updated_ts = time.time()
+            self._publish(record)
+
+    def followers(self, request_id):
+        return list(self._followers.get(request_id, ()))
+
+    def request_cancel(self, request_id, message):
+        record = self._jobs.get(request_id)
+        if not record or not record.status.active:
+            return False
+        with self._index_lock:
+            if request_id in self._cancel_requested:
+                return False
+            self._cancel_requested[request_id] = message
+            return True
+
+    def cancel_requests(self, request_ids):
+        requested = self._cancel_requested.copy()
+        return {request_id: requested[request_id] for request_id in request_ids if request_id in requested}
+
+    def mark_watched(self, request_ids, ts):
+        with self._index_lock:
+            for request_id in request_ids:
+                self._watches[request_id] = max(ts, self._watches.get(request_id, 0))
+
+    def watched_at(self, request_ids):
+        watches = self._watches.copy()
+        return {request_id: watches[request_id] for request_id in request_ids if request_id in watches}
+
+    def get(self, request_id):
+        record = self._jobs.get(request_id)
+        return dict(record.snapshot) if record and record.snapshot else None
+
+    def all(self):
+        # dict.copy() is atomic, so this needs no lock; snapshots are never mutated
+        return {request_id: dict(record.snapshot) for request_id, record in self._jobs.copy().items() if record.snapshot}
+
+    def version(self):
+        return self._version
+
+    def active_job(self, job_key):
+        return self._active_by_key.get(job_key)
+
+    def changes(self, since=0, limit=None, status=None, job_type=None, video_id=None):
+        with self._index_lock:
+            changed = []
+            for request_id, version in reversed(self._by_version.items()):
+                if version <= since:
+                    break
+                record = self._jobs[request_id]
+                changed.append((version, record, record.snapshot))
+        results = []
+        for version, record, entry in reversed(changed):
+            if ((status and entry['status'] != status) or (job_type and entry.get('type') != job_type)
+                    or (video_id and entry.get('video_id') != video_id)):
+                continue
+            results.append((version, record.request_id, dict(entry)))
+            if limit and len(results) >= limit:
+                break
+        return results
+
+    def get_many(self, request_ids):
+        records = (self._jobs.get(request_id) for request_id in request_ids)
+        return {record.request_id: dict(record.snapshot) for record in records if record and record.snapshot}
+
+    def create_batch(self, batch_id, entry):
+        with self._index_lock:
+            self._batches[batch_id] = {'entry': entry, 'created_ts': time.time()}
+
+    def get_batch(self, batch_id):
+        batch = self._batches.get(batch_id)
+        return dict(batch['entry']) if batch else None
+
+    def delete_created_before(self, cutoff_ts):
+        with self._index_lock:
+            old_jobs = [request_id for request_id, record in self._jobs.items() if record.created_ts < cutoff_ts]
+            for request_id in old_jobs:
+                record = self._jobs.pop(request_id)
+                self._by_version.pop(request_id, None)
+                self._followers.pop(request_id, None)
+                self._cancel_requested.pop(request_id, None)
+                self._watches.pop(request_id, None)
+                if record.job_key and self._active_by_key.get(record.job_key) == request_id:
+                    del self._active_by_key[record.job_key]
+            old_batches = [batch_id for batch_id, batch in self._batches.items() if batch['created_ts'] < cutoff_ts]
+            for batch_id in old_batches:
+                del self._batches[batch_id]
+            removed = len(old_jobs) + len(old_batches)
+            if removed:
+                self._version += 1
+            return removed
+
+class SQLiteJobStore(JobStore):
+    """Job store in an embedded SQLite database (WAL mode), shareable between worker processes"""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            request_id TEXT PRIMARY KEY,
+            job_key TEXT,
+            attached_to TEXT,
+            owner TEXT,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            data TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            cancel_requested TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+        CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_job_key ON jobs(job_key, status);
+        CREATE INDEX IF NOT EXISTS idx_jobs_attached_to ON jobs(attached_to);
+        CREATE TABLE IF NOT EXISTS owners (
+            owner TEXT PRIMARY KEY,
+            heartbeat_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS batches (
+            batch_id TEXT PRIMARY KEY,
+            created_at REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_batches_created_at ON batches(created_at);
+        CREATE TABLE IF NOT EXISTS watches (
+            request_id TEXT PRIMARY KEY,
+            watched_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO counters (name, value) VALUES ('jobs_version', 0);
+    """
+    MAX_QUERY_PARAMS = 500  # stays below SQLITE_MAX_VARIABLE_NUMBER on old SQLite builds
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+        if 'version' not in columns:
+            # Databases created before change versions were tracked
+            conn.execute('ALTER TABLE jobs ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        if 'cancel_requested' not in columns:
+            # Databases created before cancel requests were shared between workers
+            conn.execute('ALTER TABLE jobs ADD COLUMN cancel_requested TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_version ON jobs(version)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    def _select_in(self, query, request_ids):
+        """Rows of `query`, whose single {} placeholder takes a list of request_ids, over all the given ids"""
+        request_ids = list(request_ids)
+        rows = []
+        conn = self._conn()
+        for start in range(0, len(request_ids), self.MAX_QUERY_PARAMS):
+            chunk = request_ids[start:start + self.MAX_QUERY_PARAMS]
+            rows.extend(conn.execute(query.format(', '.join('?' * len(chunk))), chunk).fetchall())
+        return rows
+
+    @staticmethod
+    def _next_versions(conn, count):
+        """Reserve count change versions; callers hold the write transaction, so versions commit in order"""
+        conn.execute("UPDATE counters SET value = value + ? WHERE name = 'jobs_version'", (count,))
+        end = conn.execute("SELECT value FROM counters WHERE name = 'jobs_version'").fetchone()[0]
+        return iter(range(end - count + 1, end + 1))
+
+    def create(self, request_id, entry, job_key=None, owner=None):
+        conn = self._transaction()
+        try:
+            primary_id = None
+            if job_key:
+                row = conn.execute(
+                    "SELECT request_id, data FROM jobs WHERE job_key = ? AND attached_to IS NULL "
+                    "AND status IN ('pending', 'processing') LIMIT 1", (job_key,)
+                ).fetchone()
+                if row:
+                    primary_id, primary_data = row[0], json.loads(row[1])
+                    entry['status'] = primary_data['status']
+                    entry['message'] = primary_data['message']
+                    entry['attached_to'] = primary_id
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (request_id, job_key, attached_to, owner, status, created_at, updated_at, data, version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (request_id, job_key, primary_id, None if primary_id else owner, entry['status'], now, now,
+                 json.dumps(entry), next(self._next_versions(conn, 1)))
+            )
+            conn.execute('COMMIT')
+            return primary_id
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def update(self, request_id, mutate):
+        conn = self._transaction()
+        try:
+            rows = conn.execute(
+                "SELECT request_id, data FROM jobs WHERE request_id = ? OR attached_to = ?", (request_id, request_id)
+            ).fetchall()
+            now = time.time()
+            versions = self._next_versions(conn, len(rows)) if rows else None
+            for rid, data in rows:
+                entry = json.loads(data)
+                mutate(entry)
+                entry['updated_at'] = datetime.fromtimestamp(now).isoformat()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, data = ?, version = ? WHERE request_id = ?",
+                    (entry['status'], now, json.dumps(entry), next(versions), rid)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def detach(self, request_id, mutate):
+        conn = self._transaction()
+        try:
+            row = conn.execute(
+                "SELECT data FROM jobs WHERE request_id = ? AND attached_to IS NOT NULL", (request_id,)
+            ).fetchone()
+            if row:
+                now = time.time()
+                entry = json.loads(row[0])
+                entry.pop('attached_to', None)
+                mutate(entry)
+                entry['updated_at'] = datetime.fromtimestamp(now).isoformat()
+                # Without its job key it can never be mistaken for the primary of a new request
+                conn.execute(
+                    "UPDATE jobs SET attached_to = NULL, job_key = NULL, status = ?, updated_at = ?, data = ?, version = ? "
+                    "WHERE request_id = ?",
+                    (entry['status'], now, json.dumps(entry), next(self._next_versions(conn, 1)), request_id)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def followers(self, request_id):
+        rows = self._conn().execute("SELECT request_id FROM jobs WHERE attached_to = ?", (request_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def request_cancel(self, request_id, message):
+        # No version bump: the entry clients see changes only once the owner has stopped the job
+        return self._conn().execute(
+            "UPDATE jobs SET cancel_requested = ? WHERE request_id = ? AND cancel_requested IS NULL "
+            "AND status IN ('pending', 'processing')", (message, request_id)
+        ).rowcount == 1
+
+    def cancel_requests(self, request_ids):
+        return dict(self._select_in(
+            "SELECT request_id, cancel_requested FROM jobs WHERE cancel_requested IS NOT NULL AND request_id IN ({})", request_ids
+        ))
+
+    def mark_watched(self, request_ids, ts):
+        conn = self._transaction()
+        try:
+            conn.executemany(
+                "INSERT INTO watches (request_id, watched_at) VALUES (?, ?) "
+                "ON CONFLICT(request_id) DO UPDATE SET watched_at = max(watched_at, excluded.watched_at)",
+                [(request_id, ts) for request_id in request_ids]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def watched_at(self, request_ids):
+        return dict(self._select_in("SELECT request_id, watched_at FROM watches WHERE request_id IN ({})", request_ids))
+
+    def active_job(self, job_key):
+        row = self._conn().execute(
+            "SELECT request_id FROM jobs WHERE job_key = ? AND attached_to IS NULL "
+            "AND status IN ('pending', 'processing') LIMIT 1", (job_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, request_id):
+        row = self._conn().execute("SELECT data FROM jobs WHERE request_id = ?", (request_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        rows = self._conn().execute("SELECT request_id, data FROM jobs ORDER BY created_at").fetchall()
+        return {request_id: json.loads(data) for request_id, data in rows}
+
+    def version(self):
+        return self._conn().execute("SELECT value FROM counters WHERE name = 'jobs_version'").fetchone()[0]
+
+    def changes(self, since=0, limit=None, status=None, job_type=None, video_id=None):
+        query = "SELECT version, request_id, data FROM jobs WHERE version > ?"
+        params = [since]
+        if status:
+            query += " AND status = ?"
+            params.append(status)
+        if job_type:
+            query += " AND json_extract(data, '$.type') = ?"
+            params.append(job_type)
+        if video_id:
+            query += " AND json_extract(data, '$.video_id') = ?"
+            params.append(video_id)
+        query += " ORDER BY version"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._conn().execute(query, params).fetchall()
+        return [(version, request_id, json.loads(data)) for version, request_id, data in rows]
+
+    def get_many(self, request_ids):
+        rows = self._select_in("SELECT request_id, data FROM jobs WHERE request_id IN ({})", request_ids)
+        return {request_id: json.loads(data) for request_id, data in rows}
+
+    def create_batch(self, batch_id, entry):
+        self._conn().execute(
+            "INSERT INTO batches (batch_id, created_at, data) VALUES (?, ?, ?)", (batch_id, time.time(), json.dumps(entry))
+        )
+
+    def get_batch(self, batch_id):
+        row = self._conn().execute("SELECT data FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_created_before(self, cutoff_ts):
+        conn = self._transaction()
+        try:
+            removed = conn.execute("DELETE FROM jobs WHERE created_at < ?", (cutoff_ts,)).rowcount
+            if removed:
+                self._next_versions(conn, 1)
+            removed += conn.execute("DELETE FROM batches WHERE created_at < ?", (cutoff_ts,)).rowcount
+            conn.execute(
+                "DELETE FROM watches WHERE request_id != ? AND request_id NOT IN (SELECT request_id FROM jobs)", (self.ALL_JOBS,)
+            )
+            conn.execute('COMMIT')
+            return removed
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def heartbeat(self, owner):
+        self._conn().execute(
+            "INSERT INTO owners (owner, heartbeat_at) VALUES (?, ?) "
+            "ON CONFLICT(owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+            (owner, time.time())
+        )
+
+    def claim_orphans(self, owner, lease_seconds):
+        conn = self._transaction()
+        try:
+            live_after = time.time() - lease_seconds
+            rows = conn.execute(
+                "SELECT request_id, data FROM jobs WHERE status IN ('pending', 'processing') AND attached_to IS NULL "
+                "AND (owner IS NULL OR owner NOT IN (SELECT owner FROM owners WHERE heartbeat_at >= ?))",
+                (live_after,)
+            ).fetchall()
+            conn.executemany("UPDATE jobs SET owner = ? WHERE request_id = ?", [(owner, rid) for rid, _ in rows])
+            conn.execute("DELETE FROM owners WHERE heartbeat_at < ?", (live_after,))
+            conn.execute('COMMIT')
+            return [(rid, json.loads(data)) for rid, data in rows]
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+def create_job_store():
+    if CONFIG['JOB_STORE'] == 'memory':
+        return MemoryJobStore()
+    return SQLiteJobStore(CONFIG['JOB_STORE_PATH'])
+
+class FileCatalog:
+    """Size, last access and expiry of every file in the downloads directory.
+
+    Expiry times live in a heap so the cleanup loop only looks at files that are
+    due, and the byte quota is enforced at write time by evicting the least
+    recently used files. Files are grouped by stem ({video_id}_{format}, shared
+    by a job's .part, intermediate and final files); protected stems are never
+    removed.
+    """
+    def __init__(self, directory, max_bytes, retention_seconds):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.retention_seconds = retention_seconds
+        self._files = OrderedDict()  # name -> (size, last_access, expires_at), least recently used first
+        self._expiry_heap = []  # (expires_at, name); stale items are skipped when popped
+        self._protected = {}  # stem -> reference count
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evicted_files = 0
+        self.expired_files = 0
+        self.rescan()
+
+    @staticmethod
+    def stem_of(name):
+        return name.split('.', 1)[0]
+
+    def rescan(self):
+        """Rebuild from disk, keeping known access times (startup, and changes made by other processes)"""
+        on_disk = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    file_stat = entry.stat()
+                    on_disk[entry.name] = (file_stat.st_size, file_stat.st_mtime)
+        with self._lock:
+            known = self._files
+            files = []
+            for name, (size, mtime) in on_disk.items():
+                last_access = max(mtime, known[name][1]) if name in known else mtime
+                files.append((last_access, name, size))
+            self._files = OrderedDict()
+            self._expiry_heap = []
+            self.total_bytes = 0
+            for last_access, name, size in sorted(files):
+                self._add_locked(name, size, last_access)
+
+    def _add_locked(self, name, size, last_access):
+        previous = self._files.pop(name, None)
+        if previous:
+            self.total_bytes -= previous[0]
+        expires_at = last_access + self.retention_seconds
+        self._files[name] = (size, last_access, expires_at)
+        self.total_bytes += size
+        heapq.heappush(self._expiry_heap, (expires_at, name))
+
+    def _delete_locked(self, name):
+        size = self._files.pop(name)[0]
+        self.total_bytes -= size
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing file {name}: {e}")
+
+    def _is_protected_locked(self, name):
+        return self._protected.get(self.stem_of(name), 0) > 0
+
+    def record_write(self, path):
+        """Register a newly written file and evict older ones if the quota is now exceeded"""
+        path = Path(path)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._add_locked(path.name, size, time.time())
+        self.make_room(0)
+
+    def touch(self, name):
+        with self._lock:
+            entry = self._files.get(name)
+            if entry:
+                self._add_locked(name, entry[0], time.time())
+
+    def remove(self, name):
+        with self._lock:
+            entry = self._files.pop(name, None)
+            if entry:
+                self.total_bytes -= entry[0]
+
+    def protect(self, stem):
+        with self._lock:
+            self._protected[stem] = self._protected.get(stem, 0) + 1
+
+    def release(self, stem):
+        with self._lock:
+            remaining = self._protected.get(stem, 0) - 1
+            if remaining > 0:
+                self._protected[stem] = remaining
+            else:
+                self._protected.pop(stem, None)
+
+    def make_room(self, incoming_bytes):
+        """Evict least recently used unprotected files until incoming_bytes fit under the quota"""
+        evicted = 0
+        with self._lock:
+            for name in list(self._files):
+                if self.total_bytes + incoming_bytes <= self.max_bytes:
+                    break
+                if self._is_protected_locked(name):
+                    continue
+                self._delete_locked(name)
+                evicted += 1
+            self.evicted_files += evicted
+        if evicted:
+            print(f"Quota eviction removed {evicted} file(s); {self.total_bytes / 1024 ** 3:.2f} GB in use")
+        return evicted
+
+    def evict_expired(self):
+        """Remove files past their expiry; returns (removed count, next expiry timestamp or None)"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, name = heapq.heappop(self._expiry_heap)
+                entry = self._files.get(name)
+                if not entry or entry[2] != expires_at:
+                    continue
+                if self._is_protected_locked(name):
+                    recheck_at = now + CONFIG['PROTECTED_FILE_RECHECK_SECONDS']
+                    self._files[name] = (entry[0], entry[1], recheck_at)
+                    heapq.heappush(self._expiry_heap, (recheck_at, name))
+                    continue
+                self._delete_locked(name)
+                removed += 1
+            self.expired_files += removed
+            next_expiry = self._expiry_heap[0][0] if self._expiry_heap else None
+        return removed, next_expiry
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'protected_stems': len(self._protected),
+                'evicted_files': self.evicted_files,
+                'expired_files': self.expired_files,
+            }
+
+class BitrateModel:
+    """Learned bytes per media second, by (kind, format, codec family, duration bucket).
+
+    Samples come from completed downloads and from exact sizes in resolved
+    format lists. Each key keeps a running count, mean and sum of squared
+    deviations (Welford), persisted in SQLite so worker processes share what
+    they learn. Estimates pool codecs when the codec is unknown and widen to
+    all durations when a bucket has too few samples.
+    """
+    DURATION_BUCKETS = (300, 1200, 3600, 7200)  # upper bounds in seconds; longer media goes in the last bucket
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rates (
+            kind TEXT NOT NULL,
+            format INTEGER NOT NULL,
+            codec TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (kind, format, codec, bucket)
+        );
+    """
+
+    def __init__(self, path, min_samples, max_relative_ci, refresh_seconds):
+        self.min_samples = max(min_samples, 2)
+        self.max_relative_ci = max_relative_ci
+        self.refresh_seconds = refresh_seconds
+        self._stats = {}  # (kind, format, codec, bucket) -> (n, mean, m2)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._refreshed_at = 0
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.executescript(self.SCHEMA)
+            self.refresh()
+
+    @classmethod
+    def bucket_of(cls, duration):
+        return sum(duration > bound for bound in cls.DURATION_BUCKETS)
+
+    @staticmethod
+    def codec_family(codec):
+        return (codec or 'unknown').split('.', 1)[0].lower()
+
+    @staticmethod
+    def _add_sample(stats, value):
+        n, mean, m2 = stats
+        n += 1
+        delta = value - mean
+        mean += delta / n
+        return n, mean, m2 + delta * (value - mean)
+
+    @staticmethod
+    def _merge(a, b):
+        if not a[0]:
+            return b
+        n = a[0] + b[0]
+        delta = b[1] - a[1]
+        return n, a[1] + delta * b[0] / n, a[2] + b[2] + delta * delta * a[0] * b[0] / n
+
+    def refresh(self):
+        """Reload every key from the store, picking up samples recorded by other processes"""
+        if self._conn is None:
+            return
+        with self._lock:
+            rows = self._conn.execute('SELECT kind, format, codec, bucket, n, mean, m2 FROM rates').fetchall()
+            self._stats = {tuple(row[:4]): tuple(row[4:]) for row in rows}
+            self._refreshed_at = time.time()
+
+    def record(self, kind, format_value, codec, duration, size_bytes):
+        if not duration or duration <= 0 or not size_bytes:
+            return
+        key = (kind, int(format_value), self.codec_family(codec), self.bucket_of(duration))
+        rate = size_bytes / duration
+        with self._lock:
+            if self._conn is None:
+                self._stats[key] = self._add_sample(self._stats.get(key, (0, 0.0, 0.0)), rate)
+                return
+            # Read-modify-write in one write transaction so concurrent processes don't lose samples
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT n, mean, m2 FROM rates WHERE kind = ? AND format = ? AND codec = ? AND bucket = ?', key
+                ).fetchone()
+                stats = self._add_sample(tuple(row) if row else (0, 0.0, 0.0), rate)
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO rates (kind, format, codec, bucket, n, mean, m2, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (*key, *stats, time.time())
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._stats[key] = stats
+
+    def estimate(self, kind, format_value, duration, codec=None):
+        """Learned rate with its 95% interval, or None when there are fewer than min_samples"""
+        if self._conn is not None and time.time() - self._refreshed_at > self.refresh_seconds:
+            self.refresh()
+        bucket = self.bucket_of(duration)
+        family = self.codec_family(codec) if codec else None
+        with self._lock:
+            matching = [(key[3], stats) for key, stats in self._stats.items()
+                        if key[0] == kind and key[1] == int(format_value) and (family is None or key[2] == family)]
+        for same_bucket_only in (True, False):
+            pooled = (0, 0.0, 0.0)
+            for key_bucket, stats in matching:
+                if key_bucket == bucket or not same_bucket_only:
+                    pooled = self._merge(pooled, stats)
+            if pooled[0] >= self.min_samples:
+                break
+        else:
+            return None
+        n, mean, m2 = pooled
+        half_width = 1.96 * math.sqrt(m2 / (n - 1) / n)
+        return {
+            'rate': mean,
+            'low': max(mean - half_width, 0),
+            'high': mean + half_width,
+            'samples': n,
+            'confident': half_width <= self.max_relative_ci * mean,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': len(self._stats),
+                'samples': sum(stats[0] for stats in self._stats.values()),
+                'persistent': self._conn is not None,
+            }
+
+class UpstreamThrottled(Exception):
+    """Raised instead of calling upstream while the circuit breaker is open"""
+    def __init__(self, retry_in):
+        super().__init__(f"YouTube is rate limiting requests; try again in {int(retry_in) + 1}s")
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """Process-wide breaker that stops upstream calls while YouTube answers with HTTP 429.
+
+    After `threshold` consecutive throttled calls it opens for a cooldown (or the
+    server's Retry-After), doubling on each consecutive opening up to max_cooldown.
+    Once the cooldown passes a single probe call is let through; its outcome closes
+    the breaker or opens it again.
+    """
+    def __init__(self, threshold, cooldown, max_cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = 'closed'
+        self._throttled_calls = 0
+        self._openings = 0
+        self._open_until = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    def retry_in(self):
+        """Seconds until a call may be attempted, 0 if it may go now"""
+        with self._lock:
+            if self.state == 'closed':
+                return 0
+            now = time.time()
+            if now < self._open_until:
+                self.rejected_calls += 1
+                return self._open_until - now
+            if self._probe_in_flight:
+                self.rejected_calls += 1
+                return self.cooldown
+            self.state = 'half_open'
+            self._probe_in_flight = True
+            return 0
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._throttled_calls = 0
+            self._openings = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """A call failed for a reason other than throttling; only matters for a probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_throttled(self, retry_after=None):
+        with self._lock:
+            self._throttled_calls += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self._throttled_calls >= self.threshold:
+                cooldown = min(self.cooldown * 2 ** self._openings, self.max_cooldown)
+                self._open_until = time.time() + max(cooldown, retry_after or 0)
+                self._openings += 1
+                self._throttled_calls = 0
+                self.state = 'open'
+                self.times_opened += 1
+                print(f"Upstream throttling: circuit breaker open for {self._open_until - time.time():.0f}s")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'open_for_seconds': round(max(self._open_until - time.time(), 0), 1) if self.state == 'open' else 0,
+                'times_opened': self.times_opened,
+                'rejected_calls': self.rejected_calls,
+            }
+
+class RetryPolicy:
+    """Retries upstream calls with exponential backoff and full jitter inside a total time budget"""
+    # (pattern in the yt-dlp error text, kind, cause, message for users); first match wins
+    ERROR_CLASSES = (
+        ('Unsupported URL', 'fatal', 'unsupported_url', "The video URL is unsupported or invalid."),
+        ('Video unavailable', 'fatal', 'unavailable', "This video is unavailable."),
+        ('Private video', 'fatal', 'private', "This video is private."),
+        ('HTTP Error 429', 'throttled', 'http_429', "Too many requests (429)."),
+        ('HTTP Error 403', 'retryable', 'http_403', "Access denied (403 Forbidden)."),
+        ('HTTP Error 404', 'fatal', 'http_404', "Video not found (404)."),
+        (r'HTTP Error 5\d\d', 'retryable', 'http_5xx', None),
+        (r'timed out|Connection reset|Connection aborted|Remote end closed|IncompleteRead|'
+         r'Temporary failure in name resolution|Unable to download (webpage|API page|JSON)', 'retryable', 'network', None),
+    )
+
+    def __init__(self, breaker, base_delay, max_delay, max_attempts):
+        self.breaker = breaker
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    @classmethod
+    def classify(cls, error):
+        """(kind, cause, user message) for an exception; kind is 'fatal', 'retryable' or 'throttled'"""
+        if isinstance(error, UpstreamThrottled):
+            return 'throttled', 'circuit_open', str(error)
+        if isinstance(error, yt_dlp.utils.DownloadCancelled):
+            return 'fatal', 'cancelled', str(error)
+        if not isinstance(error, yt_dlp.utils.DownloadError):
+            return 'fatal', 'internal', None
+        text = str(error)
+        for pattern, kind, cause, message in cls.ERROR_CLASSES:
+            if re.search(pattern, text):
+                return kind, cause, message or f"Download failed (yt-dlp): {text.splitlines()[-1]}"
+        return 'fatal', 'other', f"Download failed (yt-dlp): {text.splitlines()[-1]}"
+
+    @staticmethod
+    def _retry_after(error):
+        """Retry-After seconds of the HTTP 429 response behind a yt-dlp error, if present"""
+        seen = set()
+        while error is not None and id(error) not in seen:
+            seen.add(id(error))
+            response = getattr(error, 'response', None)
+            if response is not None and getattr(response, 'status', None) == 429:
+                value = response.headers.get('Retry-After', '')
+                return int(value) if value.isdigit() else None
+            exc_info = getattr(error, 'exc_info', None)
+            error = getattr(error, 'cause', None) or error.__cause__ or (exc_info[1] if exc_info else None)
+        return None
+
+    @staticmethod
+    def _wait(seconds, cancel_event):
+        if cancel_event is None:
+            time.sleep(seconds)
+        elif cancel_event.wait(seconds):
+            raise yt_dlp.utils.DownloadCancelled('Cancelled while waiting to retry')
+
+    def call(self, fn, budget_seconds, wait_for_breaker=False, on_retry=None, cancel_event=None):
+        """Run fn(attempt) until it succeeds, fails fatally, or the budget or attempts run out.
+
+        While the breaker is open the call either waits for it (if that fits in the
+        budget and wait_for_breaker is set) or raises UpstreamThrottled at once.
+        Setting cancel_event ends a wait between attempts with DownloadCancelled.
+        """
+        deadline = time.time() + budget_seconds
+        attempt = 0
+        while True:
+            retry_in = self.breaker.retry_in()
+            if retry_in:
+                if not wait_for_breaker or time.time() + retry_in >= deadline:
+                    raise UpstreamThrottled(retry_in)
+                if on_retry:
+                    on_retry(attempt, retry_in, str(UpstreamThrottled(retry_in)))
+                self._wait(retry_in, cancel_event)
+                continue
+
+            try:
+                result = fn(attempt)
+            except Exception as e:
+                kind, cause, message = self.classify(e)
+                if cause == 'cancelled':
+                    raise
+                if kind == 'throttled':
+                    self.breaker.record_throttled(self._retry_after(e))
+                else:
+                    self.breaker.record_failure()
+                attempt += 1
+                if kind == 'fatal' or attempt >= self.max_attempts:
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if time.time() + delay >= deadline:
+                    raise
+                METRICS.inc('upstream_retries_total', cause=cause)
+                if on_retry:
+                    on_retry(attempt, delay, message)
+                self._wait(delay, cancel_event)
+                continue
+            self.breaker.record_success()
+            return result
+
+class _BandwidthFlow:
+    """Token bucket of one running download"""
+    __slots__ = (
+        'request_id', 'job_type', 'origin', 'rate', 'demand', 'tokens', 'refilled_at',
+        'received', 'window_started', 'window_bytes', 'waited', 'throttled_seconds',
+    )
+
+    def __init__(self, request_id, job_type, origin):
+        self.request_id = request_id
+        self.job_type = job_type
+        self.origin = origin
+        self.rate = math.inf
+        self.demand = math.inf  # bytes/s it would use if allowed; unknown until it has been measured
+        self.tokens = 0.0
+        self.refilled_at = self.window_started = time.monotonic()
+        self.received = 0
+        self.window_bytes = 0  # bytes received since window_started
+        self.waited = False  # held back by its bucket since window_started
+        self.throttled_seconds = 0.0
+
+class BandwidthScheduler:
+    """Process-wide download rate limit, shared fairly between running downloads.
+
+    Every running download is a flow with a weight (from its job type) and the
+    origin of the client that asked for it. yt-dlp's progress hook charges each
+    flow for the bytes it received; a flow that is over its allowance sleeps in
+    the hook, which stops its socket reads until the bucket refills.
+
+    Allowances are recomputed by weighted max-min fair sharing: the total cap is
+    split between origins (each under its own cap), then between the flows of
+    each origin. A flow that uses less than its share keeps what it uses and the
+    rest goes to flows that were held back. Rates are bytes per second; 0 or None
+    means unlimited. Limits can be changed while downloads run and apply at once.
+    """
+    HEADROOM = 1.25  # room a flow that was not held back gets above its measured rate, so it can speed up
+    MIN_FLOW_RATE = 64 * 1024  # allowance floor for idle flows (merging, backing off), until they are measured again
+    MAX_SLEEP_SECONDS = 0.25  # waits are sliced so limit changes reach sleeping flows quickly
+
+    def __init__(self, total_rate, per_origin_rate, origin_rates, weights, burst_seconds, rebalance_seconds):
+        self.total_rate = total_rate
+        self.per_origin_rate = per_origin_rate
+        self.origin_rates = dict(origin_rates)  # origin -> rate, overriding per_origin_rate
+        self.weights = dict(weights)  # job type -> weight
+        self.burst_seconds = burst_seconds
+        self.rebalance_seconds = rebalance_seconds
+        self._flows = {}  # request_id -> _BandwidthFlow
+        self._rebalanced_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled_seconds = 0.0
+
+    def configure(self, **limits):
+        """Change any of total_rate, per_origin_rate, origin_rates and weights"""
+        with self._lock:
+            for name, value in limits.items():
+                setattr(self, name, dict(value) if isinstance(value, dict) else value)
+            self._allocate_locked(time.monotonic())
+
+    @staticmethod
+    def _limit(rate):
+        return rate if rate else math.inf
+
+    @staticmethod
+    def _water_fill(capacity, claims):
+        """Weighted max-min fair split of capacity between (key, weight, demand) claims"""
+        shares = {}
+        pending = sorted(claims, key=lambda claim: claim[2] / claim[1])
+        total_weight = sum(weight for _, weight, _ in pending)
+        for key, weight, demand in pending:
+            fair_share = capacity * weight / total_weight if total_weight else math.inf
+            shares[key] = min(demand, fair_share)
+            if shares[key] != math.inf:
+                capacity -= shares[key]
+            total_weight -= weight
+        return shares
+
+    def _measure_locked(self, now):
+        """Update each flow's demand from what it received since the last measurement"""
+        for flow in self._flows.values():
+            elapsed = now - flow.window_started
+            if flow.waited or elapsed <= 0:
+                flow.demand = math.inf
+            else:
+                flow.demand = max(flow.window_bytes / elapsed * self.HEADROOM, self.MIN_FLOW_RATE)
+            flow.window_started = now
+            flow.window_bytes = 0
+            flow.waited = False
+        self._rebalanced_at = now
+
+    def _allocate_locked(self, now):
+        by_origin = {}
+        for flow in self._flows.values():
+            by_origin.setdefault(flow.origin, []).append((flow, self.weights.get(flow.job_type, 1), flow.demand))
+        origin_shares = self._water_fill(self._limit(self.total_rate), [
+            (origin, sum(weight for _, weight, _ in flows),
+             min(sum(demand for _, _, demand in flows), self._limit(self.origin_rates.get(origin, self.per_origin_rate))))
+            for origin, flows in by_origin.items()
+        ])
+        for origin, flows in by_origin.items():
+            flow_shares = self._water_fill(origin_shares[origin], [(flow, weight, demand) for flow, weight, demand in flows])
+            for flow, rate in flow_shares.items():
+                self._refill_locked(flow, now)
+                flow.rate = rate
+                flow.tokens = min(flow.tokens, rate * self.burst_seconds) if rate != math.inf else 0.0
+
+    def _refill_locked(self, flow, now):
+        if flow.rate != math.inf:
+            flow.tokens = min(flow.tokens + flow.rate * (now - flow.refilled_at), flow.rate * self.burst_seconds)
+        flow.refilled_at = now
+
+    @contextmanager
+    def flow(self, request_id, job_type, origin):
+        """Register a download for the duration of the block; yields the flow to charge"""
+        flow = _BandwidthFlow(request_id, job_type, origin or 'unknown')
+        with self._lock:
+            self._flows[request_id] = flow
+            self._allocate_locked(time.monotonic())
+        try:
+            yield flow
+        finally:
+            with self._lock:
+                self._flows.pop(request_id, None)
+                self._allocate_locked(time.monotonic())
+
+    def set_job_type(self, request_id, job_type):
+        """Move a running flow to another weight class"""
+        with self._lock:
+            flow = self._flows.get(request_id)
+            if flow:
+                flow.job_type = job_type
+                self._allocate_locked(time.monotonic())
+
+    def consume(self, flow, received_bytes):
+        """Charge flow for received_bytes, sleeping until its bucket covers them"""
+        with self._lock:
+            now = time.monotonic()
+            flow.received += received_bytes
+            flow.window_bytes += received_bytes
+            self._refill_locked(flow, now)
+            flow.tokens -= received_bytes
+            if now - self._rebalanced_at >= self.rebalance_seconds:
+                self._measure_locked(now)
+                self._allocate_locked(now)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill_locked(flow, now)
+                if flow.rate == math.inf or flow.tokens >= 0:
+                    return
+                flow.waited = True
+                delay = min(-flow.tokens / flow.rate, self.MAX_SLEEP_SECONDS)
+                flow.throttled_seconds += delay
+                self.throttled_seconds += delay
+            time.sleep(delay)
+
+    def progress_hook(self, flow):
+        """yt-dlp progress hook charging flow for the bytes of each block"""
+        last_downloaded = {}
+
+        def hook(d):
+            if d['status'] != 'downloading' or d.get('downloaded_bytes') is None:
+                return
+            # One hook sees every format of a merged download; count each file's progress separately
+            key = d.get('tmpfilename') or d.get('filename')
+            downloaded = d['downloaded_bytes']
+            previous = last_downloaded.get(key)
+            last_downloaded[key] = downloaded
+            if previous is not None and downloaded > previous:
+                self.consume(flow, downloaded - previous)
+        return hook
+
+    def settings(self):
+        with self._lock:
+            return {
+                'total_bytes_per_second': self.total_rate or None,
+                'per_origin_bytes_per_second': self.per_origin_rate or None,
+                'origin_bytes_per_second': dict(self.origin_rates),
+                'weights': dict(self.weights),
+            }
+
+    def stats(self):
+        settings = self.settings()
+        with self._lock:
+            flows = {
+                request_id: {
+                    'type': flow.job_type,
+                    'origin': flow.origin,
+                    'rate_bytes_per_second': None if flow.rate == math.inf else round(flow.rate),
+                    'received_bytes': flow.received,
+                    'throttled_seconds': round(flow.throttled_seconds, 1),
+                }
+                for request_id, flow in self._flows.items()
+            }
+            return {**settings, 'throttled_seconds': round(self.throttled_seconds, 1), 'flows': flows}
+
+# Extractor classes tried before yt-dlp's own, e.g. fake_youtube.FakeYouTubeIE for the offline benchmarks
+EXTRA_INFO_EXTRACTORS = []
+
+class _PooledYoutubeDL:
+    """A YoutubeDL instance whose per-request settings can be swapped between checkouts"""
+    def __init__(self, opts):
+        self.extractors = tuple(EXTRA_INFO_EXTRACTORS)
+        self.ydl = yt_dlp.YoutubeDL(opts, auto_init=not EXTRA_INFO_EXTRACTORS)
+        if EXTRA_INFO_EXTRACTORS:
+            for extractor in EXTRA_INFO_EXTRACTORS:
+                self.ydl.add_info_extractor(extractor())
+            self.ydl.add_default_info_extractors()
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+        self.cancel_event = None
+        self._format_selectors = {None: None}
+        self._default_outtmpl = dict(self.ydl.params['outtmpl'])
+        # yt-dlp has no way to remove hooks, so register dispatchers once and swap their targets
+        self.ydl.add_progress_hook(lambda d: [hook(d) for hook in self.progress_hooks])
+        self.ydl.add_postprocessor_hook(lambda d: [hook(d) for hook in self.postprocessor_hooks])
+        self._urlopen = self.ydl.urlopen
+        self.ydl.urlopen = self._cancellable_urlopen
+
+    def _cancellable_urlopen(self, req):
+        # Extractors fetch everything through urlopen, so this is where a cancelled lookup stops
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise yt_dlp.utils.DownloadCancelled('Request cancelled')
+        return self._urlopen(req)
+
+    def apply(self, format_spec=None, outtmpl=None, progress_hooks=(), postprocessor_hooks=(), cancel_event=None):
+        ydl = self.ydl
+        if format_spec not in self._format_selectors:
+            self._format_selectors[format_spec] = ydl.build_format_selector(format_spec)
+        ydl.params['format'] = format_spec
+        ydl.format_selector = self._format_selectors[format_spec]
+        ydl.params['outtmpl'] = dict(self._default_outtmpl, **({'default': outtmpl} if outtmpl else {}))
+        self.progress_hooks = list(progress_hooks)
+        self.postprocessor_hooks = list(postprocessor_hooks)
+        self.cancel_event = cancel_event
+
+class YoutubeDLPool:
+    """Idle YoutubeDL instances keyed by option profile.
+
+    Building a YoutubeDL loads extractors and cookies, and its request handlers keep
+    HTTP connections alive, so instances are reused across requests. Only the format,
+    output template and hooks change per request; everything else comes from the
+    profile. An instance is used by one request at a time.
+    """
+    def __init__(self, profiles, max_idle_per_profile):
+        self.profiles = profiles  # name -> callable returning YoutubeDL options
+        self.max_idle_per_profile = max_idle_per_profile
+        self._idle = {name: [] for name in profiles}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @contextmanager
+    def checkout(self, profile, **overrides):
+        stale = None
+        with self._lock:
+            slot = self._idle[profile].pop() if self._idle[profile] else None
+            if slot and slot.extractors != tuple(EXTRA_INFO_EXTRACTORS):
+                # Built (by the startup warm-up, say) before another extractor was registered
+                self.discarded += 1
+                stale, slot = slot, None
+            elif slot:
+                self.reused += 1
+        if slot is None:
+            if stale is not None:
+                stale.ydl.close()
+            slot = _PooledYoutubeDL(self.profiles[profile]())
+            with self._lock:
+                self.created += 1
+
+        reusable = False
+        try:
+            slot.apply(**overrides)
+            yield slot.ydl
+            reusable = True
+        except (yt_dlp.utils.DownloadError, yt_dlp.utils.DownloadCancelled):
+            # Extraction/download failures are reported per request and leave the instance usable
+            reusable = True
+            raise
+        finally:
+            slot.apply()
+            with self._lock:
+                if reusable and len(self._idle[profile]) < self.max_idle_per_profile:
+                    self._idle[profile].append(slot)
+                    slot = None
+                else:
+                    self.discarded += 1
+            if slot is not None:
+                slot.ydl.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'idle': {name: len(idle) for name, idle in self._idle.items()},
+            }
 
 class VideoDownloader:
     def __init__(self):
         self.downloads_dir = Path(CONFIG['DOWNLOADS_DIR'])
-        self.downloads_dir.mkdir(exist_ok=True)
-        self.final_filenames = final_filenames_store
-        
-        cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
-        cleanup_thread.start()
+        # Opened by start() in the background, so importing the app never waits on disk or SQLite locks
+        self.file_catalog = None
+        self.job_store = None
+        self.bitrate_model = None
+        self.initialized = threading.Event()  # the above are open and the background loops running
+        self.warmed = threading.Event()  # yt-dlp imported and one YoutubeDL per pool profile built
+        self.startup = {'phases': {}, 'error': None}  # phase -> seconds, and what made startup fail
+        self.started_at = time.time()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.final_filenames = {}
+        self.final_media = {}  # progress_hook_key -> duration and codecs of the downloaded formats
+        self.status_broker = StatusBroker()
+        self._progress_last_emit = {}
+        self._postprocess_started = {}  # (request_id, postprocessor) -> perf_counter at start
+        self._stream_announced = set()
+        self._partial_files = {}  # request_id -> names of the .part files its download has written
+        self._resume_holds = {}  # request_id -> stem kept protected from recovery until the job starts
+        self._cancel_requests = {}  # request_id -> status message for jobs of this process being stopped
+        self._cancel_events = {}  # request_id -> Event set on cancellation, for a job inside yt-dlp
+        self._postprocess_procs = {}  # request_id -> running ffmpeg process
+        self._owned_jobs = set()  # request_ids of the active primary jobs this process runs
+        self._watch_marks = {}  # request_id or ALL_JOBS -> when this process last wrote its watch time
+        self._prefetches = {}  # job_key -> Prefetch not yet promoted or expired
+        self._prefetch_lock = threading.Lock()
+        self._choice_counts = None  # (type, format) -> downloads requested, loaded from the job store on first use
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.video_info_cache = VideoInfoCache(CONFIG['VIDEO_INFO_CACHE_MAX_ENTRIES'], self._video_info_ttl)
+        self._refinements = {}  # token -> InfoRefinement
+        self._refinement_tokens = {}  # video_id -> token of its pending refinement
+        self._refinement_lock = threading.Lock()
+        self._refinement_executor = ThreadPoolExecutor(max_workers=CONFIG['INFO_REFINEMENT_WORKERS'], thread_name_prefix='info-refinement')
+        self.upstream_breaker = CircuitBreaker(
+            CONFIG['CIRCUIT_BREAKER_THRESHOLD'], CONFIG['CIRCUIT_BREAKER_COOLDOWN_SECONDS'], CONFIG['CIRCUIT_BREAKER_MAX_COOLDOWN_SECONDS']
+        )
+        self.retry_policy = RetryPolicy(
+            self.upstream_breaker, CONFIG['RETRY_BASE_DELAY_SECONDS'], CONFIG['RETRY_MAX_DELAY_SECONDS'], CONFIG['RETRY_MAX_ATTEMPTS']
+        )
+        self.video_scheduler = DownloadScheduler('video', CONFIG['MAX_CONCURRENT_VIDEO_DOWNLOADS'])
+        self.audio_scheduler = DownloadScheduler('audio', CONFIG['MAX_CONCURRENT_AUDIO_DOWNLOADS'])
+        self.prefetch_scheduler = DownloadScheduler('prefetch', CONFIG['PREFETCH_MAX_CONCURRENT'])
+        self.bandwidth = BandwidthScheduler(
+            CONFIG['BANDWIDTH_TOTAL_BYTES_PER_SECOND'], CONFIG['BANDWIDTH_PER_ORIGIN_BYTES_PER_SECOND'],
+            CONFIG['BANDWIDTH_ORIGIN_BYTES_PER_SECOND'], CONFIG['BANDWIDTH_WEIGHTS'],
+            CONFIG['BANDWIDTH_BURST_SECONDS'], CONFIG['BANDWIDTH_REBALANCE_SECONDS']
+        )
+        self.audio_postprocessor = ThreadPoolExecutor(
+            max_workers=CONFIG['AUDIO_POSTPROCESS_WORKERS'] or os.cpu_count() or 1, thread_name_prefix='audio-postprocess'
+        )
+        self.ydl_pool = YoutubeDLPool({
+            'info': self._info_ydl_options,
+            'playlist': self._playlist_ydl_options,
+            'video': lambda: self._download_ydl_options(merge_output_format='mp4'),
+            'audio': self._download_ydl_options,
+        }, CONFIG['YTDL_POOL_MAX_IDLE_PER_PROFILE'])
+
+    def start(self):
+        """Open local state and warm yt-dlp on a background thread; the server takes requests meanwhile.
+
+        Reads the storage settings from CONFIG when it runs, so callers adjust CONFIG first. Safe to call
+        more than once; only the first call starts anything.
+        """
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._initialize, name='startup', daemon=True).start()
+
+    @contextmanager
+    def _startup_phase(self, name):
+        started = time.perf_counter()
+        yield
+        self.startup['phases'][name] = round(time.perf_counter() - started, 3)
+
+    def _initialize(self):
+        try:
+            with self._startup_phase('storage'):
+                self.downloads_dir.mkdir(exist_ok=True)
+                self.file_catalog = FileCatalog(self.downloads_dir, CONFIG['DOWNLOADS_MAX_BYTES'], CONFIG['FILE_RETENTION_HOURS'] * 3600)
+                self.job_store = create_job_store()
+                self.bitrate_model = BitrateModel(
+                    CONFIG['BITRATE_MODEL_PATH'], CONFIG['BITRATE_MODEL_MIN_SAMPLES'],
+                    CONFIG['BITRATE_MODEL_MAX_RELATIVE_CI'], CONFIG['BITRATE_MODEL_REFRESH_SECONDS']
+                )
+            METRICS.register_collector(self._collect_metrics)
+
+            cleanup_thread = threading.Thread(target=self._cleanup_loop, daemon=True)
+            cleanup_thread.start()
+            recovery_thread = threading.Thread(target=self._job_recovery_loop, daemon=True)
+            recovery_thread.start()
+            self.initialized.set()
+
+            with self._startup_phase('ytdlp_import'):
+                yt_dlp.YoutubeDL  # the first attribute access does the import
+            with self._startup_phase('ydl_pool'):
+                # One idle instance per profile, so the first request of each kind skips extractor setup
+                for profile in self.ydl_pool.profiles:
+                    with self.ydl_pool.checkout(profile):
+                        pass
+            self.warmed.set()
+            print(f"Startup complete in {time.time() - self.started_at:.2f}s: {self.startup['phases']}")
+        except Exception as e:
+            self.startup['error'] = str(e)
+            print(f"Startup failed: {e}")
+
+    def startup_status(self):
+        return {
+            'initialized': self.initialized.is_set(),
+            'warmed': self.warmed.is_set(),
+            'uptime_seconds': round(time.time() - self.started_at, 3),
+            'phases': dict(self.startup['phases']),
+            'error': self.startup['error'],
+        }
+
+    def _collect_metrics(self):
+        """Scrape-time metrics read from the components that already track them"""
+        cache = self.video_info_cache.stats()
+        catalog = self.file_catalog.stats()
+        schedulers = {'video': self.video_scheduler.stats(), 'audio': self.audio_scheduler.stats(), 'prefetch': self.prefetch_scheduler.stats()}
+        pool = self.ydl_pool.stats()
+        breaker = self.upstream_breaker.stats()
+        yield 'jobs_running', 'gauge', 'Jobs currently running, by scheduler', [({'scheduler': name}, stats['running']) for name, stats in schedulers.items()]
+        yield 'jobs_queued', 'gauge', 'Jobs waiting in a scheduler queue', [({'scheduler': name}, stats['queued']) for name, stats in schedulers.items()]
+        yield 'video_info_cache_lookups_total', 'counter', 'Video info cache lookups by result', [
+            ({'result': result}, cache[result]) for result in ('hits', 'misses', 'coalesced')
+        ]
+        yield 'video_info_cache_hit_ratio', 'gauge', 'Share of lookups served without a new extraction', [({}, cache['hit_ratio'] or 0)]
+        yield 'video_info_cache_entries', 'gauge', 'Entries in the video info cache', [({}, cache['entries'])]
+        yield 'downloads_dir_bytes', 'gauge', 'Bytes used by files in the downloads directory', [({}, catalog['total_bytes'])]
+        yield 'downloads_dir_max_bytes', 'gauge', 'Downloads directory quota', [({}, catalog['max_bytes'])]
+        yield 'downloads_dir_files', 'gauge', 'Files in the downloads directory', [({}, catalog['files'])]
+        yield 'downloads_dir_removed_files_total', 'counter', 'Files removed from the downloads directory by reason', [
+            ({'reason': 'quota'}, catalog['evicted_files']), ({'reason': 'expired'}, catalog['expired_files'])
+        ]
+        yield 'ydl_pool_instances_total', 'counter', 'YoutubeDL instances by pool event', [
+            ({'event': event}, pool[event]) for event in ('created', 'reused', 'discarded')
+        ]
+        yield 'upstream_circuit_open', 'gauge', '1 while the upstream circuit breaker is not closed', [({}, int(breaker['state'] != 'closed'))]
+        yield 'upstream_circuit_opened_total', 'counter', 'Times the upstream circuit breaker opened', [({}, breaker['times_opened'])]
+        yield 'upstream_rejected_calls_total', 'counter', 'Upstream calls refused while the breaker was open', [({}, breaker['rejected_calls'])]
+        bandwidth = self.bandwidth.stats()
+        yield 'bandwidth_limit_bytes_per_second', 'gauge', 'Total download bandwidth cap, 0 when unlimited', [
+            ({}, bandwidth['total_bytes_per_second'] or 0)
+        ]
+        yield 'bandwidth_throttled_seconds_total', 'counter', 'Time downloads spent waiting for bandwidth', [({}, bandwidth['throttled_seconds'])]
+        yield 'startup_phase_seconds', 'gauge', 'Time each background startup phase took', [
+            ({'phase': phase}, seconds) for phase, seconds in self.startup['phases'].items()
+        ]
+
+    def _job_recovery_loop(self):
+        """Keep this process's jobs leased and pick up jobs left behind by dead processes"""
+        while True:
+            try:
+                self.job_store.heartbeat(self.owner_id)
+                self._apply_requested_cancels(list(self._owned_jobs))
+                self._recover_interrupted_jobs()
+                self._cancel_abandoned_jobs()
+            except Exception as e:
+                print(f"Job recovery error: {e}")
+            time.sleep(CONFIG['JOB_STORE_HEARTBEAT_SECONDS'])
+
+    def _recover_interrupted_jobs(self):
+        for request_id, entry in self.job_store.claim_orphans(self.owner_id, CONFIG['JOB_STORE_OWNER_LEASE_SECONDS']):
+            job_type = entry.get('type', 'video')
+            format_value = entry.get('quality') if job_type == 'audio' else entry.get('resolution')
+            file_stem = self._job_file_stem(entry.get('video_id'), job_type, format_value)
+            if entry.get('prefetch') is True:
+                # Nobody asked for it, and its window closed with the old process
+                self._discard_partial_files(file_stem)
+                self._update_status(request_id, 'failed', 'Prefetch discarded after server restart.')
+                continue
+            # Keep the partial files out of quota eviction while the job waits for a slot
+            self.file_catalog.protect(file_stem)
+            self._resume_holds[request_id] = file_stem
+            salvaged = self._resumable_files(file_stem)
+            salvaged_bytes = sum(salvaged.values())
+            print(f"Recovering interrupted {job_type} job {request_id} ({entry.get('video_id')} @ {format_value}), "
+                  f"{len(salvaged)} partial file(s), {salvaged_bytes} bytes")
+            message = 'Re-queued after server restart'
+            if salvaged_bytes:
+                message += f", resuming from {salvaged_bytes / (1024 * 1024):.1f} MB already downloaded"
+            self.job_store.update(request_id, lambda entry: entry.update(salvaged_bytes=salvaged_bytes))
+            self._update_status(request_id, 'pending', message)
+            self._submit_job(request_id, job_type, entry.get('video_id'), format_value)
+
+    def _resumable_files(self, file_stem):
+        """Name -> size of the files an interrupted job under file_stem left for yt-dlp to continue from"""
+        files = {}
+        for file_path in self.downloads_dir.glob(f"{file_stem}.*"):
+            if not RESUMABLE_FILE_RE.search(file_path.name):
+                continue
+            try:
+                files[file_path.name] = file_path.stat().st_size
+            except OSError:
+                continue
+        return files
+
+    def _discard_partial_files(self, file_stem):
+        """Remove everything under file_stem except a finished file"""
+        for file_path in self.downloads_dir.glob(f"{file_stem}.*"):
+            if file_path.stem == file_stem:
+                continue
+            file_path.unlink(missing_ok=True)
+            self.file_catalog.remove(file_path.name)
+
+    def _take_resume_hold(self, request_id):
+        """Drop the protection recovery placed on a job's stem, once the job holds its own"""
+        file_stem = self._resume_holds.pop(request_id, None)
+        if file_stem:
+            self.file_catalog.release(file_stem)
 
     def _cleanup_loop(self):
+        interval = CONFIG['CLEANUP_INTERVAL_HOURS'] * 3600
+        next_sweep = time.time()
         while True:
             try:
-                self._cleanup_old_files()
-                self._cleanup_old_status()
-                time.sleep(CONFIG['CLEANUP_INTERVAL_HOURS'] * 3600)
+                if time.time() >= next_sweep:
+                    self._cleanup_old_status()
+                    self.file_catalog.rescan()
+                    next_sweep = time.time() + interval
+                cleaned_count, next_expiry = self.file_catalog.evict_expired()
+                if cleaned_count > 0:
+                    print(f"Cleaned up {cleaned_count} expired file(s).")
+                wake_at = min(next_expiry or next_sweep, next_sweep)
+                time.sleep(min(max(wake_at - time.time(), 1), 3600))
             except Exception as e:
                 print(f"Cleanup error: {e}")
                 time.sleep(3600)
 
-    def _cleanup_old_files(self):
-        cutoff = datetime.now() - timedelta(hours=CONFIG['FILE_RETENTION_HOURS'])
-        cleaned_count = 0
-        for file_path in self.downloads_dir.glob('*'):
-            if file_path.is_file():
-                try:
-                    file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                    if file_time < cutoff:
-                        file_path.unlink()
-                        cleaned_count += 1
-                except Exception as e:
-                    print(f"Error cleaning up file {file_path}: {e}")
-        if cleaned_count > 0:
-            print(f"Cleaned up {cleaned_count} old file(s).")
-
     def _cleanup_old_status(self):
-        cutoff = datetime.now() - timedelta(hours=CONFIG['FILE_RETENTION_HOURS'])
-        cleaned_count = 0
-        with download_lock:
-            to_remove = [
-                request_id for request_id, status_data in download_status.items()
-                if datetime.fromisoformat(status_data.get('created_at', '1970-01-01T00:00:00')) < cutoff
-            ]
-            for request_id in to_remove:
-                download_status.pop(request_id, None)
-                cleaned_count +=1
+        cutoff = time.time() - CONFIG['FILE_RETENTION_HOURS'] * 3600
+        cleaned_count = self.job_store.delete_created_before(cutoff)
         if cleaned_count > 0:
             print(f"Cleaned up {cleaned_count} old status entries.")
 
@@ -86,34 +2067,20 @@ class VideoDownloader:
         ]
         return random.choice(user_agents)
 
-    def _calculate_dynamic_timeouts(self, duration):
-        """Calculate dynamic timeouts based on video duration"""
-        base_timeout = 60  # 1 minute base
-        
-        # Scale timeout based on duration
-        if duration <= 300:  # 5 minutes or less
-            info_timeout = base_timeout
-            sim_timeout = 90
-        elif duration <= 900:  # 15 minutes or less
-            info_timeout = base_timeout * 1.5
-            sim_timeout = 120
-        elif duration <= 1800:  # 30 minutes or less
-            info_timeout = base_timeout * 2
-            sim_timeout = 180
-        elif duration <= 3600:  # 1 hour or less
-            info_timeout = base_timeout * 2.5
-            sim_timeout = 240
-        elif duration <= 7200:  # 2 hours or less
-            info_timeout = base_timeout * 3
-            sim_timeout = 300
-        else:  # Very long videos
-            info_timeout = base_timeout * 4
-            sim_timeout = 360  # 6 minutes for very long videos
-        
-        return int(info_timeout), int(sim_timeout)
+    def _learned_estimation(self, learned, duration):
+        return {
+            'filesize': int(learned['rate'] * duration),
+            'estimated': True,
+            'filesize_range': [int(learned['low'] * duration), int(learned['high'] * duration)],
+            'samples': learned['samples'],
+        }
 
     def _improved_estimation(self, resolution, duration):
-        """Much more accurate estimation with better resolution differentiation"""
+        """Size from learned bitrates, or from typical YouTube bitrates until enough downloads were seen"""
+        learned = self.bitrate_model.estimate('video', resolution, duration)
+        if learned:
+            return self._learned_estimation(learned, duration)
+
         # More realistic bitrates with better resolution differentiation
         base_bitrates = {
             360: 450,   # Slightly increased to create more separation
@@ -124,12 +2091,12 @@ class VideoDownloader:
         
         # Duration-based minimal scaling
         duration_factor = 1.0
-        if duration > 1800:  # 30+ minutes
-            duration_factor = 0.98
+        if duration > 7200:  # 2+ hours
+            duration_factor = 0.94
         elif duration > 3600:  # 1+ hour
             duration_factor = 0.96
-        elif duration > 7200:  # 2+ hours
-            duration_factor = 0.94
+        elif duration > 1800:  # 30+ minutes
+            duration_factor = 0.98
         
         # More realistic compression efficiency
         compression_factor = 0.90
@@ -140,7 +2107,11 @@ class VideoDownloader:
         return {'filesize': int(estimated_size), 'estimated': True}
 
     def _improved_audio_estimation(self, quality, duration):
-        """More accurate audio size estimation"""
+        """Audio size from learned bitrates, falling back to the nominal bitrate"""
+        learned = self.bitrate_model.estimate('audio', quality, duration)
+        if learned:
+            return self._learned_estimation(learned, duration)
+
         # More realistic audio efficiency factors
         efficiency_factors = {128: 0.88, 192: 0.90, 256: 0.92, 320: 0.94}
         
@@ -209,6 +2180,38 @@ class VideoDownloader:
         
         return total_filesize
 
+    def _exact_filesize(self, selected):
+        """Total size when every selected format reports an exact filesize, else 0"""
+        parts = selected.get('requested_formats') or [selected]
+        if not all(fmt.get('filesize') for fmt in parts):
+            return 0
+        return sum(fmt['filesize'] for fmt in parts)
+
+    @staticmethod
+    def _selected_codec(selected, kind):
+        parts = selected.get('requested_formats') or [selected]
+        field = 'acodec' if kind == 'audio' else 'vcodec'
+        return next((fmt.get(field) for fmt in parts if fmt.get(field) not in (None, 'none')), None)
+
+    def _sized_format(self, kind, format_value, selected, duration):
+        """Size entry for one resolved selector; exact sizes are recorded as bitrate samples.
+
+        yt-dlp's approximate sizes are bitrate * duration guesses, so a confident
+        learned estimate replaces them. Returns None when nothing is known.
+        """
+        if not selected:
+            return None
+        codec = self._selected_codec(selected, kind)
+        exact_filesize = self._exact_filesize(selected)
+        if exact_filesize:
+            self.bitrate_model.record(kind, format_value, codec, duration, exact_filesize)
+            return {'filesize': int(exact_filesize), 'estimated': False}
+        learned = self.bitrate_model.estimate(kind, format_value, duration, codec)
+        if learned and learned['confident']:
+            return self._learned_estimation(learned, duration)
+        approximate_filesize = self._calculate_total_filesize(selected)
+        return {'filesize': int(approximate_filesize), 'estimated': False} if approximate_filesize > 0 else None
+
     def _detect_and_handle_duplicate_sizes(self, video_formats):
         """Detect when resolutions have the same size and adjust accordingly"""
         sizes = {}
@@ -238,138 +2241,88 @@ class VideoDownloader:
         
         return video_formats
 
-    def _aggressive_size_simulation(self, url, duration, info):
-        """Ultra-aggressive simulation with very long timeouts and duplicate handling"""
+    def _select_format(self, ydl, formats, format_spec):
+        """Run a yt-dlp format selector locally against already extracted formats"""
+        selector = ydl.build_format_selector(format_spec)
+        selected = list(selector({
+            'formats': formats,
+            'has_merged_format': any('none' not in (f.get('acodec'), f.get('vcodec')) for f in formats),
+            'incomplete_formats': (all(f.get('vcodec') == 'none' for f in formats)
+                                   or all(f.get('acodec') == 'none' for f in formats)),
+        }))
+        return selected[0] if selected else None
+
+    def _resolve_format_sizes(self, ydl, info, duration, on_partial=None):
+        """Resolve every video and audio selector from the single extraction already fetched"""
         try:
-            info_timeout, sim_timeout = self._calculate_dynamic_timeouts(duration)
-            print(f"VID_INFO: Using dynamic timeouts - Info: {info_timeout}s, Simulation: {sim_timeout}s for {duration}s video")
-            
+            formats = info.get('formats') or []
+            if not formats:
+                print("VID_INFO: Extraction returned no formats, nothing to resolve locally")
+                return None
+
+            resolve_start_time = time.time()
             video_formats_out = {}
             audio_formats_out = {}
+            format_debug_info = {}
+            successful_video_sims = 0
 
-            # Ultra-aggressive simulation options
-            base_sim_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'simulate': True,
-                'skip_download': True,
-                'socket_timeout': sim_timeout,  # Dynamic timeout
-                'http_headers': {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Accept-Language': 'en-US,en;q=0.5',
-                },
-                'extract_flat': False,
-                'no_check_certificate': True,
-                'retries': 10,  # Increased retries
-                'fragment_retries': 10,
-            }
+            for resolution in [720, 1080, 480, 360]:
+                try:
+                    selected = self._select_format(ydl, formats, self._get_video_format_spec(resolution))
+                except Exception as e:
+                    print(f"VID_INFO: Error selecting format for {resolution}p: {e}")
+                    selected = None
 
-            # Try video formats with maximum persistence
-            successful_video_sims = 0
-            format_debug_info = {}
-            
-            for resolution in [720, 1080, 480, 360]:  # Start with most common
-                success = False
-                max_attempts = 4  # Increased attempts
-                
-                for attempt in range(max_attempts):
-                    try:
-                        format_spec = self._get_video_format_spec(resolution)
-                        current_sim_opts = {**base_sim_opts, 'format': format_spec}
-                        
-                        # Add progressive timeout increase per attempt
-                        attempt_timeout = sim_timeout + (attempt * 30)  # Add 30s per attempt
-                        current_sim_opts['socket_timeout'] = attempt_timeout
-                        
-                        sim_start_time = time.time()
-                        print(f"VID_INFO: Simulating {resolution}p (attempt {attempt + 1}/{max_attempts}, timeout: {attempt_timeout}s)...")
-                        
-                        with yt_dlp.YoutubeDL(current_sim_opts) as sim_ydl:
-                            sim_info = sim_ydl.extract_info(url, download=False)
-                        
-                        total_filesize = self._calculate_total_filesize(sim_info)
-                        sim_time = time.time() - sim_start_time
-                        
-                        # Store debug info about what format was actually selected
-                        if 'requested_formats' in sim_info:
-                            format_debug_info[resolution] = {
-                                'video_format_id': sim_info['requested_formats'][0].get('format_id', 'unknown'),
-                                'audio_format_id': sim_info['requested_formats'][1].get('format_id', 'unknown') if len(sim_info['requested_formats']) > 1 else 'none',
-                                'video_height': sim_info['requested_formats'][0].get('height', 'unknown')
-                            }
-                        else:
-                            format_debug_info[resolution] = {
-                                'format_id': sim_info.get('format_id', 'unknown'),
-                                'height': sim_info.get('height', 'unknown')
-                            }
-                        
-                        if total_filesize > 0:
-                            video_formats_out[resolution] = {'filesize': int(total_filesize), 'estimated': False}
-                            successful_video_sims += 1
-                            print(f"VID_INFO: ✓ Got actual size for {resolution}p: {total_filesize/1024/1024:.1f}MB (took {sim_time:.2f}s)")
-                            print(f"VID_INFO: Format debug for {resolution}p: {format_debug_info[resolution]}")
-                            success = True
-                            break
-                        else:
-                            print(f"VID_INFO: No size returned for {resolution}p on attempt {attempt + 1}")
-
-                    except Exception as e:
-                        print(f"VID_INFO: Error simulating {resolution}p attempt {attempt + 1}: {e}")
-                        if attempt < max_attempts - 1:  # Not the last attempt
-                            delay = min(10 + (attempt * 5), 30)  # Progressive delay, max 30s
-                            print(f"VID_INFO: Waiting {delay}s before retry...")
-                            time.sleep(delay)
-                            continue
-                
-                if not success:
-                    print(f"VID_INFO: All attempts failed for {resolution}p, using improved estimation")
+                sized = self._sized_format('video', resolution, selected, duration)
+
+                if selected and 'requested_formats' in selected:
+                    format_debug_info[resolution] = {
+                        'video_format_id': selected['requested_formats'][0].get('format_id', 'unknown'),
+                        'audio_format_id': selected['requested_formats'][1].get('format_id', 'unknown') if len(selected['requested_formats']) > 1 else 'none',
+                        'video_height': selected['requested_formats'][0].get('height', 'unknown')
+                    }
+                elif selected:
+                    format_debug_info[resolution] = {
+                        'format_id': selected.get('format_id', 'unknown'),
+                        'height': selected.get('height', 'unknown')
+                    }
+
+                if sized:
+                    video_formats_out[resolution] = sized
+                    successful_video_sims += 1
+                    print(f"VID_INFO: ✓ Got size for {resolution}p: {sized['filesize']/1024/1024:.1f}MB ({format_debug_info[resolution]})")
+                    if on_partial:
+                        on_partial({'video_formats': {resolution: video_formats_out[resolution]}})
+                else:
+                    print(f"VID_INFO: No size available for {resolution}p, using improved estimation")
                     video_formats_out[resolution] = self._improved_estimation(resolution, duration)
 
             # Detect and handle duplicate sizes
             video_formats_out = self._detect_and_handle_duplicate_sizes(video_formats_out)
 
-            # Try audio formats with maximum persistence
             successful_audio_sims = 0
             for quality_kbps in [128, 192, 256, 320]:
-                success = False
-                max_attempts = 4
-                
-                for attempt in range(max_attempts):
-                    try:
-                        format_spec = f'bestaudio[abr<={quality_kbps}]/bestaudio/best'
-                        current_sim_opts = {**base_sim_opts, 'format': format_spec}
-                        
-                        attempt_timeout = sim_timeout + (attempt * 20)  # Smaller increments for audio
-                        current_sim_opts['socket_timeout'] = attempt_timeout
-
-                        sim_start_time = time.time()
-                        print(f"VID_INFO: Simulating {quality_kbps}kbps audio (attempt {attempt + 1}/{max_attempts}, timeout: {attempt_timeout}s)...")
-                        
-                        with yt_dlp.YoutubeDL(current_sim_opts) as sim_ydl:
-                            sim_info = sim_ydl.extract_info(url, download=False)
-                        
-                        filesize = sim_info.get('filesize') or sim_info.get('filesize_approx')
-                        sim_time = time.time() - sim_start_time
-                        
-                        if filesize and filesize > 0:
-                            audio_formats_out[quality_kbps] = {'filesize': int(filesize), 'estimated': False}
-                            successful_audio_sims += 1
-                            print(f"VID_INFO: ✓ Got actual size for {quality_kbps}kbps audio: {filesize/1024/1024:.1f}MB (took {sim_time:.2f}s)")
-                            success = True
-                            break
-                        else:
-                            print(f"VID_INFO: No size returned for {quality_kbps}kbps audio on attempt {attempt + 1}")
-
-                    except Exception as e:
-                        print(f"VID_INFO: Error simulating {quality_kbps}kbps audio attempt {attempt + 1}: {e}")
-                        if attempt < max_attempts - 1:
-                            delay = min(5 + (attempt * 3), 20)  # Smaller delays for audio
-                            print(f"VID_INFO: Waiting {delay}s before retry...")
-                            time.sleep(delay)
-                            continue
-                
-                if not success:
-                    print(f"VID_INFO: All attempts failed for {quality_kbps}kbps audio, using improved estimation")
+                try:
+                    selected = self._select_format(ydl, formats, self._audio_format_spec(quality_kbps))
+                except Exception as e:
+                    print(f"VID_INFO: Error selecting format for {quality_kbps}kbps audio: {e}")
+                    selected = None
+
+                output_mode = self._audio_output_plan(self._selected_codec(selected, 'audio'), selected.get('abr'), quality_kbps)[0] if selected else None
+                if output_mode == 'transcode' and FFMPEG_PATH:
+                    # Encoded to constant-bitrate MP3, so the output size follows from the duration
+                    sized = {'filesize': int(quality_kbps * 1000 / 8 * duration), 'estimated': False}
+                else:
+                    sized = self._sized_format('audio', quality_kbps, selected, duration)
+
+                if sized:
+                    audio_formats_out[quality_kbps] = sized
+                    successful_audio_sims += 1
+                    print(f"VID_INFO: ✓ Got size for {quality_kbps}kbps audio: {sized['filesize']/1024/1024:.1f}MB")
+                    if on_partial:
+                        on_partial({'audio_formats': {quality_kbps: audio_formats_out[quality_kbps]}})
+                else:
+                    print(f"VID_INFO: No size available for {quality_kbps}kbps audio, using improved estimation")
                     audio_formats_out[quality_kbps] = self._improved_audio_estimation(quality_kbps, duration)
 
             # Check for any remaining duplicates and log them
@@ -385,7 +2338,9 @@ class VideoDownloader:
                 if len(resolutions) > 1:
                     print(f"VID_INFO: Warning - Multiple resolutions ({resolutions}) have same size: {size/1024/1024:.1f}MB")
 
-            print(f"VID_INFO: Aggressive simulation completed - got {successful_video_sims}/4 video sizes and {successful_audio_sims}/4 audio sizes")
+            resolve_time = time.time() - resolve_start_time
+            METRICS.observe('format_resolution_seconds', resolve_time)
+            print(f"VID_INFO: Local format resolution completed in {resolve_time:.3f}s - got {successful_video_sims}/4 video sizes and {successful_audio_sims}/4 audio sizes")
             
             return {
                 'success': True,
@@ -400,39 +2355,173 @@ class VideoDownloader:
             }
 
         except Exception as e:
-            print(f"VID_INFO: Aggressive simulation completely failed: {e}")
+            print(f"VID_INFO: Local format resolution completely failed: {e}")
             return None
 
-    def get_video_info(self, video_id):
+    def _get_signed_url_expiry(self, info):
+        """Earliest 'expire' timestamp among the signed format URLs, if any"""
+        expiries = []
+        for fmt in info.get('formats') or []:
+            expire = parse_qs(urlparse(fmt.get('url') or '').query).get('expire')
+            if expire and expire[0].isdigit():
+                expiries.append(int(expire[0]))
+        return min(expiries) if expiries else None
+
+    def _video_info_ttl(self, result):
+        """Cache lifetime for a video info result, bounded by its signed URL expiry"""
+        if not result or not result.get('success'):
+            return 0
+        if result.get('estimated_only'):
+            return CONFIG['VIDEO_INFO_CACHE_ESTIMATE_TTL_SECONDS']
+        ttl = CONFIG['VIDEO_INFO_CACHE_TTL_SECONDS']
+        urls_expire_at = result.get('urls_expire_at')
+        if urls_expire_at:
+            ttl = min(ttl, urls_expire_at - time.time() - CONFIG['VIDEO_INFO_CACHE_URL_EXPIRY_MARGIN_SECONDS'])
+        return ttl
+
+    def get_video_info(self, video_id, cancel_event=None, on_partial=None):
+        """Video info from the cache or a fresh extraction; setting cancel_event abandons the extraction"""
+        while True:
+            try:
+                info = self.video_info_cache.get_or_compute(video_id, lambda: self._fetch_video_info(video_id, cancel_event, on_partial))
+                self._maybe_prefetch(video_id, info)
+                return info
+            except yt_dlp.utils.DownloadCancelled:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise
+                # Coalesced onto a lookup that its own caller cancelled; run a fresh one
+
+    def get_video_info_progressive(self, video_id):
+        """Cached info, or an immediate estimate plus a token for the exact sizes resolved in the background"""
+        cached_info = self.video_info_cache.peek(video_id)
+        if cached_info:
+            self._maybe_prefetch(video_id, cached_info)
+            return cached_info
+
+        token, _ = self.start_info_refinement(video_id)
+        # Sizes depend on the duration, which only the extraction knows; the partial event brings the estimates
+        unknown = {'filesize': None, 'estimated': True, 'unknown': True}
+        return {
+            'success': True,
+            'title': None,
+            'duration': None,
+            'video_formats': {res: dict(unknown) for res in [360, 480, 720, 1080]},
+            'audio_formats': {qual: dict(unknown) for qual in [128, 192, 256, 320]},
+            'thumbnail': None,
+            'estimated_only': True,
+            'message': 'Sizes are being resolved',
+            'refinement_token': token,
+            'refinement_url': f"{CONFIG['LOCAL_SERVER_URL']}/api/video_info/refinement/{token}",
+            'refinement_events_url': f"{CONFIG['LOCAL_SERVER_URL']}/api/events/video_info/{token}",
+        }
+
+    def start_info_refinement(self, video_id):
+        """Token and state of the background lookup for video_id, starting one if none is pending"""
+        with self._refinement_lock:
+            cutoff = time.time() - CONFIG['INFO_REFINEMENT_TTL_SECONDS']
+            for token in [token for token, refinement in self._refinements.items() if refinement.created_at < cutoff]:
+                del self._refinements[token]
+
+            token = self._refinement_tokens.get(video_id)
+            if token in self._refinements:
+                return token, self._refinements[token]
+            token = uuid.uuid4().hex
+            refinement = InfoRefinement(video_id)
+            self._refinements[token] = refinement
+            self._refinement_tokens[video_id] = token
+        self._refinement_executor.submit(self._run_info_refinement, token, refinement)
+        return token, refinement
+
+    def get_info_refinement(self, token):
+        with self._refinement_lock:
+            return self._refinements.get(token)
+
+    def _run_info_refinement(self, token, refinement):
+        try:
+            result = self.get_video_info(refinement.video_id, on_partial=refinement.update)
+            refinement.update(result, status='complete' if result.get('success') else 'failed')
+        except Exception as e:
+            refinement.update({'success': False, 'message': str(e)}, status='failed')
+        finally:
+            with self._refinement_lock:
+                if self._refinement_tokens.get(refinement.video_id) == token:
+                    del self._refinement_tokens[refinement.video_id]
+
+    def _info_ydl_options(self):
+        return {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': False, 
+            'skip_download': True,
+            'no_check_certificate': True,
+            'socket_timeout': 120,  # 2 minutes for initial info
+            'http_headers': {
+                'User-Agent': self._get_random_user_agent(),
+                'Accept-Language': 'en-US,en;q=0.5',
+            },
+            'retries': 5,
+            'fragment_retries': 5,
+        }
+
+    def _playlist_ydl_options(self):
+        return {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            'playlistend': CONFIG['BATCH_MAX_ITEMS'],
+            'socket_timeout': 60,
+            'http_headers': {
+                'User-Agent': self._get_random_user_agent(),
+                'Accept-Language': 'en-US,en;q=0.5',
+            },
+            'retries': 5,
+        }
+
+    def _extract_info(self, url, profile='info', cancel_event=None):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            with self.ydl_pool.checkout(profile, cancel_event=cancel_event) as ydl:
+                info = ydl.extract_info(url, download=False)
+            outcome = 'ok'
+            return info
+        finally:
+            METRICS.observe('ytdl_extract_info_seconds', time.perf_counter() - start, profile=profile, outcome=outcome)
+
+    def expand_playlist(self, url):
+        """Video ids, titles and durations of a playlist or channel from a flat extraction"""
+        info = self.retry_policy.call(lambda attempt: self._extract_info(url, 'playlist'), CONFIG['INFO_RETRY_BUDGET_SECONDS'])
+        items = []
+        for entry in info.get('entries') or []:
+            if entry and valid_video_id(entry.get('id')):
+                items.append({'video_id': entry['id'], 'title': entry.get('title'), 'duration': entry.get('duration')})
+        return info.get('title'), items
+
+    def _fetch_video_info(self, video_id, cancel_event=None, on_partial=None):
         try:
             url = f'https://www.youtube.com/watch?v={video_id}'
             
-            # Start with extended timeout for initial info
-            base_ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False, 
-                'skip_download': True,
-                'no_check_certificate': True,
-                'socket_timeout': 120,  # 2 minutes for initial info
-                'http_headers': {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Accept-Language': 'en-US,en;q=0.5',
-                },
-                'retries': 5,
-                'fragment_retries': 5,
-            }
-            
             print(f"VID_INFO: Getting initial info for {video_id} with extended timeout...")
             start_time = time.time()
             
-            with yt_dlp.YoutubeDL(base_ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False) 
+            info = self.retry_policy.call(
+                lambda attempt: self._extract_info(url, cancel_event=cancel_event), CONFIG['INFO_RETRY_BUDGET_SECONDS']
+            )
             
             duration = info.get('duration', 0)
             initial_time = time.time() - start_time
             print(f"VID_INFO: Initial info for {video_id} (duration: {duration}s) fetched in {initial_time:.2f}s")
 
+            if on_partial and duration:
+                on_partial({
+                    'title': info.get('title', 'Unknown Title'),
+                    'duration': duration,
+                    'thumbnail': info.get('thumbnail'),
+                    'video_formats': {res: self._improved_estimation(res, duration) for res in [360, 480, 720, 1080]},
+                    'audio_formats': {qual: self._improved_audio_estimation(qual, duration) for qual in [128, 192, 256, 320]},
+                })
+
             if not duration:
                 print(f"VID_INFO: Could not determine duration for {video_id}. Using improved estimations.")
                 # Use improved estimation with default 10-minute duration
@@ -451,18 +2540,20 @@ class VideoDownloader:
                     'message': 'Could not determine duration, using improved estimation'
                 }
 
-            # No duration limit - try aggressive simulation for ALL videos
-            print(f"VID_INFO: Attempting aggressive simulation for {video_id} ({duration}s duration)...")
-            actual_sizes = self._aggressive_size_simulation(url, duration, info)
+            # Selectors only need the format list, so resolve them all locally from this one extraction
+            print(f"VID_INFO: Resolving format sizes locally for {video_id} ({duration}s duration)...")
+            with self.ydl_pool.checkout('info') as ydl:
+                actual_sizes = self._resolve_format_sizes(ydl, info, duration, on_partial)
             
             if actual_sizes:
                 total_time = time.time() - start_time
-                print(f"VID_INFO: Aggressive simulation completed for {video_id} in {total_time:.2f}s total")
+                print(f"VID_INFO: Format sizes resolved for {video_id} in {total_time:.2f}s total")
                 actual_sizes['processing_time_seconds'] = round(total_time, 2)
+                actual_sizes['urls_expire_at'] = self._get_signed_url_expiry(info)
                 return actual_sizes
             
-            # If even aggressive simulation fails, use improved estimation
-            print(f"VID_INFO: Aggressive simulation failed, using improved estimation for {video_id}")
+            # If local resolution fails, use improved estimation
+            print(f"VID_INFO: Local format resolution failed, using improved estimation for {video_id}")
             video_formats = {res: self._improved_estimation(res, duration) for res in [360, 480, 720, 1080]}
             audio_formats = {qual: self._improved_audio_estimation(qual, duration) for qual in [128, 192, 256, 320]}
             
@@ -474,180 +2565,703 @@ class VideoDownloader:
                 'audio_formats': audio_formats,
                 'thumbnail': info.get('thumbnail'),
                 'estimated_only': True,
-                'message': 'Aggressive simulation failed, using improved estimation'
+                'message': 'Format size resolution failed, using improved estimation'
             }
             fallback_result['processing_time_seconds'] = round(time.time() - start_time, 2)
             return fallback_result
 
-        except Exception as e_main:
-            print(f"VID_INFO: Major error getting video info for {video_id}: {e_main}")
-            # Fallback response with improved estimation
-            video_formats = {res: self._improved_estimation(res, 600) for res in [360, 480, 720, 1080]}
-            audio_formats = {qual: self._improved_audio_estimation(qual, 600) for qual in [128, 192, 256, 320]}
-            
-            return {
-                'success': True,
-                'title': f'Video {video_id}',
-                'duration': 600,
-                'video_formats': video_formats,
-                'audio_formats': audio_formats,
-                'thumbnail': None,
-                'estimated_only': True,
-                'message': f'Error occurred: {str(e_main)[:50]}...'
-            }
+        except yt_dlp.utils.DownloadCancelled:
+            print(f"VID_INFO: Lookup for {video_id} cancelled")
+            raise
+        except UpstreamThrottled as e:
+            # Shed the extraction while upstream is throttling; the estimate is only cached briefly
+            print(f"VID_INFO: Skipping extraction for {video_id}: {e}")
+            return {
+                'success': True,
+                'title': f'Video {video_id}',
+                'duration': 600,
+                'video_formats': {res: self._improved_estimation(res, 600) for res in [360, 480, 720, 1080]},
+                'audio_formats': {qual: self._improved_audio_estimation(qual, 600) for qual in [128, 192, 256, 320]},
+                'thumbnail': None,
+                'estimated_only': True,
+                'message': f'{e}; using estimated sizes'
+            }
+        except Exception as e_main:
+            print(f"VID_INFO: Major error getting video info for {video_id}: {e_main}")
+            # Fallback response with improved estimation
+            video_formats = {res: self._improved_estimation(res, 600) for res in [360, 480, 720, 1080]}
+            audio_formats = {qual: self._improved_audio_estimation(qual, 600) for qual in [128, 192, 256, 320]}
+            
+            return {
+                'success': True,
+                'title': f'Video {video_id}',
+                'duration': 600,
+                'video_formats': video_formats,
+                'audio_formats': audio_formats,
+                'thumbnail': None,
+                'estimated_only': True,
+                'message': f'Error occurred: {str(e_main)[:50]}...'
+            }
+
+    def _expected_size(self, video_id, job_type, format_value):
+        """Size reported by a cached get_video_info result, used to reserve disk space up front"""
+        cached_info = self.video_info_cache.peek(video_id)
+        if not cached_info:
+            return 0
+        formats = cached_info.get('audio_formats' if job_type == 'audio' else 'video_formats') or {}
+        return (formats.get(int(format_value)) or {}).get('filesize') or 0
+
+    def _known_duration(self, video_id):
+        """Duration from a cached get_video_info result, without triggering an extraction"""
+        cached_info = self.video_info_cache.peek(video_id)
+        return cached_info.get('duration') if cached_info else None
+
+    def _safe_title(self, title):
+        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip().replace(" ", "_")
+        return safe_title[:60]
+
+    def _job_file_stem(self, video_id, job_type, format_value):
+        suffix = 'kbps' if job_type == 'audio' else 'p'
+        return f"{video_id}_{format_value}{suffix}"
+
+    def _find_completed_file(self, video_id, job_type, format_value):
+        """Existing non-empty final file for a job, ignoring .part and per-format intermediates"""
+        stem = self._job_file_stem(video_id, job_type, format_value)
+        for file_path in self.downloads_dir.glob(f"{stem}.*"):
+            try:
+                if file_path.stem == stem and file_path.is_file() and file_path.stat().st_size > 0:
+                    return file_path
+            except OSError:
+                continue
+        return None
+
+    def download_name_for(self, filename, entry):
+        """Name offered to the browser; the client's title is only used here, never on disk"""
+        format_value = entry.get('quality') if entry.get('type') == 'audio' else entry.get('resolution')
+        suffix = 'kbps' if entry.get('type') == 'audio' else 'p'
+        return f"{self._safe_title(entry.get('title') or '')}_{format_value}{suffix}{Path(filename).suffix}"
+
+    def _build_download_url(self, filename, entry):
+        """Local URL for a finished file"""
+        download_name = self.download_name_for(filename, entry)
+        return f"{CONFIG['LOCAL_SERVER_URL']}/download/{quote(filename)}?name={quote(download_name)}"
+
+    def _new_job_entry(self, job_type, video_id, format_value, title):
+        return {
+            'status': 'pending',
+            'message': 'Audio download queued' if job_type == 'audio' else 'Download queued',
+            'created_at': datetime.now().isoformat(),
+            'video_id': video_id,
+            'quality' if job_type == 'audio' else 'resolution': format_value,
+            'title': title,
+            'type': job_type,
+            'download_url': None,
+            'file_size_mb': None,
+            'updated_at': datetime.now().isoformat(),
+        }
+
+    def _start_job(self, job_type, video_id, format_value, title, batch_id=None, duration=None, queue_delay=0, client=None):
+        request_id = str(uuid.uuid4())
+        entry = self._new_job_entry(job_type, video_id, format_value, title)
+        if batch_id:
+            entry['batch_id'] = batch_id
+        if client:
+            entry['client'] = client
+        existing_file = self._find_completed_file(video_id, job_type, format_value)
+
+        if existing_file:
+            self.file_catalog.touch(existing_file.name)
+            self.job_store.create(request_id, entry)
+            self._update_status(
+                request_id, 'complete', 'File already available locally.',
+                filename=existing_file.name, file_size_mb=existing_file.stat().st_size / (1024 * 1024)
+            )
+            return request_id
+
+        job_key = f"{video_id}:{job_type}:{format_value}"
+        primary_id = self.job_store.create(request_id, entry, job_key=job_key, owner=self.owner_id)
+        if primary_id:
+            # Attached to the identical job already queued or running
+            self._promote_prefetch(job_key, primary_id)
+            return request_id
+
+        self._submit_job(request_id, job_type, video_id, format_value, duration, queue_delay)
+        return request_id
+
+    def _submit_job(self, request_id, job_type, video_id, format_value, duration=None, queue_delay=0):
+        duration = duration or self._known_duration(video_id)
+        self._own_job(request_id)
+        if job_type == 'audio':
+            self.audio_scheduler.submit(request_id, self._download_audio, (request_id, video_id, format_value), duration, queue_delay)
+        else:
+            self.video_scheduler.submit(request_id, self._download_video, (request_id, video_id, format_value), duration, queue_delay)
+
+    def _record_choice(self, job_type, format_value):
+        if not CONFIG['PREFETCH_ENABLED']:
+            return
+        with self._prefetch_lock:
+            self._load_choice_counts_locked()[(job_type, str(format_value))] += 1
+
+    def _load_choice_counts_locked(self):
+        if self._choice_counts is None:
+            self._choice_counts = Counter(
+                (entry.get('type', 'video'), str(entry.get('quality') if entry.get('type') == 'audio' else entry.get('resolution')))
+                for entry in self.job_store.all().values()
+                if not entry.get('prefetch') and not entry.get('batch_id')
+            )
+        return self._choice_counts
+
+    def _predicted_choice(self):
+        """(type, format) requested most often, once there is enough history to go by"""
+        with self._prefetch_lock:
+            counts = self._load_choice_counts_locked()
+            if sum(counts.values()) < CONFIG['PREFETCH_MIN_HISTORY']:
+                return None
+            return counts.most_common(1)[0][0]
+
+    def _maybe_prefetch(self, video_id, info):
+        """Start downloading the format users pick most often, before anyone asks for it.
+
+        The prefetch is an ordinary job under the usual job key, so a matching
+        download request attaches to it and promotes it. Unrequested prefetches
+        run on their own scheduler at a low bandwidth weight and are cancelled
+        when their window closes.
+        """
+        if not CONFIG['PREFETCH_ENABLED'] or not info.get('success') or info.get('estimated_only'):
+            return
+        choice = self._predicted_choice()
+        if not choice:
+            return
+        job_type, format_value = choice
+        formats = info.get('audio_formats' if job_type == 'audio' else 'video_formats') or {}
+        format_info = formats.get(int(format_value)) or formats.get(format_value)
+        if not format_info or (format_info.get('filesize') or 0) > CONFIG['PREFETCH_MAX_BYTES']:
+            return
+
+        job_key = f"{video_id}:{job_type}:{format_value}"
+        with self._prefetch_lock:
+            if job_key in self._prefetches or len(self._prefetches) >= CONFIG['PREFETCH_MAX_PENDING']:
+                return
+            if self.job_store.active_job(job_key) or self._find_completed_file(video_id, job_type, format_value):
+                return
+            request_id = str(uuid.uuid4())
+            entry = self._new_job_entry(job_type, video_id, format_value, info.get('title') or f"youtube_{video_id}")
+            entry.update(prefetch=True, message='Prefetch queued')
+            if self.job_store.create(request_id, entry, job_key=job_key, owner=self.owner_id):
+                return  # a real request for it arrived in the meantime
+            timer = threading.Timer(CONFIG['PREFETCH_WINDOW_SECONDS'], self._expire_prefetch, (job_key, request_id))
+            timer.daemon = True
+            self._prefetches[job_key] = Prefetch(request_id, job_type, timer)
+            self._own_job(request_id)
+        timer.start()
+        METRICS.inc('prefetch_jobs_total', outcome='started')
+        print(f"Prefetching {job_type} {video_id} @ {format_value} as {request_id}")
+        self.prefetch_scheduler.submit(request_id, self._run_prefetch, (request_id, job_type, video_id, format_value), info.get('duration'))
+
+    def _run_prefetch(self, request_id, job_type, video_id, format_value):
+        self._apply_requested_cancels([request_id])
+        if request_id in self._cancel_requests:
+            # Expired while it waited for a slot
+            self._finish_cancelled(request_id, None)
+        elif job_type == 'audio':
+            self._download_audio(request_id, video_id, format_value)
+        else:
+            self._download_video(request_id, video_id, format_value)
+
+    def _promote_prefetch(self, job_key, primary_id):
+        """A download request attached to a prefetch: keep it, at its normal bandwidth weight"""
+        with self._prefetch_lock:
+            prefetch = self._prefetches.get(job_key)
+            if not prefetch or prefetch.request_id != primary_id:
+                return
+            del self._prefetches[job_key]
+            prefetch.timer.cancel()
+            self._cancel_requests.pop(primary_id, None)
+        self._keep_prefetch(primary_id, prefetch.job_type)
+
+    def _keep_prefetch(self, request_id, job_type):
+        self.job_store.mark_watched([request_id], time.time())
+        self.job_store.update(request_id, lambda entry: entry.update(prefetch='promoted'))
+        self.bandwidth.set_job_type(request_id, job_type)
+        METRICS.inc('prefetch_jobs_total', outcome='promoted')
+
+    def _expire_prefetch(self, job_key, request_id):
+        with self._prefetch_lock:
+            prefetch = self._prefetches.get(job_key)
+            if not prefetch or prefetch.request_id != request_id:
+                return
+            del self._prefetches[job_key]
+        if self.job_store.followers(request_id):
+            # A request attached through another worker, which had no timer to stop; promote it here instead
+            self._keep_prefetch(request_id, prefetch.job_type)
+            return
+        if self.cancel_job(request_id, 'Prefetch discarded: not requested in time.', reason='prefetch_expired'):
+            METRICS.inc('prefetch_jobs_total', outcome='expired')
+        else:
+            # Finished within the window; the file stays in the cache like any other download
+            METRICS.inc('prefetch_jobs_total', outcome='completed')
+
+    def cancel_job(self, request_id, message='Download cancelled.', reason='request'):
+        """Withdraw request_id from its download; False if it has already finished.
+
+        Identical requests share one job. A request attached to another is
+        detached and marked cancelled on its own; the job itself stops only
+        once no request is left waiting for it.
+        """
+        entry = self.job_store.get(request_id)
+        if not entry or entry['status'] not in ACTIVE_JOB_STATUSES:
+            return False
+        primary_id = entry.get('attached_to') or request_id
+        if primary_id != request_id:
+            self.job_store.detach(request_id, lambda entry: entry.update(status='failed', message=message, cancelled=True))
+            self.status_broker.publish()
+        else:
+            def withdraw(entry):
+                if 'attached_to' not in entry:
+                    entry['withdrawn'] = True
+            self.job_store.update(primary_id, withdraw)
+        if self.job_store.followers(primary_id):
+            print(f"Request {request_id} withdrawn from job {primary_id}, which other requests still wait for")
+            return True
+        primary = self.job_store.get(primary_id) or {}
+        # A prefetch's own entry stands for no client; any other primary still has the client that started it
+        if primary_id != request_id and not primary.get('withdrawn') and not primary.get('prefetch'):
+            return True
+        self._cancel_primary(primary_id, message, reason)
+        return True
+
+    def _cancel_primary(self, primary_id, message, reason):
+        """Stop a job and every request attached to it.
 
-    def start_audio_download(self, video_id, quality, title):
-        request_id = str(uuid.uuid4())
-        with download_lock:
-            download_status[request_id] = {
-                'status': 'pending',
-                'message': 'Audio download request received',
-                'created_at': datetime.now().isoformat(),
-                'video_id': video_id,
-                'quality': quality,
-                'title': title,
-                'type': 'audio',
-                'download_url': None,
-                'file_size_mb': None,
-                'updated_at': datetime.now().isoformat(),
-            }
-        
-        download_thread = threading.Thread(
-            target=self._download_audio,
-            args=(request_id, video_id, quality, title),
-            daemon=True
-        )
-        download_thread.start()
-        return request_id
+        The request goes through the job store, so it reaches the job in
+        whichever worker process runs it; that process applies it at once if it
+        is this one, and otherwise from its next heartbeat.
+        """
+        if not self.job_store.request_cancel(primary_id, message):
+            return
+        METRICS.inc('jobs_cancelled_total', reason=reason)
+        print(f"Cancelling job {primary_id} ({reason})")
+        if primary_id in self._owned_jobs:
+            self._apply_cancel(primary_id, message)
 
-    def _download_audio(self, request_id, video_id, quality, title):
-        final_downloaded_file_path = None
+    def _apply_requested_cancels(self, request_ids):
+        """Stop the jobs of this process that some worker asked to cancel"""
+        for request_id, message in self.job_store.cancel_requests(request_ids).items():
+            if request_id in self._owned_jobs:
+                self._apply_cancel(request_id, message)
+
+    def _apply_cancel(self, primary_id, message):
+        """Stop a job this process runs.
+
+        A queued job is dropped at once; a running download stops at its next
+        progress hook or retry wait, and an audio encode has its ffmpeg killed.
+        The job's partial files are removed when it stops.
+        """
+        if primary_id in self._cancel_requests:
+            return
+        self._cancel_requests[primary_id] = message
+        cancel_event = self._cancel_events.get(primary_id)
+        if cancel_event:
+            cancel_event.set()
+        process = self._postprocess_procs.get(primary_id)
+        if process:
+            process.kill()
+        if any(scheduler.cancel(primary_id) for scheduler in (self.video_scheduler, self.audio_scheduler, self.prefetch_scheduler)):
+            self._finish_cancelled(primary_id, None)
+
+    def _finish_cancelled(self, request_id, file_stem):
+        message = self._cancel_requests.pop(request_id, 'Download cancelled.')
+        if file_stem:
+            self._discard_partial_files(file_stem)
+        self.job_store.update(request_id, lambda entry: entry.update(cancelled=True))
+        self._update_status(request_id, 'failed', message)
+
+    def _own_job(self, request_id):
+        """Count a job as run by this process, watched from the moment it starts"""
+        self._owned_jobs.add(request_id)
+        self.job_store.mark_watched([request_id], time.time())
+
+    def _note_watched(self, request_ids):
+        """Record in the job store that a client asked about these jobs.
+
+        Each is written at most once per heartbeat interval, which is far finer
+        than the abandonment timeout.
+        """
+        now = time.time()
+        due = [rid for rid in request_ids if now - self._watch_marks.get(rid, 0) >= CONFIG['JOB_STORE_HEARTBEAT_SECONDS']]
+        if due:
+            self._watch_marks.update(dict.fromkeys(due, now))
+            self.job_store.mark_watched(due, now)
+
+    def _cancel_abandoned_jobs(self):
+        """Cancel jobs of this process no client of any worker has asked about within JOB_ABANDON_TIMEOUT_SECONDS"""
+        now = time.time()
+        for request_id, marked_at in list(self._watch_marks.items()):
+            if now - marked_at >= CONFIG['JOB_STORE_HEARTBEAT_SECONDS']:
+                self._watch_marks.pop(request_id, None)
+        timeout = CONFIG['JOB_ABANDON_TIMEOUT_SECONDS']
+        if not timeout:
+            return
+        cutoff = now - timeout
+        owned = list(self._owned_jobs)
+        watched = self.job_store.watched_at([JobStore.ALL_JOBS, *owned])
+        if watched.get(JobStore.ALL_JOBS, 0) >= cutoff:
+            return
+        for request_id in owned:
+            if watched.get(request_id, 0) < cutoff and request_id in self._owned_jobs:
+                self._cancel_primary(
+                    request_id, f"Cancelled: no client checked on this download for {timeout / 60:.0f} minutes.", 'abandoned'
+                )
+
+    def start_batch(self, job_type, format_value, items, title=None, source=None, client=None):
+        """Start one job per item and record them under a single batch id.
+
+        Items are queued as if each was submitted when the previous one would
+        be done, so a long batch does not hold back single downloads that
+        arrive after it.
+        """
+        batch_id = str(uuid.uuid4())
+        request_ids = []
+        queue_delay = 0
+        for item in items:
+            duration = item.get('duration') or self._known_duration(item['video_id'])
+            request_ids.append(self._start_job(
+                job_type, item['video_id'], format_value, item.get('title') or f"youtube_{item['video_id']}",
+                batch_id=batch_id, duration=duration, queue_delay=queue_delay, client=client
+            ))
+            queue_delay += (duration or CONFIG['SCHEDULER_DEFAULT_DURATION']) * CONFIG['SCHEDULER_DURATION_WEIGHT']
+        self.job_store.create_batch(batch_id, {
+            'batch_id': batch_id,
+            'type': job_type,
+            'quality' if job_type == 'audio' else 'resolution': format_value,
+            'title': title,
+            'source': source,
+            'created_at': datetime.now().isoformat(),
+            'items': request_ids,
+        })
+        return batch_id, request_ids
+
+    def start_audio_download(self, video_id, quality, title, client=None):
+        self._record_choice('audio', quality)
+        return self._start_job('audio', video_id, quality, title, client=client)
+
+    def _download_audio(self, request_id, video_id, quality):
+        """Download the audio stream, then hand it to the post-processing pool.
+
+        The scheduler slot is released as soon as the network part is done, so
+        encodes queue on their own workers instead of holding up downloads.
+        """
         progress_hook_key = f"{request_id}_progress_{str(uuid.uuid4())[:8]}"
 
+        file_stem = self._job_file_stem(video_id, 'audio', quality)
+        self.file_catalog.protect(file_stem)
+        self._take_resume_hold(request_id)
+        handed_off = False
+
         try:
             self._update_status(request_id, 'processing', 'Initializing audio download...')
+            self.file_catalog.make_room(self._expected_size(video_id, 'audio', quality))
 
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip().replace(" ", "_")
-            safe_title = safe_title[:60]
-            
-            filename_template_str = f"{safe_title}_{video_id}_{quality}kbps.%(ext)s"
-            output_template_path = self.downloads_dir / filename_template_str
+            # The raw stream keeps the job's file stem so the catalog protects it, but is never mistaken for the result
+            output_template_path = self.downloads_dir / f"{file_stem}.source.%(ext)s"
             
             url = f'https://www.youtube.com/watch?v={video_id}'
             
-            ydl_opts = {
-                'format': f'bestaudio[abr<={quality}]/bestaudio/best',
+            ydl_overrides = {
+                'format_spec': self._audio_format_spec(quality),
                 'outtmpl': str(output_template_path),
-                'noplaylist': True,
-                'writethumbnail': False,
-                'writeinfojson': False,
-                'extractaudio': True,
-                'audioformat': 'mp3',
-                'http_headers': {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Accept-Language': 'en-US,en;q=0.5',
-                },
-                'retries': 5,
-                'fragment_retries': 5,
-                'socket_timeout': 60,
-                'no_warnings': True,
-                'ignoreerrors': False,
-                'verbose': False,
-                'progress_hooks': [lambda d: self._ydl_progress_hook(d, progress_hook_key)],
+                'progress_hooks': [lambda d: self._ydl_progress_hook(d, progress_hook_key, request_id)],
+                'postprocessor_hooks': [lambda d: self._ydl_postprocessor_hook(d, request_id)],
             }
             
             self._update_status(request_id, 'processing', 'Starting audio download with yt-dlp...')
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self._update_status(request_id, 'processing', 'Extracting audio...')
-                ydl.download([url])
+            self._download_with_retries(request_id, 'audio', url, ydl_overrides)
 
-            final_filename_from_hook = self.final_filenames.pop(progress_hook_key, None)
-
-            if final_filename_from_hook and Path(final_filename_from_hook).exists():
-                final_downloaded_file_path = Path(final_filename_from_hook)
-            else:
-                expected_final_filename = f"{safe_title}_{video_id}_{quality}kbps.mp3"
-                potential_file = self.downloads_dir / expected_final_filename
-                if potential_file.exists() and potential_file.is_file():
-                    final_downloaded_file_path = potential_file
-                else:
-                    glob_pattern = f"{safe_title}_{video_id}_{quality}kbps.*"
-                    found_files = list(self.downloads_dir.glob(glob_pattern))
-                    if found_files:
-                        final_downloaded_file_path = found_files[0] 
-            
-            if not final_downloaded_file_path or not final_downloaded_file_path.exists():
+            source_filename = self.final_filenames.pop(progress_hook_key, None)
+            source_path = Path(source_filename) if source_filename else None
+            if not source_path or not source_path.exists():
+                source_path = next(self.downloads_dir.glob(f"{file_stem}.source.*"), None)
+            if not source_path or not source_path.exists():
                 raise Exception("Downloaded audio file not found after yt-dlp execution.")
-
-            file_size_mb = final_downloaded_file_path.stat().st_size / (1024 * 1024)
-            if file_size_mb == 0:
-                if final_downloaded_file_path.exists(): final_downloaded_file_path.unlink(missing_ok=True)
+            if source_path.stat().st_size == 0:
+                source_path.unlink(missing_ok=True)
                 raise Exception("Downloaded audio file is empty.")
 
-            self._update_status(request_id, 'processing', 'Preparing local download link...')
-            download_url = f"{CONFIG['LOCAL_SERVER_URL']}/download/{final_downloaded_file_path.name}"
-            status_message = 'Audio download complete. File available locally.'
-
-            self._update_status(
-                request_id, 'complete', status_message,
-                download_url=download_url, file_size_mb=file_size_mb
+            media = self.final_media.get(progress_hook_key) or {}
+            self._update_status(request_id, 'processing', 'Waiting for audio conversion...')
+            self.audio_postprocessor.submit(
+                self._postprocess_audio, request_id, video_id, quality, source_path, file_stem,
+                media.get('acodec'), media.get('abr'), media.get('duration') or self._known_duration(video_id)
             )
+            handed_off = True
 
+        except yt_dlp.utils.DownloadCancelled:
+            self._finish_cancelled(request_id, file_stem)
+        except (yt_dlp.utils.DownloadError, UpstreamThrottled) as e:
+            _, cause, user_message = RetryPolicy.classify(e)
+            METRICS.inc('job_failures_total', type='audio', cause=cause)
+            self._update_status(request_id, 'failed', user_message)
         except Exception as e:
+            METRICS.inc('job_failures_total', type='audio', cause='internal')
             error_msg = str(e)
             specific_msg = f"Audio download failed: {error_msg}"
             self._update_status(request_id, 'failed', specific_msg)
         finally:
             self.final_filenames.pop(progress_hook_key, None)
+            self.final_media.pop(progress_hook_key, None)
+            if not handed_off:
+                self.file_catalog.release(file_stem)
 
-    def start_download(self, video_id, resolution, title):
-        request_id = str(uuid.uuid4())
-        with download_lock:
-            download_status[request_id] = {
-                'status': 'pending',
-                'message': 'Download request received',
-                'created_at': datetime.now().isoformat(),
-                'video_id': video_id,
-                'resolution': resolution,
-                'title': title,
-                'type': 'video',
-                'download_url': None,
-                'file_size_mb': None,
-                'updated_at': datetime.now().isoformat(),
-            }
-        
-        download_thread = threading.Thread(
-            target=self._download_video,
-            args=(request_id, video_id, resolution, title),
-            daemon=True
-        )
-        download_thread.start()
-        return request_id
+    def _audio_remux_range(self, quality):
+        tolerance = CONFIG['AUDIO_REMUX_BITRATE_TOLERANCE']
+        return int(quality) * (1 - tolerance), int(quality) * (1 + tolerance)
+
+    def _audio_format_spec(self, quality):
+        # AAC at about the requested bitrate can be remuxed as is; otherwise the best stream is encoded
+        low, high = self._audio_remux_range(quality)
+        return f'bestaudio[acodec^=mp4a][abr>={low:g}][abr<={high:g}]/bestaudio/best'
+
+    def _audio_output_plan(self, acodec, abr, quality):
+        """(mode, extension, ffmpeg muxer) for an audio source.
+
+        A source in a widely playable codec whose bitrate is about the request
+        is only remuxed, so the file keeps the bitrate its name states without
+        an encode. Everything else is encoded to MP3 at the requested bitrate.
+        """
+        container = AUDIO_REMUX_CONTAINERS.get(BitrateModel.codec_family(acodec))
+        low, high = self._audio_remux_range(quality)
+        if container and abr and low <= abr <= high:
+            return ('remux', *container)
+        return ('transcode', 'mp3', 'mp3')
+
+    def _postprocess_audio(self, request_id, video_id, quality, source_path, file_stem, acodec, abr, duration):
+        """Runs on the post-processing pool: remux or encode the downloaded stream into the final file"""
+        mode, extension, muxer = self._audio_output_plan(acodec, abr, quality)
+        temp_path = self.downloads_dir / f"{file_stem}.postprocess.{extension}"
+        try:
+            if request_id in self._cancel_requests:
+                raise yt_dlp.utils.DownloadCancelled(self._cancel_requests[request_id])
+            if not FFMPEG_PATH:
+                # No ffmpeg (local runs outside the container): serve the stream as downloaded
+                mode, extension = 'none', source_path.suffix.lstrip('.')
+                final_path = self.downloads_dir / f"{file_stem}.{extension}"
+                os.replace(source_path, final_path)
+            else:
+                final_path = self.downloads_dir / f"{file_stem}.{extension}"
+                if mode == 'remux':
+                    self._update_status(request_id, 'processing', 'Remuxing audio...', progress={'phase': 'postprocess', 'mode': mode})
+                    codec_args = ['-c:a', 'copy']
+                else:
+                    self._update_status(request_id, 'processing', f'Converting to MP3 ({quality} kbps)...', progress={'phase': 'postprocess', 'mode': mode})
+                    codec_args = ['-c:a', 'libmp3lame', '-b:a', f'{quality}k']
+                started = time.perf_counter()
+                self._run_ffmpeg(request_id, [
+                    FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y', '-i', str(source_path),
+                    '-vn', '-map_metadata', '0', '-threads', '1', *codec_args, '-f', muxer, str(temp_path)
+                ])
+                METRICS.observe('postprocess_seconds', time.perf_counter() - started, postprocessor=f'audio_{mode}')
+                os.replace(temp_path, final_path)
+                source_path.unlink(missing_ok=True)
+
+            file_size = final_path.stat().st_size
+            if file_size == 0:
+                final_path.unlink(missing_ok=True)
+                raise Exception("Converted audio file is empty.")
+
+            self.file_catalog.record_write(final_path)
+            self.bitrate_model.record('audio', quality, 'mp3' if mode == 'transcode' else acodec, duration, file_size)
+            self._update_status(
+                request_id, 'complete', 'Audio download complete. File available locally.',
+                filename=final_path.name, file_size_mb=file_size / (1024 * 1024)
+            )
+        except yt_dlp.utils.DownloadCancelled:
+            self._finish_cancelled(request_id, None)
+        except subprocess.CalledProcessError as e:
+            METRICS.inc('job_failures_total', type='audio', cause='postprocess')
+            detail = (e.stderr or b'').decode(errors='replace').strip().splitlines()[-1:] or ['ffmpeg failed']
+            self._update_status(request_id, 'failed', f"Audio conversion failed: {detail[0]}")
+        except subprocess.TimeoutExpired:
+            METRICS.inc('job_failures_total', type='audio', cause='postprocess')
+            self._update_status(request_id, 'failed', "Audio conversion timed out.")
+        except Exception as e:
+            METRICS.inc('job_failures_total', type='audio', cause='internal')
+            self._update_status(request_id, 'failed', f"Audio download failed: {e}")
+        finally:
+            temp_path.unlink(missing_ok=True)
+            source_path.unlink(missing_ok=True)
+            self.file_catalog.release(file_stem)
+
+    def _run_ffmpeg(self, request_id, args):
+        """Run ffmpeg where cancel_job can kill it; raises like subprocess.run(check=True)"""
+        with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            self._postprocess_procs[request_id] = process
+            try:
+                if request_id in self._cancel_requests:
+                    process.kill()
+                stdout, stderr = process.communicate(timeout=CONFIG['AUDIO_POSTPROCESS_TIMEOUT_SECONDS'])
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise
+            finally:
+                self._postprocess_procs.pop(request_id, None)
+        if request_id in self._cancel_requests:
+            raise yt_dlp.utils.DownloadCancelled(self._cancel_requests[request_id])
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
 
-    def _ydl_progress_hook(self, d, progress_hook_key):
+    def start_download(self, video_id, resolution, title, client=None):
+        self._record_choice('video', resolution)
+        return self._start_job('video', video_id, resolution, title, client=client)
+
+    def _download_with_retries(self, request_id, profile, url, ydl_overrides):
+        """Run a pooled download under the retry policy and the bandwidth limit.
+
+        yt-dlp resumes the .part file on each retry.
+        """
+        def attempt_download(attempt):
+            with self.ydl_pool.checkout(profile, **ydl_overrides) as ydl:
+                ydl.download([url])
+
+        def report_retry(attempt, delay, reason):
+            self._update_status(request_id, 'processing', f"{reason} Retrying in {delay:.0f}s (attempt {attempt + 1})...")
+
+        # Checked after every block and before each merge step, so yt-dlp stops within one read of a cancellation
+        def check_cancelled(d):
+            if cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled(self._cancel_requests.get(request_id, 'Download cancelled.'))
+
+        cancel_event = threading.Event()
+        self._cancel_events[request_id] = cancel_event
+        self._apply_requested_cancels([request_id])
+        if request_id in self._cancel_requests:
+            cancel_event.set()
+        entry = self.job_store.get(request_id) or {}
+        try:
+            with self.bandwidth.flow(request_id, 'prefetch' if entry.get('prefetch') is True else profile, entry.get('client')) as flow:
+                ydl_overrides = dict(
+                    ydl_overrides, cancel_event=cancel_event,
+                    progress_hooks=[*ydl_overrides.get('progress_hooks', ()), self.bandwidth.progress_hook(flow), check_cancelled],
+                    postprocessor_hooks=[*ydl_overrides.get('postprocessor_hooks', ()), check_cancelled],
+                )
+                self.retry_policy.call(
+                    attempt_download, CONFIG['DOWNLOAD_RETRY_BUDGET_SECONDS'], wait_for_breaker=True,
+                    on_retry=report_retry, cancel_event=cancel_event
+                )
+        finally:
+            self._cancel_events.pop(request_id, None)
+
+    def _ydl_progress_hook(self, d, progress_hook_key, request_id):
         if d['status'] == 'finished':
             self.final_filenames[progress_hook_key] = d.get('filename') or d.get('info_dict', {}).get('_filename')
+            self._remember_media(progress_hook_key, d.get('info_dict') or {})
+            self._report_progress(request_id, 'download', d, force=True)
+            self._record_download_metrics(d)
+        elif d['status'] == 'downloading':
+            if request_id not in self._stream_announced:
+                self._announce_stream(request_id, d)
+            self._record_partial_file(request_id, d)
+            self._report_progress(request_id, 'download', d)
         elif d['status'] == 'error':
             print(f"yt-dlp reported an error for {progress_hook_key}: {d.get('error')}")
 
-    def _get_ydl_options(self, output_template_path, resolution, progress_hook_key):
-        format_spec = (
-            f'bestvideo[height<={resolution}][ext=mp4][vcodec^=avc1]+bestaudio[ext=m4a]/'
-            f'bestvideo[height<={resolution}][ext=mp4]+bestaudio[ext=m4a]/'
-            f'bestvideo[height<={resolution}][vcodec^=avc1]+bestaudio/'
-            f'bestvideo[height<={resolution}]+bestaudio/'
-            f'bestvideo[height<={resolution}][ext=webm]+bestaudio[ext=opus]/'
-            f'bestvideo[height<={resolution}][ext=webm]+bestaudio/'
-            f'best[height<={resolution}][ext=mp4]/'
-            f'best[height<={resolution}]'
-        )
-        
+    def _remember_media(self, progress_hook_key, info_dict):
+        # Merged downloads finish once per format; keep the video codec from one and the audio codec from the other
+        media = self.final_media.setdefault(progress_hook_key, {})
+        media['duration'] = info_dict.get('duration') or media.get('duration')
+        for field in ('vcodec', 'acodec', 'abr'):
+            if info_dict.get(field) not in (None, 'none'):
+                media.setdefault(field, info_dict[field])
+
+    def _record_bitrate_sample(self, kind, format_value, progress_hook_key, video_id, file_path):
+        media = self.final_media.get(progress_hook_key) or {}
+        duration = media.get('duration') or self._known_duration(video_id)
+        codec = media.get('acodec' if kind == 'audio' else 'vcodec')
+        try:
+            self.bitrate_model.record(kind, format_value, codec, duration, file_path.stat().st_size)
+        except Exception as e:
+            print(f"Could not record bitrate sample for {video_id}: {e}")
+
+    def _announce_stream(self, request_id, d):
+        """Expose the growing .part file for streaming when no merge or post-processing step will follow"""
+        self._stream_announced.add(request_id)
+        filename, tmpfilename = d.get('filename'), d.get('tmpfilename')
+        format_id = (d.get('info_dict') or {}).get('format_id')
+        if not filename or not tmpfilename or Path(filename).stem.endswith(f".f{format_id}"):
+            # Per-format intermediate of a merged download; clients wait for download_url instead
+            return
+        if Path(filename).stem.endswith('.source') and FFMPEG_PATH:
+            # Audio source that _postprocess_audio remuxes or encodes into a different file; same as above
+            return
+        stream = {
+            'part_file': Path(tmpfilename).name,
+            'file': Path(filename).name,
+            'total_bytes': d.get('total_bytes'),
+        }
+        self.job_store.update(request_id, lambda entry: entry.update(stream=stream))
+        self.status_broker.publish()
+
+    def _record_partial_file(self, request_id, d):
+        """Persist the names of the .part files a job writes, so a restarted server can tell what it resumes"""
+        tmpfilename = d.get('tmpfilename')
+        if not tmpfilename:
+            return
+        known = self._partial_files.setdefault(request_id, set())
+        name = Path(tmpfilename).name
+        if name in known:
+            return
+        known.add(name)
+        partial_files = sorted(known)
+        self.job_store.update(request_id, lambda entry: entry.update(partial_files=partial_files))
+
+    def _record_download_metrics(self, d):
+        kind = 'audio' if (d.get('info_dict') or {}).get('vcodec') == 'none' else 'video'
+        downloaded_bytes = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        METRICS.inc('downloaded_bytes_total', downloaded_bytes, kind=kind)
+        if d.get('elapsed'):
+            METRICS.observe('download_speed_bytes_per_second', downloaded_bytes / d['elapsed'], kind=kind)
+
+    def _ydl_postprocessor_hook(self, d, request_id):
+        timer_key = (request_id, d.get('postprocessor'))
+        if d['status'] == 'started':
+            self._postprocess_started[timer_key] = time.perf_counter()
+            phase = 'merge' if d.get('postprocessor') == 'Merger' else 'postprocess'
+            self._report_progress(request_id, phase, d, force=True)
+        elif d['status'] == 'finished' and timer_key in self._postprocess_started:
+            elapsed = time.perf_counter() - self._postprocess_started.pop(timer_key)
+            METRICS.observe('postprocess_seconds', elapsed, postprocessor=d.get('postprocessor') or 'unknown')
+
+    def _report_progress(self, request_id, phase, d, force=False):
+        """Throttled byte-level progress update from the yt-dlp hooks"""
+        now = time.time()
+        if not force and now - self._progress_last_emit.get(request_id, 0) < CONFIG['PROGRESS_UPDATE_INTERVAL_SECONDS']:
+            return
+        self._progress_last_emit[request_id] = now
+
+        downloaded_bytes = d.get('downloaded_bytes')
+        total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+        progress = {
+            'phase': phase,
+            'format_id': (d.get('info_dict') or {}).get('format_id'),
+            'downloaded_bytes': downloaded_bytes,
+            'total_bytes': int(total_bytes) if total_bytes else None,
+            'speed': d.get('speed'),
+            'eta': d.get('eta'),
+            'percent': round(downloaded_bytes * 100 / total_bytes, 1) if downloaded_bytes and total_bytes else None,
+        }
+        if phase == 'merge':
+            message = 'Merging video and audio...'
+        elif phase == 'postprocess':
+            message = f"Post-processing ({d.get('postprocessor', 'ffmpeg')})..."
+        elif progress['percent'] is not None:
+            message = f"Downloading... {progress['percent']:.1f}%"
+        else:
+            message = 'Downloading...'
+        self._update_status(request_id, 'processing', message, progress=progress)
+
+    def _download_ydl_options(self, **extra):
         return {
-            'format': format_spec,
-            'outtmpl': str(output_template_path),
             'noplaylist': True,
-            'merge_output_format': 'mp4',
             'writethumbnail': False,
             'writeinfojson': False,
             'http_headers': {
@@ -656,50 +3270,74 @@ class VideoDownloader:
             },
             'retries': 5,
             'fragment_retries': 5,
+            # Continue existing .part files with a Range request, across retries and server restarts
+            'continuedl': True,
+            'nopart': False,
+            # Fixed-size reads, so the bandwidth limiter charges downloads in small steps instead of 4 MB bursts
+            'buffersize': 256 * 1024,
+            'noresizebuffer': True,
             'socket_timeout': 60,
             'no_warnings': True,
             'ignoreerrors': False,
             'verbose': False,
-            'progress_hooks': [lambda d: self._ydl_progress_hook(d, progress_hook_key)],
+            **extra,
+        }
+
+    def _get_ydl_options(self, output_template_path, resolution, progress_hook_key, request_id):
+        """Per-request overrides applied to a pooled 'video' YoutubeDL"""
+        format_spec = (
+            f'bestvideo[height<={resolution}][ext=mp4][vcodec^=avc1]+bestaudio[ext=m4a]/'
+            f'bestvideo[height<={resolution}][ext=mp4]+bestaudio[ext=m4a]/'
+            f'bestvideo[height<={resolution}][vcodec^=avc1]+bestaudio/'
+            f'bestvideo[height<={resolution}]+bestaudio/'
+            f'bestvideo[height<={resolution}][ext=webm]+bestaudio[ext=opus]/'
+            f'bestvideo[height<={resolution}][ext=webm]+bestaudio/'
+            f'best[height<={resolution}][ext=mp4]/'
+            f'best[height<={resolution}]'
+        )
+        
+        return {
+            'format_spec': format_spec,
+            'outtmpl': str(output_template_path),
+            'progress_hooks': [lambda d: self._ydl_progress_hook(d, progress_hook_key, request_id)],
+            'postprocessor_hooks': [lambda d: self._ydl_postprocessor_hook(d, request_id)],
         }
 
-    def _download_video(self, request_id, video_id, resolution, title):
+    def _download_video(self, request_id, video_id, resolution):
         final_downloaded_file_path = None
         progress_hook_key = f"{request_id}_progress_{str(uuid.uuid4())[:8]}"
 
+        file_stem = self._job_file_stem(video_id, 'video', resolution)
+        self.file_catalog.protect(file_stem)
+        self._take_resume_hold(request_id)
+
         try:
             self._update_status(request_id, 'processing', 'Initializing download...')
+            self.file_catalog.make_room(self._expected_size(video_id, 'video', resolution))
 
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip().replace(" ", "_")
-            safe_title = safe_title[:60]
-            
-            filename_template_str = f"{safe_title}_{video_id}_{resolution}p.%(ext)s"
+            filename_template_str = f"{file_stem}.%(ext)s"
             output_template_path = self.downloads_dir / filename_template_str
             
             url = f'https://www.youtube.com/watch?v={video_id}'
             
-            ydl_opts = self._get_ydl_options(output_template_path, resolution, progress_hook_key)
+            ydl_overrides = self._get_ydl_options(output_template_path, resolution, progress_hook_key, request_id)
             
             self._update_status(request_id, 'processing', 'Starting download with yt-dlp...')
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                self._update_status(request_id, 'processing', 'Downloading video...')
-                ydl.download([url])
+            self._update_status(request_id, 'processing', 'Downloading video...')
+            self._download_with_retries(request_id, 'video', url, ydl_overrides)
 
             final_filename_from_hook = self.final_filenames.pop(progress_hook_key, None)
 
             if final_filename_from_hook and Path(final_filename_from_hook).exists():
                 final_downloaded_file_path = Path(final_filename_from_hook)
             else:
-                expected_final_filename = f"{safe_title}_{video_id}_{resolution}p.mp4"
+                expected_final_filename = f"{file_stem}.mp4"
                 potential_file = self.downloads_dir / expected_final_filename
                 if potential_file.exists() and potential_file.is_file():
                     final_downloaded_file_path = potential_file
                 else:
-                    glob_pattern = f"{safe_title}_{video_id}_{resolution}p.*"
-                    found_files = list(self.downloads_dir.glob(glob_pattern))
-                    if found_files:
-                        final_downloaded_file_path = found_files[0] 
+                    final_downloaded_file_path = self._find_completed_file(video_id, 'video', resolution)
             
             if not final_downloaded_file_path or not final_downloaded_file_path.exists():
                 raise Exception("Downloaded file not found after yt-dlp execution.")
@@ -709,26 +3347,24 @@ class VideoDownloader:
                 if final_downloaded_file_path.exists(): final_downloaded_file_path.unlink(missing_ok=True)
                 raise Exception("Downloaded file is empty.")
 
+            self.file_catalog.record_write(final_downloaded_file_path)
+            self._record_bitrate_sample('video', resolution, progress_hook_key, video_id, final_downloaded_file_path)
             self._update_status(request_id, 'processing', 'Preparing local download link...')
-            download_url = f"{CONFIG['LOCAL_SERVER_URL']}/download/{final_downloaded_file_path.name}"
             status_message = 'Download complete. File available locally.'
 
             self._update_status(
                 request_id, 'complete', status_message,
-                download_url=download_url, file_size_mb=file_size_mb
+                filename=final_downloaded_file_path.name, file_size_mb=file_size_mb
             )
 
-        except yt_dlp.utils.DownloadError as de:
-            error_msg = str(de).split('\n')[-1]
-            user_message = f"Download failed (yt-dlp): {error_msg}"
-            if "Unsupported URL" in str(de): user_message = "The video URL is unsupported or invalid."
-            elif "Video unavailable" in str(de): user_message = "This video is unavailable."
-            elif "Private video" in str(de): user_message = "This video is private."
-            elif "HTTP Error 403" in str(de): user_message = "Access denied (403 Forbidden)."
-            elif "HTTP Error 404" in str(de): user_message = "Video not found (404)."
-            elif "HTTP Error 429" in str(de): user_message = "Too many requests (429)."
+        except yt_dlp.utils.DownloadCancelled:
+            self._finish_cancelled(request_id, file_stem)
+        except (yt_dlp.utils.DownloadError, UpstreamThrottled) as de:
+            _, cause, user_message = RetryPolicy.classify(de)
+            METRICS.inc('job_failures_total', type='video', cause=cause)
             self._update_status(request_id, 'failed', user_message)
         except Exception as e:
+            METRICS.inc('job_failures_total', type='video', cause='internal')
             error_msg = str(e)
             specific_msg = f"An unexpected error occurred: {error_msg}"
             if "File too large" in error_msg: specific_msg = error_msg
@@ -737,33 +3373,205 @@ class VideoDownloader:
             self._update_status(request_id, 'failed', specific_msg)
         finally:
             self.final_filenames.pop(progress_hook_key, None)
+            self.final_media.pop(progress_hook_key, None)
+            self.file_catalog.release(file_stem)
 
-    def _update_status(self, request_id, status, message, download_url=None, file_size_mb=None):
-        with download_lock:
-            if request_id and request_id in download_status:
-                entry = download_status[request_id]
-                entry['status'] = status
-                entry['message'] = message
-                entry['updated_at'] = datetime.now().isoformat()
-                if download_url: entry['download_url'] = download_url
-                if file_size_mb is not None: entry['file_size_mb'] = file_size_mb
-                if 'type' not in entry:
-                    if 'resolution' in entry: entry['type'] = 'video'
-                    elif 'quality' in entry: entry['type'] = 'audio'
+    def _update_status(self, request_id, status, message, filename=None, file_size_mb=None, progress=None):
+        def apply(entry):
+            # The store stamps updated_at; type is set when the job is created
+            entry['status'] = status
+            entry['message'] = message
+            if filename: entry['download_url'] = self._build_download_url(filename, entry)
+            if file_size_mb is not None: entry['file_size_mb'] = file_size_mb
+            if progress is not None: entry['progress'] = progress
+            if status == 'complete': entry.pop('partial_files', None)
+
+        if request_id:
+            self.job_store.update(request_id, apply)
+            if status in TERMINAL_JOB_STATUSES:
+                self._progress_last_emit.pop(request_id, None)
+                self._stream_announced.discard(request_id)
+                self._partial_files.pop(request_id, None)
+                self._cancel_requests.pop(request_id, None)
+                self._owned_jobs.discard(request_id)
+            self.status_broker.publish()
 
     def get_status(self, request_id):
-        with download_lock:
-            return download_status.get(request_id)
+        status = self.job_store.get(request_id)
+        if status and status['status'] in ACTIVE_JOB_STATUSES:
+            self._note_watched([status.get('attached_to') or request_id])
+        if status and status['status'] == 'pending':
+            scheduler = self.audio_scheduler if status.get('type') == 'audio' else self.video_scheduler
+            queue_info = scheduler.queue_info(status.get('attached_to', request_id))
+            if queue_info:
+                status.update(queue_info)
+        if status and status.get('stream') and status['status'] not in TERMINAL_JOB_STATUSES:
+            status['stream_url'] = f"{CONFIG['LOCAL_SERVER_URL']}/api/stream/{request_id}"
+        return status
+
+    def note_listing_watched(self):
+        """A client looked at the listing of every job, even if only to learn it is unchanged"""
+        self._note_watched([JobStore.ALL_JOBS])
 
     def get_all_status(self):
-        with download_lock:
-            return dict(download_status)
+        self.note_listing_watched()
+        return self.job_store.all()
+
+    def get_status_changes(self, since=0, limit=None, **filters):
+        """One page of jobs changed after cursor `since`, plus the cursor to poll from next"""
+        self.note_listing_watched()
+        # Read the version first: anything that changes after it is picked up by the next poll
+        current_version = self.job_store.version()
+        rows = self.job_store.changes(since, limit + 1 if limit else None, **filters)
+        has_more = bool(limit) and len(rows) > limit
+        rows = rows[:limit] if limit else rows
+        last_seen = rows[-1][0] if rows else since
+        return {
+            'downloads': {request_id: entry for _, request_id, entry in rows},
+            'cursor': last_seen if has_more else max(last_seen, current_version),
+            'has_more': has_more,
+        }
+
+    def get_batch_status(self, batch_id):
+        """Aggregate status of a batch plus the status of each of its items"""
+        batch = self.job_store.get_batch(batch_id)
+        if not batch:
+            return None
+        entries = self.job_store.get_many(batch['items'])
+        counts = dict.fromkeys(ACTIVE_JOB_STATUSES + TERMINAL_JOB_STATUSES, 0)
+        items = []
+        settled_percent = 0.0
+        downloaded_bytes = 0
+        self._note_watched({
+            entry.get('attached_to') or request_id for request_id, entry in entries.items() if entry['status'] in ACTIVE_JOB_STATUSES
+        })
+        for request_id in batch['items']:
+            entry = entries.get(request_id)
+            if not entry:
+                continue
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+            progress = entry.get('progress') or {}
+            if entry['status'] in TERMINAL_JOB_STATUSES:
+                settled_percent += 100
+            else:
+                settled_percent += progress.get('percent') or 0
+            downloaded_bytes += progress.get('downloaded_bytes') or 0
+            items.append({
+                'requestId': request_id,
+                'video_id': entry.get('video_id'),
+                'title': entry.get('title'),
+                'type': entry.get('type'),
+                'status': entry['status'],
+                'message': entry.get('message'),
+                'download_url': entry.get('download_url'),
+                'file_size_mb': entry.get('file_size_mb'),
+                'progress': entry.get('progress'),
+                'updated_at': entry.get('updated_at'),
+            })
+
+        if counts['pending'] + counts['processing']:
+            status = 'pending' if counts['pending'] == len(items) else 'processing'
+        else:
+            status = 'complete' if counts['complete'] else 'failed'
+        batch.pop('items')
+        batch.update(
+            status=status,
+            total=len(items),
+            counts=counts,
+            percent=round(settled_percent / len(items), 1) if items else 100.0,
+            downloaded_bytes=downloaded_bytes,
+            items=items,
+        )
+        return batch
 
+@app.before_request
+def _start_request_timer():
+    request.environ['downloader.request_started'] = time.perf_counter()
+
+# Endpoints that answer from this process alone and never wait for startup
+STARTUP_EXEMPT_ENDPOINTS = {'health_check', 'readiness_check', 'metrics', 'root_info'}
+
+@app.before_request
+def _wait_for_startup():
+    downloader.start()  # servers without a startup hook (see gunicorn.conf.py, asgi.py) start on the first request
+    if request.endpoint in STARTUP_EXEMPT_ENDPOINTS or downloader.initialized.is_set():
+        return None
+    if not downloader.startup['error'] and downloader.initialized.wait(CONFIG['STARTUP_REQUEST_WAIT_SECONDS']):
+        return None
+    response = jsonify({'success': False, 'message': 'Server is starting up, try again shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '2'
+    return response
+
+@app.after_request
+def _record_request_duration(response):
+    started = request.environ.get('downloader.request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        METRICS.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        route=route, method=request.method, status=response.status_code)
+    return response
+
+# Extra /health sections registered by other entry points (name -> callable returning a dict)
+HEALTH_SECTIONS = {}
+
+def client_origin():
+    """Who a job is charged to for per-origin bandwidth limits"""
+    return request.headers.get('Origin') or request.remote_addr or 'unknown'
+
+def valid_video_id(video_id):
+    return bool(video_id) and isinstance(video_id, str) and video_id.replace('-', '').replace('_', '').isalnum() and len(video_id) <= 15
+
+# Started by the server once it runs (gunicorn.conf.py, asgi.py, __main__) rather than on import, so
+# threads are not lost to a fork and tools importing the app can point CONFIG elsewhere first
 downloader = VideoDownloader()
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    """Liveness: 200 whenever the server answers; component sections appear once startup has opened them.
+
+    Warm-up progress and a failed startup are reported by /ready, so a slow or
+    failed warm-up does not get the container restarted.
+    """
+    if not downloader.initialized.is_set():
+        return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'video_info_cache': downloader.video_info_cache.stats(),
+        'downloads_dir': downloader.file_catalog.stats(),
+        'ydl_pool': downloader.ydl_pool.stats(),
+        'upstream': downloader.upstream_breaker.stats(),
+        'bitrate_model': downloader.bitrate_model.stats(),
+        'bandwidth': downloader.bandwidth.stats(),
+        'schedulers': {
+            'video': downloader.video_scheduler.stats(),
+            'audio': downloader.audio_scheduler.stats(),
+            'prefetch': downloader.prefetch_scheduler.stats(),
+        },
+        **{name: section() for name, section in HEALTH_SECTIONS.items()},
+    })
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 once the job store is open and yt-dlp is warm, 503 until then.
+
+    A startup step that failed is reported as 'degraded' if the job store is
+    open and requests are still served, and as 'failed' otherwise.
+    """
+    startup = downloader.startup_status()
+    ready = startup['initialized'] and startup['warmed']
+    if ready:
+        status = 'ready'
+    elif startup['error']:
+        status = 'degraded' if startup['initialized'] else 'failed'
+    else:
+        status = 'starting'
+    return jsonify({'status': status, **startup}), 200 if ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/api/video_info/<video_id>', methods=['GET'])
 def api_get_video_info(video_id):
@@ -771,11 +3579,20 @@ def api_get_video_info(video_id):
         if not video_id or not video_id.replace('-', '').replace('_', '').isalnum() or len(video_id) > 15:
             return jsonify({'success': False, 'message': 'Invalid videoId format'}), 400
         
-        info = downloader.get_video_info(video_id)
-        return jsonify(info)
+        if request.args.get('wait') == '1':
+            return jsonify(downloader.get_video_info(video_id))
+        return jsonify(downloader.get_video_info_progressive(video_id))
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/video_info/refinement/<token>', methods=['GET'])
+def api_get_info_refinement(token):
+    """Current state of a progressive video info lookup"""
+    refinement = downloader.get_info_refinement(token)
+    if not refinement:
+        return jsonify({'error': 'Refinement token not found'}), 404
+    return jsonify(refinement.snapshot())
+
 @app.route('/api/download_video', methods=['POST'])
 def api_download_video():
     try:
@@ -794,7 +3611,7 @@ def api_download_video():
         if resolution not in ['720', '1080', '480', '360']:
             return jsonify({'success': False, 'message': 'Invalid resolution'}), 400
         
-        request_id = downloader.start_download(video_id, resolution, title)
+        request_id = downloader.start_download(video_id, resolution, title, client=client_origin())
         return jsonify({
             'success': True,
             'message': 'Download started',
@@ -821,7 +3638,7 @@ def api_download_audio():
         if quality not in ['128', '192', '256', '320']:
             return jsonify({'success': False, 'message': 'Invalid audio quality'}), 400
         
-        request_id = downloader.start_audio_download(video_id, quality, title)
+        request_id = downloader.start_audio_download(video_id, quality, title, client=client_origin())
         return jsonify({
             'success': True,
             'message': 'Audio download started',
@@ -830,6 +3647,92 @@ def api_download_audio():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _playlist_source_url(data):
+    playlist_id = data.get('playlistId')
+    channel_id = data.get('channelId')
+    if playlist_id:
+        if not isinstance(playlist_id, str) or not playlist_id.replace('-', '').replace('_', '').isalnum() or len(playlist_id) > 64:
+            raise ValueError('Invalid playlistId format')
+        return f'https://www.youtube.com/playlist?list={playlist_id}'
+    if channel_id:
+        handle = channel_id[1:] if isinstance(channel_id, str) and channel_id.startswith('@') else channel_id
+        if not isinstance(handle, str) or not handle.replace('-', '').replace('_', '').replace('.', '').isalnum() or len(handle) > 64:
+            raise ValueError('Invalid channelId format')
+        if channel_id.startswith('@'):
+            return f'https://www.youtube.com/{channel_id}/videos'
+        return f'https://www.youtube.com/channel/{channel_id}/videos'
+    return None
+
+@app.route('/api/download_batch', methods=['POST'])
+def api_download_batch():
+    """Start downloads for a list of videoIds, or for every video of a playlistId / channelId"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'message': 'No JSON data provided'}), 400
+
+        job_type = data.get('type', 'video')
+        if job_type == 'audio':
+            format_value = data.get('quality', '128')
+            if format_value not in ['128', '192', '256', '320']:
+                return jsonify({'success': False, 'message': 'Invalid audio quality'}), 400
+        elif job_type == 'video':
+            format_value = data.get('resolution', '720')
+            if format_value not in ['720', '1080', '480', '360']:
+                return jsonify({'success': False, 'message': 'Invalid resolution'}), 400
+        else:
+            return jsonify({'success': False, 'message': "type must be 'video' or 'audio'"}), 400
+
+        try:
+            source_url = _playlist_source_url(data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+        title = data.get('title')
+        if source_url:
+            try:
+                playlist_title, items = downloader.expand_playlist(source_url)
+            except UpstreamThrottled as e:
+                return jsonify({'success': False, 'message': str(e)}), 503
+            title = title or playlist_title
+        else:
+            video_ids = data.get('videoIds')
+            if not isinstance(video_ids, list) or not video_ids:
+                return jsonify({'success': False, 'message': 'videoIds, playlistId or channelId is required'}), 400
+            invalid = [video_id for video_id in video_ids if not valid_video_id(video_id)]
+            if invalid:
+                return jsonify({'success': False, 'message': f'Invalid videoId format: {invalid[:5]}'}), 400
+            items = [{'video_id': video_id} for video_id in video_ids]
+
+        seen = set()
+        items = [item for item in items if not (item['video_id'] in seen or seen.add(item['video_id']))]
+        if not items:
+            return jsonify({'success': False, 'message': 'No videos found'}), 404
+        if len(items) > CONFIG['BATCH_MAX_ITEMS']:
+            return jsonify({'success': False, 'message': f"A batch can hold at most {CONFIG['BATCH_MAX_ITEMS']} videos"}), 400
+
+        batch_id, request_ids = downloader.start_batch(
+            job_type, format_value, items, title=title, source=source_url, client=client_origin()
+        )
+        return jsonify({
+            'success': True,
+            'message': f'Batch of {len(request_ids)} downloads started',
+            'batchId': batch_id,
+            'requestIds': request_ids,
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/batch_status/<batch_id>', methods=['GET'])
+def api_get_batch_status(batch_id):
+    try:
+        status = downloader.get_batch_status(batch_id)
+        if not status:
+            return jsonify({'error': 'Batch ID not found'}), 404
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/download_status/<request_id>', methods=['GET'])
 def api_get_download_status(request_id):
     try:
@@ -840,28 +3743,383 @@ def api_get_download_status(request_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cancel/<request_id>', methods=['POST'])
+def api_cancel_download(request_id):
+    try:
+        status = downloader.job_store.get(request_id)
+        if not status:
+            return jsonify({'success': False, 'message': 'Request ID not found'}), 404
+        if not downloader.cancel_job(request_id):
+            return jsonify({'success': False, 'message': f"Download already {status['status']}", 'status': status}), 409
+        return jsonify({'success': True, 'message': 'Cancellation requested', 'status': downloader.get_status(request_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/status', methods=['GET'])
 def api_get_all_status():
+    """All jobs, or with since/limit one page of jobs changed after a cursor.
+
+    Pass the returned cursor as `since` to get the next page, and keep polling
+    with it once has_more is false to receive only jobs that changed. Jobs
+    removed by cleanup are not reported. Optional filters: status, type, video_id.
+    """
+    try:
+        args = request.args
+        try:
+            since = int(args.get('since', 0))
+            limit = min(int(args.get('limit', CONFIG['STATUS_PAGE_DEFAULT_LIMIT'])), CONFIG['STATUS_PAGE_MAX_LIMIT'])
+        except ValueError:
+            return jsonify({'error': 'since and limit must be integers'}), 400
+        if since < 0 or limit < 1:
+            return jsonify({'error': 'since must be >= 0 and limit >= 1'}), 400
+        filters = {'status': args.get('status'), 'job_type': args.get('type'), 'video_id': args.get('video_id')}
+        if filters['status'] and filters['status'] not in ACTIVE_JOB_STATUSES + TERMINAL_JOB_STATUSES:
+            return jsonify({'error': 'Invalid status filter'}), 400
+        if filters['job_type'] and filters['job_type'] not in ('video', 'audio'):
+            return jsonify({'error': 'Invalid type filter'}), 400
+
+        # A 304 poll still counts as watching every job, or they would be cancelled as abandoned while nothing changes
+        downloader.note_listing_watched()
+        # Every change bumps the store version, so an unchanged version answers any listing with 304
+        etag = f"jobs-{downloader.job_store.version()}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif 'since' in args or 'limit' in args:
+            response = jsonify(downloader.get_status_changes(since, limit, **filters))
+        elif any(filters.values()):
+            response = jsonify({'downloads': downloader.get_status_changes(**filters)['downloads']})
+        else:
+            response = jsonify({'downloads': downloader.get_all_status()})
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _event_stream_response(generate):
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/events/<request_id>', methods=['GET'])
+def api_job_events(request_id):
+    """Server-Sent Events stream of one job's status until it completes or fails"""
+    if not downloader.get_status(request_id):
+        return jsonify({'error': 'Request ID not found'}), 404
+
+    def generate():
+        last_payload = None
+        last_sent = time.time()
+        version = downloader.status_broker.version
+        while True:
+            status = downloader.get_status(request_id)
+            if not status:
+                yield _sse_event('not_found', {'requestId': request_id})
+                return
+            payload = json.dumps(status, sort_keys=True)
+            if payload != last_payload:
+                yield _sse_event('status', status)
+                last_payload, last_sent = payload, time.time()
+            if status['status'] in TERMINAL_JOB_STATUSES:
+                return
+            if time.time() - last_sent >= CONFIG['EVENT_STREAM_KEEPALIVE_SECONDS']:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            version = downloader.status_broker.wait(version, CONFIG['EVENT_STREAM_POLL_SECONDS'])
+
+    return _event_stream_response(generate)
+
+@app.route('/api/events/batch/<batch_id>', methods=['GET'])
+def api_batch_events(batch_id):
+    """Server-Sent Events stream of a batch: aggregate 'batch' events plus a 'status' event per changed item"""
+    if not downloader.get_batch_status(batch_id):
+        return jsonify({'error': 'Batch ID not found'}), 404
+
+    def generate():
+        last_summary = None
+        last_updated = {}
+        last_sent = time.time()
+        version = downloader.status_broker.version
+        while True:
+            batch = downloader.get_batch_status(batch_id)
+            if not batch:
+                yield _sse_event('not_found', {'batchId': batch_id})
+                return
+            for item in batch.pop('items'):
+                if last_updated.get(item['requestId']) != item['updated_at']:
+                    last_updated[item['requestId']] = item['updated_at']
+                    yield _sse_event('status', item)
+                    last_sent = time.time()
+            summary = json.dumps(batch, sort_keys=True)
+            if summary != last_summary:
+                yield _sse_event('batch', batch)
+                last_summary, last_sent = summary, time.time()
+            if batch['status'] in TERMINAL_JOB_STATUSES:
+                return
+            if time.time() - last_sent >= CONFIG['EVENT_STREAM_KEEPALIVE_SECONDS']:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            version = downloader.status_broker.wait(version, CONFIG['EVENT_STREAM_POLL_SECONDS'])
+
+    return _event_stream_response(generate)
+
+@app.route('/api/events/video_info/<token>', methods=['GET'])
+def api_info_refinement_events(token):
+    """Server-Sent Events stream of a progressive video info lookup: 'partial' events, then 'complete' or 'failed'"""
+    refinement = downloader.get_info_refinement(token)
+    if not refinement:
+        return jsonify({'error': 'Refinement token not found'}), 404
+
+    def generate():
+        version = None
+        last_sent = time.time()
+        while True:
+            snapshot = refinement.snapshot()
+            if snapshot['version'] != version:
+                version = snapshot['version']
+                yield _sse_event('partial' if snapshot['status'] == 'pending' else snapshot['status'], snapshot)
+                last_sent = time.time()
+            if snapshot['status'] != 'pending':
+                return
+            if time.time() - last_sent >= CONFIG['EVENT_STREAM_KEEPALIVE_SECONDS']:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            refinement.wait(version, CONFIG['EVENT_STREAM_KEEPALIVE_SECONDS'])
+
+    return _event_stream_response(generate)
+
+@app.route('/api/events', methods=['GET'])
+def api_all_events():
+    """Server-Sent Events stream of every job, sending each entry again whenever it changes"""
+    def generate():
+        last_updated = {}
+        last_sent = time.time()
+        version = downloader.status_broker.version
+        while True:
+            for request_id, status in downloader.get_all_status().items():
+                if last_updated.get(request_id) != status.get('updated_at'):
+                    last_updated[request_id] = status.get('updated_at')
+                    yield _sse_event('status', {'requestId': request_id, **status})
+                    last_sent = time.time()
+            if time.time() - last_sent >= CONFIG['EVENT_STREAM_KEEPALIVE_SECONDS']:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            version = downloader.status_broker.wait(version, CONFIG['EVENT_STREAM_POLL_SECONDS'])
+
+    return _event_stream_response(generate)
+
+def _content_disposition(download_name):
+    try:
+        download_name.encode('ascii')
+        return f'attachment; filename="{download_name}"'
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(download_name, safe='!#$&+-.^_`|~')}"
+
+class _ServedFile(io.BufferedReader):
+    """A file opened for a response that runs on_close once when it is closed.
+
+    Every body built from it closes it: _iter_file_range when exhausted or
+    closed, a wsgi.file_wrapper from its close(), and the garbage collector if
+    the server drops it. Cleanup hung here runs however the body is handed on.
+    """
+    def __init__(self, path, on_close):
+        super().__init__(io.FileIO(path, 'rb'))
+        self._on_close = on_close
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self._on_close()
+
+def _iter_file_range(file_obj, length, chunk_size):
+    try:
+        remaining = length
+        while remaining > 0:
+            chunk = file_obj.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
+def _serve_download(file_path, download_name):
+    """Serve a finished file with ETag/Last-Modified validators and single-range support"""
     try:
-        all_statuses = downloader.get_all_status()
-        return jsonify({'downloads': all_statuses})
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found or is not a file'}), 404
+    if not stat.S_ISREG(file_stat.st_mode):
+        return jsonify({'error': 'File not found or is not a file'}), 404
+
+    size = file_stat.st_size
+    mtime = int(file_stat.st_mtime)
+    etag = f"{file_stat.st_ino:x}-{size:x}-{file_stat.st_mtime_ns:x}"
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache',
+        'Content-Disposition': _content_disposition(download_name),
+    }
+    mimetype = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
+
+    if request.if_none_match:
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+    elif request.if_modified_since and int(request.if_modified_since.timestamp()) >= mtime:
+        return Response(status=304, headers=headers)
+
+    mode = CONFIG['FILE_SERVING_MODE']
+    if mode == 'x-accel':
+        headers['X-Accel-Redirect'] = CONFIG['X_ACCEL_REDIRECT_PREFIX'] + quote(file_path.name)
+        return Response(status=200, headers=headers, mimetype=mimetype)
+    if mode == 'x-sendfile':
+        headers['X-Sendfile'] = str(Path(file_path).resolve())
+        return Response(status=200, headers=headers, mimetype=mimetype)
+
+    start, end = 0, size
+    status_code = 200
+    byte_range = request.range
+    if_range = request.if_range
+    range_is_current = (
+        not request.headers.get('If-Range')
+        or (if_range.etag and if_range.etag == etag)
+        or (if_range.date and int(if_range.date.timestamp()) >= mtime)
+    )
+    if byte_range and byte_range.units == 'bytes' and len(byte_range.ranges) == 1 and range_is_current:
+        bounds = byte_range.range_for_length(size)
+        if bounds is None:
+            headers['Content-Range'] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, end = bounds
+        status_code = 206
+        headers['Content-Range'] = f"bytes {start}-{end - 1}/{size}"
+
+    length = end - start
+    headers['Content-Length'] = str(length)
+    if request.method == 'HEAD':
+        return Response(status=status_code, headers=headers, mimetype=mimetype)
+
+    stem = FileCatalog.stem_of(file_path.name)
+    downloader.file_catalog.touch(file_path.name)
+    downloader.file_catalog.protect(stem)
+    try:
+        file_obj = _ServedFile(file_path, lambda: downloader.file_catalog.release(stem))
+    except OSError:
+        downloader.file_catalog.release(stem)
+        raise
+    if start:
+        file_obj.seek(start)
+    # gunicorn's file wrapper hands the open file to socket.sendfile() bounded by Content-Length;
+    # other wrappers read to EOF, so they are only safe when the range runs to the end of the file
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    wrapper_is_bounded = getattr(file_wrapper, '__module__', '').startswith('gunicorn')
+    if file_wrapper and (end == size or wrapper_is_bounded):
+        body = file_wrapper(file_obj, CONFIG['FILE_SERVING_CHUNK_BYTES'])
+    else:
+        body = _iter_file_range(file_obj, length, CONFIG['FILE_SERVING_CHUNK_BYTES'])
+    # direct_passthrough keeps the file wrapper visible to the server for sendfile, but werkzeug then returns the
+    # body as is and never runs call_on_close() callbacks: cleanup belongs in the body's close(), here the file's
+    return Response(body, status=status_code, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
+def _tail_growing_file(request_id, file_obj, part_path):
+    """Yield a file as yt-dlp writes it, until the job finishes or fails"""
+    stem = FileCatalog.stem_of(part_path.name)
+    downloader.file_catalog.protect(stem)
+    try:
+        while True:
+            chunk = file_obj.read(CONFIG['FILE_SERVING_CHUNK_BYTES'])
+            if chunk:
+                yield chunk
+                continue
+            if not part_path.exists():
+                # yt-dlp renamed the finished .part; the open descriptor still points at the same data
+                chunk = file_obj.read()
+                if chunk:
+                    yield chunk
+                return
+            status = downloader.get_status(request_id)
+            if not status or status['status'] == 'failed':
+                return
+            time.sleep(CONFIG['STREAM_TAIL_POLL_SECONDS'])
+    finally:
+        file_obj.close()
+        downloader.file_catalog.release(stem)
+
+@app.route('/api/stream/<request_id>', methods=['GET'])
+def api_stream_download(request_id):
+    """Stream a single-file download to the browser while it is still being downloaded"""
+    try:
+        deadline = time.time() + CONFIG['STREAM_START_TIMEOUT_SECONDS']
+        version = downloader.status_broker.version
+        while True:
+            status = downloader.get_status(request_id)
+            if not status:
+                return jsonify({'error': 'Request ID not found'}), 404
+            if status['status'] == 'complete' and status.get('download_url'):
+                return redirect(status['download_url'])
+            if status['status'] == 'failed':
+                return jsonify({'error': status['message']}), 409
+            if status.get('stream') or time.time() >= deadline:
+                break
+            if status.get('progress') and not status.get('stream'):
+                break  # downloading parts that still need a merge or audio conversion
+            version = downloader.status_broker.wait(version, min(1.0, max(deadline - time.time(), 0)))
+
+        stream = status.get('stream')
+        if not stream:
+            return jsonify({
+                'error': 'Streaming is not available for this job (merge or conversion required, or not started yet); wait for download_url'
+            }), 409
+
+        part_path = downloader.downloads_dir / Path(stream['part_file']).name
+        try:
+            file_obj = open(part_path, 'rb')
+        except FileNotFoundError:
+            file_obj = open(downloader.downloads_dir / Path(stream['file']).name, 'rb')
+
+        headers = {
+            'Content-Disposition': _content_disposition(downloader.download_name_for(stream['file'], status)),
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',
+        }
+        if stream.get('total_bytes'):
+            headers['Content-Length'] = str(stream['total_bytes'])
+        mimetype = mimetypes.guess_type(stream['file'])[0] or 'application/octet-stream'
+        # Passed through like _serve_download's body, so the generator's finally does the cleanup, not call_on_close()
+        return Response(
+            _tail_growing_file(request_id, file_obj, part_path),
+            headers=headers, mimetype=mimetype, direct_passthrough=True
+        )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/download/<filename>', methods=['GET'])
+@app.route('/download/<filename>', methods=['GET', 'HEAD'])
 def serve_file_locally(filename):
     try:
         safe_filename = Path(filename).name 
         file_path = downloader.downloads_dir / safe_filename
-        
-        if not file_path.exists() or not file_path.is_file():
-            return jsonify({'error': 'File not found or is not a file'}), 404
-        
-        return send_file(
-            file_path,
-            as_attachment=True,
-            download_name=safe_filename
-        )
+        download_name = Path(request.args.get('name') or safe_filename).name or safe_filename
+
+        if CONFIG['FILE_SERVING_MODE'] == 'flask':
+            if not file_path.exists() or not file_path.is_file():
+                return jsonify({'error': 'File not found or is not a file'}), 404
+            return send_file(
+                file_path,
+                as_attachment=True,
+                download_name=download_name
+            )
+        return _serve_download(file_path, download_name)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -883,6 +4141,7 @@ def api_delete_file():
         if file_path.exists() and file_path.is_file():
             try:
                 file_path.unlink()
+                downloader.file_catalog.remove(filename)
                 return jsonify({'success': True, 'message': f'File {filename} deleted successfully.'})
             except Exception as e:
                 return jsonify({'success': False, 'message': f'Could not delete file: {str(e)}'}), 500
@@ -891,23 +4150,91 @@ def api_delete_file():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
+def _admin_authorized():
+    token = CONFIG['ADMIN_TOKEN']
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+def _bandwidth_rate(value, name):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f'{name} must be a non-negative number of bytes per second, or null for unlimited')
+    return value or None
+
+@app.route('/api/admin/bandwidth', methods=['GET', 'POST'])
+def api_admin_bandwidth():
+    """Read or change the download bandwidth limits; changes apply to running downloads at once"""
+    if not CONFIG['ADMIN_TOKEN']:
+        return jsonify({'success': False, 'message': 'Admin API is disabled; set ADMIN_TOKEN to enable it'}), 404
+    if not _admin_authorized():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    if request.method == 'GET':
+        return jsonify(downloader.bandwidth.stats())
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'No JSON data provided'}), 400
+    limits = {}
+    try:
+        if 'total_bytes_per_second' in data:
+            limits['total_rate'] = _bandwidth_rate(data['total_bytes_per_second'], 'total_bytes_per_second')
+        if 'per_origin_bytes_per_second' in data:
+            limits['per_origin_rate'] = _bandwidth_rate(data['per_origin_bytes_per_second'], 'per_origin_bytes_per_second')
+        if 'origin_bytes_per_second' in data:
+            origins = data['origin_bytes_per_second']
+            if not isinstance(origins, dict):
+                raise ValueError('origin_bytes_per_second must map origins to bytes per second')
+            # The mapping is replaced as a whole; an origin set to null falls back to the per-origin default
+            limits['origin_rates'] = {
+                origin: _bandwidth_rate(rate, f'origin_bytes_per_second[{origin!r}]')
+                for origin, rate in origins.items() if rate is not None
+            }
+        if 'weights' in data:
+            weights = data['weights']
+            if not isinstance(weights, dict) or any(job_type not in ('video', 'audio', 'prefetch') for job_type in weights):
+                raise ValueError("weights must map 'video', 'audio' and/or 'prefetch' to a positive number")
+            if any(isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0 for weight in weights.values()):
+                raise ValueError("weights must map 'video', 'audio' and/or 'prefetch' to a positive number")
+            limits['weights'] = dict(downloader.bandwidth.settings()['weights'], **weights)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not limits:
+        return jsonify({'success': False, 'message': 'No bandwidth setting provided'}), 400
+
+    downloader.bandwidth.configure(**limits)
+    print(f"Bandwidth limits changed: {limits}")
+    return jsonify({'success': True, **downloader.bandwidth.settings()})
+
 @app.route('/', methods=['GET'])
 def root_info():
     return jsonify({
         'service': 'YouTube Video Downloader',
         'status': 'running',
-        'version': '3.0 - Ultra-Aggressive Size Estimation with Duplicate Handling',
+        'version': '3.1 - Single-Extraction Format Size Resolution',
         'endpoints': {
             'health': '/health',
-            'video_info': '/api/video_info/<video_id> (GET)',
+            'ready': '/ready (503 while starting, or degraded or failed after a startup error)',
+            'metrics': '/metrics (GET, Prometheus text format)',
+            'video_info': '/api/video_info/<video_id> (GET, ?wait=1 to block for exact sizes)',
+            'video_info_refinement': '/api/video_info/refinement/<token> (GET)',
+            'events_video_info': '/api/events/video_info/<token> (GET, text/event-stream)',
             'download_video': '/api/download_video (POST)',
             'download_audio': '/api/download_audio (POST)',
+            'download_batch': '/api/download_batch (POST, videoIds / playlistId / channelId)',
+            'status_batch': '/api/batch_status/<batch_id> (GET)',
+            'events_batch': '/api/events/batch/<batch_id> (GET, text/event-stream)',
             'status_single': '/api/download_status/<request_id> (GET)',
-            'status_all': '/api/status (GET)',
+            'cancel': '/api/cancel/<request_id> (POST)',
+            'status_all': '/api/status (GET, ?since=<cursor>&limit=&status=&type=&video_id=, ETag)',
+            'events_single': '/api/events/<request_id> (GET, text/event-stream)',
+            'events_all': '/api/events (GET, text/event-stream)',
             'serve_file': '/download/<filename> (GET)',
-            'delete_file': '/api/delete_file (POST)'
+            'stream_file': '/api/stream/<request_id> (GET, while downloading)',
+            'delete_file': '/api/delete_file (POST)',
+            'admin_bandwidth': '/api/admin/bandwidth (GET, POST to change limits; needs ADMIN_TOKEN)'
         }
     })
 
 if __name__ == '__main__':
+    downloader.start()
     app.run(host='0.0.0.0', port=8000, debug=False, threaded=True)
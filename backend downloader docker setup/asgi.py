@@ -0,0 +1,197 @@
+"""ASGI entry point for the downloader backend.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+
+Blocking video info lookups (/api/video_info/<video_id>?wait=1) are served from
+the event loop: the yt-dlp extraction runs on a bounded executor, the handler waits with a deadline, and a lookup
+whose last client disconnects is cancelled at its next HTTP request. Every other
+route goes to the Flask app through a WSGI bridge, so a slow extraction never
+holds one of the threads that /health, status polls and file downloads use.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+from app import CONFIG, HEALTH_SECTIONS, METRICS, app as flask_app, downloader, valid_video_id, yt_dlp
+
+VIDEO_INFO_PREFIX = '/api/video_info/'
+
+
+class Overloaded(Exception):
+    pass
+
+class ClientDisconnected(Exception):
+    pass
+
+class _InfoLookup:
+    """One executor job for a video id, shared by every request waiting on it"""
+    def __init__(self, future, cancel_event):
+        self.future = future
+        self.cancel_event = cancel_event
+        self.waiters = 0
+
+class AsyncVideoInfo:
+    """Runs get_video_info on a bounded executor and shares lookups between waiting requests"""
+    def __init__(self, max_workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='video-info')
+        self.max_pending = max_pending
+        self._lookups = {}  # video_id -> _InfoLookup; only touched from the event loop thread
+        self.cancelled = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _start(self, video_id):
+        if len(self._lookups) >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        cancel_event = threading.Event()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, downloader.get_video_info, video_id, cancel_event)
+        lookup = _InfoLookup(future, cancel_event)
+        self._lookups[video_id] = lookup
+        future.add_done_callback(lambda _: self._forget(video_id, lookup))
+        # A cancelled lookup raises DownloadCancelled nobody awaits; mark it retrieved
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return lookup
+
+    def _forget(self, video_id, lookup):
+        if self._lookups.get(video_id) is lookup:
+            del self._lookups[video_id]
+
+    async def get(self, video_id, deadline, disconnected):
+        """Await the info for video_id until it is ready, the deadline passes or the client leaves"""
+        lookup = self._lookups.get(video_id) or self._start(video_id)
+        lookup.waiters += 1
+        disconnect_task = asyncio.ensure_future(disconnected)
+        try:
+            done, _ = await asyncio.wait(
+                {lookup.future, disconnect_task}, timeout=deadline, return_when=asyncio.FIRST_COMPLETED
+            )
+            if lookup.future in done:
+                return lookup.future.result()
+            if disconnect_task in done:
+                raise ClientDisconnected()
+            self.timed_out += 1
+            raise asyncio.TimeoutError()
+        finally:
+            disconnect_task.cancel()
+            lookup.waiters -= 1
+            if lookup.waiters == 0 and not lookup.future.done():
+                # Nobody is left to receive the result; stop the extraction and let the next request start over
+                lookup.cancel_event.set()
+                self._forget(video_id, lookup)
+                self.cancelled += 1
+
+    def shutdown(self):
+        for lookup in list(self._lookups.values()):
+            lookup.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            'in_flight': len(self._lookups),
+            'max_pending': self.max_pending,
+            'cancelled': self.cancelled,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+
+video_info = AsyncVideoInfo(CONFIG['ASYNC_INFO_WORKERS'], CONFIG['ASYNC_INFO_MAX_PENDING'])
+HEALTH_SECTIONS['async_video_info'] = video_info.stats
+wsgi_app = WSGIMiddleware(flask_app, workers=CONFIG['ASGI_WSGI_THREADS'])
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            *headers,
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def wait_for_startup():
+    """Poll until the downloader has opened its job store, without holding an executor thread"""
+    deadline = time.monotonic() + CONFIG['STARTUP_REQUEST_WAIT_SECONDS']
+    while not downloader.initialized.is_set():
+        if downloader.startup['error'] or time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def video_info_endpoint(scope, receive, send):
+    started = time.perf_counter()
+    status = await _video_info_response(scope, receive, send)
+    if status is not None:
+        METRICS.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        route='/api/video_info/<video_id>', method='GET', status=status)
+
+async def _video_info_response(scope, receive, send):
+    """Send the response for a blocking lookup and return its status, or None if the client left"""
+    video_id = scope['path'][len(VIDEO_INFO_PREFIX):]
+    if not valid_video_id(video_id):
+        await send_json(send, 400, {'success': False, 'message': 'Invalid videoId format'})
+        return 400
+    if not await wait_for_startup():
+        await send_json(send, 503, {'success': False, 'message': 'Server is starting up, try again shortly'}, [(b'retry-after', b'2')])
+        return 503
+    try:
+        info = await video_info.get(video_id, CONFIG['ASYNC_INFO_DEADLINE_SECONDS'], wait_for_disconnect(receive))
+    except ClientDisconnected:
+        return None
+    except Overloaded:
+        await send_json(send, 503, {'success': False, 'message': 'Too many video info lookups in progress'}, [(b'retry-after', b'5')])
+        return 503
+    except asyncio.TimeoutError:
+        await send_json(send, 504, {'success': False, 'message': 'Timed out fetching video info'})
+        return 504
+    except yt_dlp.utils.DownloadCancelled:
+        await send_json(send, 503, {'success': False, 'message': 'Video info lookup was cancelled'}, [(b'retry-after', b'1')])
+        return 503
+    except Exception as e:
+        await send_json(send, 500, {'success': False, 'message': str(e)})
+        return 500
+    await send_json(send, 200, info)
+    return 200
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            downloader.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            video_info.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+def is_blocking_video_info(scope):
+    # Progressive lookups return immediately, so only ?wait=1 needs the async path
+    return (
+        scope['method'] == 'GET'
+        and scope['path'].startswith(VIDEO_INFO_PREFIX)
+        and '/' not in scope['path'][len(VIDEO_INFO_PREFIX):]
+        and parse_qs(scope['query_string'].decode('latin-1')).get('wait') == ['1']
+    )
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and is_blocking_video_info(scope):
+        await video_info_endpoint(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
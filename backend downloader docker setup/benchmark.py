@@ -0,0 +1,529 @@
+"""Benchmarks for the downloader backend.
+
+Run them where the backend requirements are installed, e.g. inside the container:
+
+    docker-compose exec youtube-downloader python benchmark.py file-serving --size-mb 512
+    docker-compose exec youtube-downloader python benchmark.py ydl-pool --requests 200
+    python benchmark.py offline --info-requests 200 --concurrency 1,2,4,8
+    python benchmark.py job-store --jobs 100 --updates 500
+    python benchmark.py startup --rounds 5
+
+The offline benchmark runs the app against fake_youtube.FakeYouTube, so it
+needs no network access and gives the same catalogue on every run.
+
+Every measured case is printed as one JSON object per line so results can be
+collected and compared between runs.
+"""
+import argparse
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def emit(result):
+    print(json.dumps(result), flush=True)
+
+
+def process_cpu_seconds(pid):
+    """User + system CPU time of a process and its live children, from /proc (Linux only)"""
+    with open(f'/proc/{pid}/stat') as stat_file:
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as children_file:
+            children = children_file.read().split()
+    except OSError:
+        children = []
+    return cpu_seconds + sum(process_cpu_seconds(int(child)) for child in children)
+
+
+def wait_for_status(url, timeout=30, interval=0.01):
+    """Poll url until it answers 200 and return the time that took"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(interval)
+    raise RuntimeError(f'{url} did not answer 200 within {timeout}s')
+
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/health', timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not become healthy')
+
+
+def fetch(url, headers=None, chunk_size=1024 * 1024):
+    """Download a URL into the void and return (status, bytes received)"""
+    req = urllib.request.Request(url, headers=headers or {})
+    received = 0
+    with urllib.request.urlopen(req) as response:
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+            received += len(chunk)
+        return response.status, received
+
+
+def fetch_json(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'} if data else {})
+    with urllib.request.urlopen(req) as response:
+        return json.load(response)
+
+
+def percentiles(samples):
+    """Nearest-rank p50/p90/p99 plus mean and max, in milliseconds"""
+    ordered = sorted(samples)
+    def rank(p):
+        return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+    return {
+        'p50_ms': round(rank(50) * 1000, 1),
+        'p90_ms': round(rank(90) * 1000, 1),
+        'p99_ms': round(rank(99) * 1000, 1),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+def random_video_id():
+    return ''.join(random.choices(string.ascii_letters + string.digits + '-_', k=11))
+
+
+def serve(args):
+    """Run the app with a given file serving mode (used as a benchmark subprocess)"""
+    def load_app():
+        # Imported in the gunicorn worker, where the app's background threads run
+        import app as backend
+
+        if args.fake_youtube:
+            import fake_youtube
+            fake_youtube.install(args.fake_youtube)
+        # Keep benchmark jobs and synthetic bitrate samples out of the real job store and bitrate model
+        backend.CONFIG['FILE_SERVING_MODE'] = args.mode
+        backend.CONFIG['JOB_STORE'] = 'memory'
+        backend.CONFIG['BITRATE_MODEL_PATH'] = None
+        backend.downloader.downloads_dir = Path(args.downloads_dir)
+        backend.downloader.start()
+        if not backend.downloader.initialized.wait(30):
+            raise RuntimeError(f"Backend startup failed: {backend.downloader.startup['error'] or 'timed out'}")
+        return backend.app
+
+    if args.server == 'gunicorn':
+        from gunicorn.app.base import BaseApplication
+
+        class BenchmarkApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set('bind', f'127.0.0.1:{args.port}')
+                self.cfg.set('worker_class', 'gthread')
+                self.cfg.set('threads', 8)
+                self.cfg.set('workers', 1)
+                self.cfg.set('loglevel', 'warning')
+
+            def load(self):
+                return load_app()
+
+        BenchmarkApplication().run()
+    else:
+        load_app().run(host='127.0.0.1', port=args.port, debug=False, threaded=True)
+
+
+def benchmark_file_serving(args):
+    """Throughput and server CPU per GB for each file serving path"""
+    cases = [('flask', 'werkzeug'), ('sendfile', 'werkzeug')]
+    try:
+        import gunicorn  # noqa: F401
+        cases += [('flask', 'gunicorn'), ('sendfile', 'gunicorn')]
+    except ImportError:
+        print('gunicorn not installed, skipping gunicorn cases', file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as downloads_dir:
+        file_name = 'benchmark_file.mp4'
+        file_size = args.size_mb * 1024 * 1024
+        with open(Path(downloads_dir) / file_name, 'wb') as bench_file:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.size_mb):
+                bench_file.write(block)
+
+        for index, (mode, server) in enumerate(cases):
+            port = args.port + index
+            base_url = f'http://127.0.0.1:{port}'
+            proc = subprocess.Popen(
+                [sys.executable, __file__, '_serve', '--mode', mode, '--server', server,
+                 '--port', str(port), '--downloads-dir', downloads_dir],
+                cwd=Path(__file__).parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_server(base_url)
+                url = f'{base_url}/download/{file_name}'
+                fetch(url)  # warm the page cache
+
+                cpu_before = process_cpu_seconds(proc.pid)
+                start = time.perf_counter()
+                total_bytes = 0
+                for _ in range(args.rounds):
+                    _, received = fetch(url)
+                    total_bytes += received
+                elapsed = time.perf_counter() - start
+                cpu_used = process_cpu_seconds(proc.pid) - cpu_before
+
+                resume_status, resume_bytes = fetch(url, {'Range': f'bytes={file_size // 2}-'})
+
+                emit({
+                    'benchmark': 'file_serving',
+                    'mode': mode,
+                    'server': server,
+                    'file_mb': args.size_mb,
+                    'rounds': args.rounds,
+                    'throughput_mb_s': round(total_bytes / elapsed / (1024 * 1024), 1),
+                    'server_cpu_s_per_gb': round(cpu_used / (total_bytes / 1024 ** 3), 3),
+                    'resume_status': resume_status,
+                    'resume_ok': resume_status == 206 and resume_bytes == file_size - file_size // 2,
+                })
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+
+def benchmark_ydl_pool(args):
+    """Per-request YoutubeDL setup and connection cost, fresh instance vs pooled instance"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import app as backend
+
+    connections = []
+
+    class KeepAliveHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # otherwise delayed ACKs dominate keep-alive timings
+
+        def setup(self):
+            super().setup()
+            connections.append(self.client_address)
+
+        def do_GET(self):
+            body = b'ok'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/'
+    downloader = backend.downloader
+
+    def fresh_request():
+        with backend.yt_dlp.YoutubeDL(downloader._download_ydl_options(merge_output_format='mp4')) as ydl:
+            ydl.urlopen(url).read()
+
+    def pooled_request():
+        with downloader.ydl_pool.checkout('video', format_spec='best[height<=720]') as ydl:
+            ydl.urlopen(url).read()
+
+    try:
+        for name, run_request in (('fresh', fresh_request), ('pooled', pooled_request)):
+            run_request()  # import and first-use costs are not per-request overhead
+            connections.clear()
+            cpu_before = time.process_time()
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                run_request()
+            elapsed = time.perf_counter() - start
+            emit({
+                'benchmark': 'ydl_pool',
+                'mode': name,
+                'requests': args.requests,
+                'ms_per_request': round(elapsed * 1000 / args.requests, 3),
+                'cpu_ms_per_request': round((time.process_time() - cpu_before) * 1000 / args.requests, 3),
+                'tcp_connections_opened': len(connections),
+            })
+    finally:
+        server.shutdown()
+
+
+def run_download(base_url, job_type, video_id, timeout=600):
+    """Start a download through the API and poll it to the end; returns (final status, seconds)"""
+    start = time.perf_counter()
+    if job_type == 'audio':
+        started = fetch_json(f'{base_url}/api/download_audio', {'videoId': video_id, 'quality': '128', 'title': video_id})
+    else:
+        started = fetch_json(f'{base_url}/api/download_video', {'videoId': video_id, 'resolution': '720', 'title': video_id})
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = fetch_json(f'{base_url}/api/download_status/{started["requestId"]}')
+        if status['status'] in ('complete', 'failed'):
+            return status, time.perf_counter() - start
+        time.sleep(0.05)
+    raise RuntimeError(f'{job_type} download of {video_id} did not finish in {timeout}s')
+
+
+def benchmark_offline(args):
+    """/api/video_info latency, download throughput and download concurrency scaling against FakeYouTube"""
+    from fake_youtube import FakeYouTube
+
+    fake = FakeYouTube(
+        formats=args.formats, duration=args.duration, latency=args.latency_ms / 1000,
+        bytes_per_second=args.throttle_kbps * 1000 // 8, error_rate=args.error_rate,
+        errors=[error for error in args.errors.split(',') if error], stall_seconds=args.stall_seconds,
+    )
+    settings = {
+        'formats': args.formats, 'duration_s': args.duration, 'latency_ms': args.latency_ms,
+        'throttle_kbps': args.throttle_kbps, 'error_rate': args.error_rate,
+    }
+    with fake, tempfile.TemporaryDirectory() as downloads_dir:
+        base_url = f'http://127.0.0.1:{args.port}'
+        proc = subprocess.Popen(
+            [sys.executable, __file__, '_serve', '--mode', 'sendfile', '--server', args.server,
+             '--port', str(args.port), '--downloads-dir', downloads_dir, '--fake-youtube', fake.base_url],
+            cwd=Path(__file__).parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_server(base_url)
+
+            video_ids = [random_video_id() for _ in range(args.info_requests)]
+            for cache in ('cold', 'warm'):
+                samples = []
+                for video_id in video_ids:
+                    start = time.perf_counter()
+                    fetch_json(f'{base_url}/api/video_info/{video_id}?wait=1')
+                    samples.append(time.perf_counter() - start)
+                emit({'benchmark': 'offline_video_info', 'cache': cache, 'requests': len(samples),
+                      **percentiles(samples), **settings})
+
+            for job_type in ('video', 'audio'):
+                total_mb, elapsed, failed = 0, 0, 0
+                for _ in range(args.rounds):
+                    status, seconds = run_download(base_url, job_type, random_video_id())
+                    failed += status['status'] == 'failed'
+                    total_mb += status.get('file_size_mb') or 0
+                    elapsed += seconds
+                emit({'benchmark': 'offline_download', 'type': job_type, 'rounds': args.rounds, 'failed': failed,
+                      'throughput_mb_s': round(total_mb / elapsed, 1), 'seconds_per_job': round(elapsed / args.rounds, 3),
+                      **settings})
+
+            health = fetch_json(f'{base_url}/health')
+            for concurrency in (int(level) for level in args.concurrency.split(',')):
+                results = []
+                threads = [threading.Thread(target=lambda: results.append(run_download(base_url, 'video', random_video_id())))
+                           for _ in range(concurrency)]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                wall = time.perf_counter() - start
+                emit({
+                    'benchmark': 'offline_concurrency', 'concurrency': concurrency,
+                    'scheduler_workers': health.get('schedulers', {}).get('video', {}).get('max_workers'),
+                    'failed': sum(status['status'] == 'failed' for status, _ in results),
+                    'wall_s': round(wall, 3),
+                    'throughput_mb_s': round(sum(status.get('file_size_mb') or 0 for status, _ in results) / wall, 1),
+                    'mean_job_s': round(sum(seconds for _, seconds in results) / len(results), 3),
+                    **settings,
+                })
+
+            emit({'benchmark': 'offline_upstream', **fake.stats(), **settings})
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+def benchmark_startup(args):
+    """Import time, time until /health and /ready answer, and first request latency of a fresh process"""
+    from fake_youtube import FakeYouTube
+
+    import_code = 'import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)'
+    imports = []
+    for _ in range(args.rounds):
+        output = subprocess.run([sys.executable, '-c', import_code], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, check=True).stdout.split()
+        imports.append(float(output[-1]))
+    emit({'benchmark': 'startup_import', 'rounds': args.rounds, **percentiles(imports)})
+
+    phases = {'health': [], 'ready': [], 'first_video_info': [], 'warm_video_info': []}
+    with FakeYouTube(formats='progressive', duration=60) as fake, tempfile.TemporaryDirectory() as downloads_dir:
+        base_url = f'http://127.0.0.1:{args.port}'
+
+        def start_server(*extra_args):
+            return subprocess.Popen(
+                [sys.executable, __file__, '_serve', '--mode', 'sendfile', '--server', args.server,
+                 '--port', str(args.port), '--downloads-dir', downloads_dir, *extra_args],
+                cwd=Path(__file__).parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+
+        for _ in range(args.rounds):
+            # Liveness and readiness without FakeYouTube, whose extractor needs yt-dlp imported up front
+            start = time.perf_counter()
+            proc = start_server()
+            try:
+                wait_for_status(f'{base_url}/health')
+                phases['health'].append(time.perf_counter() - start)
+                wait_for_status(f'{base_url}/ready')
+                phases['ready'].append(time.perf_counter() - start)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+            proc = start_server('--fake-youtube', fake.base_url)
+            try:
+                wait_for_status(f'{base_url}/health')
+                # Sent as soon as the server is live, so it pays for whatever startup has not finished yet
+                request_start = time.perf_counter()
+                fetch_json(f'{base_url}/api/video_info/{random_video_id()}?wait=1')
+                phases['first_video_info'].append(time.perf_counter() - request_start)
+                wait_for_status(f'{base_url}/ready')
+                request_start = time.perf_counter()
+                fetch_json(f'{base_url}/api/video_info/{random_video_id()}?wait=1')
+                phases['warm_video_info'].append(time.perf_counter() - request_start)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=10)
+    for phase, samples in phases.items():
+        emit({'benchmark': 'startup_server', 'phase': phase, 'server': args.server, 'rounds': args.rounds, **percentiles(samples)})
+
+
+def benchmark_job_store(args):
+    """Status update and read throughput of each job store with many jobs updating at once"""
+    import app as backend
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        stores = {
+            'memory': backend.MemoryJobStore,
+            'sqlite': lambda: backend.SQLiteJobStore(Path(data_dir) / 'jobs.db'),
+        }
+        for name, make_store in stores.items():
+            store = make_store()
+            request_ids = [f'bench-{index}' for index in range(args.jobs)]
+            for request_id in request_ids:
+                store.create(request_id, {
+                    'status': 'pending', 'message': 'Download queued', 'video_id': request_id[-11:],
+                    'resolution': '720', 'title': request_id, 'type': 'video', 'download_url': None, 'file_size_mb': None,
+                }, job_key=request_id)
+
+            def progress_update(percent):
+                return lambda entry: entry.update(
+                    status='processing', message=f'Downloading... {percent:.1f}%',
+                    progress={'phase': 'download', 'downloaded_bytes': int(percent * 1000), 'percent': percent},
+                )
+
+            def write(request_id):
+                for step in range(args.updates):
+                    store.update(request_id, progress_update(step * 100 / args.updates))
+
+            stop = threading.Event()
+            reads = [0] * args.readers
+            listings = [0]
+
+            def read(slot):
+                while not stop.is_set():
+                    store.get(random.choice(request_ids))
+                    reads[slot] += 1
+                    time.sleep(0)  # request handlers release the GIL between polls
+
+            def list_all():
+                while not stop.is_set():
+                    store.all()
+                    listings[0] += 1
+                    time.sleep(0)
+
+            readers = [threading.Thread(target=read, args=(slot,)) for slot in range(args.readers)]
+            readers.append(threading.Thread(target=list_all))
+            writers = [threading.Thread(target=write, args=(request_id,)) for request_id in request_ids]
+            start = time.perf_counter()
+            for thread in readers + writers:
+                thread.start()
+            for thread in writers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            stop.set()
+            for thread in readers:
+                thread.join()
+            emit({
+                'benchmark': 'job_store',
+                'store': name,
+                'jobs': args.jobs,
+                'updates_per_job': args.updates,
+                'reader_threads': args.readers,
+                'updates_per_s': round(args.jobs * args.updates / elapsed),
+                'reads_per_s': round(sum(reads) / elapsed),
+                'full_listings_per_s': round(listings[0] / elapsed, 1),
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    file_serving = subparsers.add_parser('file-serving', help='throughput and CPU per GB of /download/<filename>')
+    file_serving.add_argument('--size-mb', type=int, default=256)
+    file_serving.add_argument('--rounds', type=int, default=3)
+    file_serving.add_argument('--port', type=int, default=8610)
+    file_serving.set_defaults(func=benchmark_file_serving)
+
+    ydl_pool = subparsers.add_parser('ydl-pool', help='per-request YoutubeDL setup overhead with and without the pool')
+    ydl_pool.add_argument('--requests', type=int, default=100)
+    ydl_pool.set_defaults(func=benchmark_ydl_pool)
+
+    offline = subparsers.add_parser('offline', help='video info latency and download throughput against a local fake YouTube')
+    offline.add_argument('--info-requests', type=int, default=100)
+    offline.add_argument('--rounds', type=int, default=3, help='sequential downloads per type')
+    offline.add_argument('--concurrency', default='1,2,4,8', help='comma-separated simultaneous download counts')
+    offline.add_argument('--formats', choices=['progressive', 'dash', 'both'], default='progressive',
+                         help="'dash' and 'both' need ffmpeg to merge")
+    offline.add_argument('--duration', type=int, default=60, help='media seconds per video; sets every file size')
+    offline.add_argument('--latency-ms', type=float, default=0)
+    offline.add_argument('--throttle-kbps', type=int, default=0, help='per-connection media bandwidth, 0 for unlimited')
+    offline.add_argument('--error-rate', type=float, default=0)
+    offline.add_argument('--errors', default='403,429,timeout', help='failures to inject, from 403, 429 and timeout')
+    offline.add_argument('--stall-seconds', type=float, default=5)
+    offline.add_argument('--server', choices=['werkzeug', 'gunicorn'], default='werkzeug')
+    offline.add_argument('--port', type=int, default=8620)
+    offline.set_defaults(func=benchmark_offline)
+
+    job_store = subparsers.add_parser('job-store', help='status update/read throughput under concurrent jobs')
+    job_store.add_argument('--jobs', type=int, default=100)
+    job_store.add_argument('--updates', type=int, default=200, help='status updates per job')
+    job_store.add_argument('--readers', type=int, default=4, help='threads polling single job status')
+    job_store.set_defaults(func=benchmark_job_store)
+
+    startup = subparsers.add_parser('startup', help='import time, time to /health and /ready, first request latency')
+    startup.add_argument('--rounds', type=int, default=5, help='fresh processes started per measurement')
+    startup.add_argument('--server', choices=['werkzeug', 'gunicorn'], default='gunicorn')
+    startup.add_argument('--port', type=int, default=8630)
+    startup.set_defaults(func=benchmark_startup)
+
+    serve_parser = subparsers.add_parser('_serve', help=argparse.SUPPRESS)
+    serve_parser.add_argument('--mode', required=True)
+    serve_parser.add_argument('--server', choices=['werkzeug', 'gunicorn'], required=True)
+    serve_parser.add_argument('--port', type=int, required=True)
+    serve_parser.add_argument('--downloads-dir', required=True)
+    serve_parser.add_argument('--fake-youtube', help='base URL of a fake_youtube.FakeYouTube server')
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
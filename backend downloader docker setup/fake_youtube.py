@@ -0,0 +1,287 @@
+"""Local stand-in for YouTube, used by the offline benchmarks.
+
+FakeYouTube serves synthetic watch pages (an HTML page carrying a
+ytInitialPlayerResponse, like the real one) and the media files they list.
+Every video id is valid; its duration and format list are derived from the id,
+so repeated runs see the same catalogue. Latency, per-connection throttling and
+injected failures (403, 429 with Retry-After, stalled connections) are set on
+the server and can be changed while it runs.
+
+FakeYouTubeIE is a yt-dlp extractor that claims youtube.com watch URLs and
+reads them from a FakeYouTube server instead. install() registers it with the
+backend's YoutubeDL pool, so the app runs unchanged against the stand-in.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from yt_dlp.extractor.common import InfoExtractor
+
+# (format_id, ext, vcodec, acodec, height, kbit/s); DASH streams are video-only or audio-only
+DASH_FORMATS = (
+    ('134', 'mp4', 'avc1.4d401e', 'none', 360, 400),
+    ('135', 'mp4', 'avc1.4d401f', 'none', 480, 750),
+    ('136', 'mp4', 'avc1.4d401f', 'none', 720, 1500),
+    ('137', 'mp4', 'avc1.640028', 'none', 1080, 3000),
+    ('140', 'm4a', 'none', 'mp4a.40.2', None, 128),
+    ('251', 'webm', 'none', 'opus', None, 160),
+)
+PROGRESSIVE_FORMATS = (
+    ('18', 'mp4', 'avc1.42001E', 'mp4a.40.2', 360, 500),
+    ('22', 'mp4', 'avc1.64001F', 'mp4a.40.2', 720, 1700),
+)
+AUDIO_FORMATS = tuple(f for f in DASH_FORMATS if f[2] == 'none')
+
+CHUNK_BYTES = 64 * 1024
+
+
+class FakeYouTube:
+    """Threaded HTTP server for synthetic watch pages and media.
+
+    formats: 'dash' (separate video and audio streams, needs ffmpeg to merge),
+    'progressive' (muxed streams plus audio-only) or 'both'.
+    error_rate is the share of requests answered with a random entry of errors.
+    """
+    def __init__(self, host='127.0.0.1', port=0, formats='progressive', duration=None,
+                 latency=0.0, bytes_per_second=0, error_rate=0.0, errors=('403', '429', 'timeout'),
+                 stall_seconds=5.0, retry_after=1):
+        self.formats = formats
+        self.duration = duration
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.error_rate = error_rate
+        self.errors = tuple(errors)
+        self.stall_seconds = stall_seconds
+        self.retry_after = retry_after
+        self.requests = {'watch': 0, 'media': 0}
+        self.injected = {kind: 0 for kind in ('403', '429', 'timeout')}
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self.base_url = f'http://{host}:{self._server.server_port}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def format_table(self):
+        if self.formats == 'dash':
+            return DASH_FORMATS
+        if self.formats == 'progressive':
+            return PROGRESSIVE_FORMATS + AUDIO_FORMATS
+        return DASH_FORMATS + PROGRESSIVE_FORMATS
+
+    def video_duration(self, video_id):
+        if self.duration:
+            return self.duration
+        return 60 + int(hashlib.sha1(video_id.encode()).hexdigest(), 16) % 840
+
+    @staticmethod
+    def format_size(kbps, duration):
+        return kbps * 1000 // 8 * duration
+
+    def player_response(self, video_id):
+        duration = self.video_duration(video_id)
+        formats = []
+        for format_id, ext, vcodec, acodec, height, kbps in self.format_table():
+            formats.append({
+                'itag': format_id,
+                'url': f'{self.base_url}/media/{video_id}/{format_id}.{ext}',
+                'mimeType': f'{"audio" if vcodec == "none" else "video"}/{ext}; codecs="{vcodec if vcodec != "none" else acodec}"',
+                'ext': ext,
+                'vcodec': vcodec,
+                'acodec': acodec,
+                'height': height,
+                'bitrate': kbps * 1000,
+                'contentLength': str(self.format_size(kbps, duration)),
+            })
+        return {
+            'videoDetails': {
+                'videoId': video_id,
+                'title': f'Synthetic video {video_id}',
+                'lengthSeconds': str(duration),
+                'thumbnail': f'{self.base_url}/thumbnail/{video_id}.jpg',
+            },
+            'streamingData': {'formats': formats},
+        }
+
+    def media_size(self, video_id, format_id):
+        for table_id, _, _, _, _, kbps in self.format_table():
+            if table_id == format_id:
+                return self.format_size(kbps, self.video_duration(video_id))
+        return None
+
+    def _pick_error(self):
+        with self._lock:
+            if not self.errors or self._random.random() >= self.error_rate:
+                return None
+            error = self._random.choice(self.errors)
+            self.injected[error] += 1
+            return error
+
+    def _count_request(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def _count_bytes(self, sent):
+        with self._lock:
+            self.bytes_sent += sent
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self.requests), 'injected': dict(self.injected), 'bytes_sent': self.bytes_sent}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *_):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass  # a client that gave up on a stalled or throttled response
+
+            def do_GET(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                parsed = urlparse(self.path)
+                media = re.fullmatch(r'/media/([\w-]+)/(\w+)\.\w+', parsed.path)
+                if parsed.path == '/watch':
+                    fake._count_request('watch')
+                    if not self._inject_error():
+                        self._send_watch_page(parse_qs(parsed.query).get('v', [''])[0])
+                elif media:
+                    fake._count_request('media')
+                    if not self._inject_error():
+                        self._send_media(*media.groups())
+                else:
+                    self._send_body(404, b'Not Found', 'text/plain')
+
+            def _inject_error(self):
+                error = fake._pick_error()
+                if error == 'timeout':
+                    # Accept the request and never answer; the client gives up or sees the connection drop
+                    time.sleep(fake.stall_seconds)
+                    self.close_connection = True
+                elif error == '429':
+                    self._send_body(429, b'Too Many Requests', 'text/plain', {'Retry-After': str(fake.retry_after)})
+                elif error == '403':
+                    self._send_body(403, b'Forbidden', 'text/plain')
+                return error is not None
+
+            def _send_body(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_watch_page(self, video_id):
+                if not re.fullmatch(r'[\w-]{11}', video_id):
+                    self._send_body(404, b'Video unavailable', 'text/plain')
+                    return
+                player = json.dumps(fake.player_response(video_id))
+                page = f'<html><body><script>var ytInitialPlayerResponse = {player};</script></body></html>'
+                self._send_body(200, page.encode(), 'text/html; charset=utf-8')
+
+            def _send_media(self, video_id, format_id):
+                size = fake.media_size(video_id, format_id)
+                if size is None:
+                    self._send_body(404, b'Not Found', 'text/plain')
+                    return
+                start, end = 0, size - 1
+                byte_range = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+                if byte_range:
+                    start = int(byte_range.group(1))
+                    end = min(int(byte_range.group(2) or end), end)
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+
+                block = bytes(CHUNK_BYTES)
+                remaining = end - start + 1
+                started = time.perf_counter()
+                sent = 0
+                try:
+                    while remaining > 0:
+                        chunk = block[:min(CHUNK_BYTES, remaining)]
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        remaining -= len(chunk)
+                        if fake.bytes_per_second:
+                            ahead = sent / fake.bytes_per_second - (time.perf_counter() - started)
+                            if ahead > 0:
+                                time.sleep(ahead)
+                finally:
+                    fake._count_bytes(sent)
+
+        return Handler
+
+
+class FakeYouTubeIE(InfoExtractor):
+    IE_NAME = 'fakeyoutube'
+    _VALID_URL = r'https?://(?:www\.)?youtube\.com/watch\?v=(?P<id>[\w-]{11})'
+    base_url = None  # FakeYouTube server to read from, set by install()
+
+    def _real_extract(self, url):
+        video_id = self._match_id(url)
+        webpage = self._download_webpage(f'{self.base_url}/watch?v={video_id}', video_id)
+        player = self._search_json(r'var\s+ytInitialPlayerResponse\s*=', webpage, 'player response', video_id)
+        details = player['videoDetails']
+        formats = [{
+            'format_id': fmt['itag'],
+            'url': fmt['url'],
+            'ext': fmt['ext'],
+            'vcodec': fmt['vcodec'],
+            'acodec': fmt['acodec'],
+            'height': fmt['height'],
+            'tbr': fmt['bitrate'] / 1000,
+            **({'abr': fmt['bitrate'] / 1000} if fmt['vcodec'] == 'none' else {'vbr': fmt['bitrate'] / 1000}),
+            'filesize': int(fmt['contentLength']),
+        } for fmt in player['streamingData']['formats']]
+        return {
+            'id': video_id,
+            'title': details['title'],
+            'duration': int(details['lengthSeconds']),
+            'thumbnail': details['thumbnail'],
+            'formats': formats,
+        }
+
+
+def install(base_url):
+    """Route the backend's youtube.com watch URLs to the FakeYouTube server at base_url"""
+    import app as backend
+
+    FakeYouTubeIE.base_url = base_url
+    if FakeYouTubeIE not in backend.EXTRA_INFO_EXTRACTORS:
+        backend.EXTRA_INFO_EXTRACTORS.append(FakeYouTubeIE)
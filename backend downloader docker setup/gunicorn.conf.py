@@ -0,0 +1,8 @@
+# Read by gunicorn from the working directory, on top of the command line options in the Dockerfile
+
+
+def post_worker_init(worker):
+    # Start the downloader in each worker, where its background threads live; importing the app does not
+    from app import downloader
+
+    downloader.start()
@@ -12,6 +12,7 @@ if errorlevel 1 (
 REM Create necessary directories
 if not exist "downloads" mkdir downloads
 if not exist "logs" mkdir logs
+if not exist "data" mkdir data
 
 REM Build and start the container
 echo 📦 Building Docker container...
@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app as backend  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def downloader(tmp_path_factory):
+    """The app's downloader, started on a memory job store and a temporary downloads directory"""
+    backend.CONFIG['JOB_STORE'] = 'memory'
+    backend.CONFIG['BITRATE_MODEL_PATH'] = None
+    backend.downloader.downloads_dir = tmp_path_factory.mktemp('downloads')
+    backend.downloader.start()
+    if not backend.downloader.initialized.wait(30):
+        raise RuntimeError(f"Backend startup failed: {backend.downloader.startup['error'] or 'timed out'}")
+    return backend.downloader
+
+
+@pytest.fixture
+def client(downloader):
+    return backend.app.test_client()
@@ -0,0 +1,25 @@
+import pytest
+from werkzeug.wsgi import FileWrapper
+
+
+@pytest.fixture
+def served_file(downloader):
+    path = downloader.downloads_dir / 'abc_720p.mp4'
+    path.write_bytes(b'x' * 100_000)
+    downloader.file_catalog.record_write(path)
+    yield path
+    downloader.file_catalog.remove(path.name)
+
+
+@pytest.mark.parametrize('environ, headers', [
+    ({}, {}),
+    ({}, {'Range': 'bytes=10-99'}),
+    ({'wsgi.file_wrapper': FileWrapper}, {}),
+], ids=['iterator', 'range', 'file_wrapper'])
+def test_served_file_is_released_once_the_response_closes(client, downloader, served_file, environ, headers):
+    for _ in range(2):
+        response = client.get(f'/download/{served_file.name}', headers=headers, environ_overrides=environ)
+        assert response.status_code in (200, 206)
+        response.get_data()
+        response.close()
+    assert not downloader.file_catalog._protected.get('abc_720p')
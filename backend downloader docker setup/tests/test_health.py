@@ -0,0 +1,14 @@
+import threading
+
+
+def test_failed_warm_up_is_reported_by_ready_not_health(client, downloader, monkeypatch):
+    monkeypatch.setattr(downloader, 'warmed', threading.Event())
+    monkeypatch.setitem(downloader.startup, 'error', 'ydl_pool: boom')
+
+    health = client.get('/health')
+    assert health.status_code == 200
+    assert health.get_json()['status'] == 'healthy'
+
+    ready = client.get('/ready')
+    assert ready.status_code == 503
+    assert ready.get_json()['status'] == 'degraded'
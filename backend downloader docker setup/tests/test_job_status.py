@@ -0,0 +1,23 @@
+import time
+import uuid
+
+import app as backend
+
+
+def test_unchanged_listing_polls_keep_queued_jobs_alive(client, downloader, monkeypatch):
+    monkeypatch.setitem(backend.CONFIG, 'JOB_ABANDON_TIMEOUT_SECONDS', 1)
+    monkeypatch.setitem(backend.CONFIG, 'JOB_STORE_HEARTBEAT_SECONDS', 0.1)
+    request_id = str(uuid.uuid4())
+    downloader.job_store.create(request_id, downloader._new_job_entry('video', 'abcdefghijk', '720', 'queued'))
+    downloader._own_job(request_id)
+    try:
+        etag = client.get('/api/status').headers['ETag']
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            assert client.get('/api/status', headers={'If-None-Match': etag}).status_code == 304
+            time.sleep(0.2)
+        downloader._cancel_abandoned_jobs()
+        assert downloader.job_store.cancel_requests([request_id]) == {}
+        assert downloader.job_store.get(request_id)['status'] == 'pending'
+    finally:
+        downloader._update_status(request_id, 'failed', 'Test finished.')
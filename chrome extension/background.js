@@ -11,6 +11,7 @@ const CONFIG = {
  class DownloadManager {
      constructor() {
          this.activeDownloads = {};
+         this.eventStreams = {};
          this.init();
      }
  
@@ -55,7 +56,11 @@ const CONFIG = {
      restartPolling() {
          Object.entries(this.activeDownloads).forEach(([requestId, download]) => {
              if (["pending", "processing", "uploading"].includes(download.status)) {
-                 this.startPolling(requestId, download.title);
+                 if (download.batchId) {
+                     this.subscribeToBatchEvents(download.batchId);
+                 } else {
+                     this.startPolling(requestId, download.title);
+                 }
              }
          });
      }
@@ -86,25 +91,144 @@ const CONFIG = {
          }
      }
  
-     startPolling(requestId, title) {
-         if (this.activeDownloads[requestId]?.pollingInterval) {
-             return;
+     async startBatch(data) {
+         try {
+             const response = await fetch(`${CONFIG.SERVER_URL}/api/download_batch`, {
+                 method: "POST",
+                 headers: { "Content-Type": "application/json" },
+                 body: JSON.stringify(data),
+             });
+             const responseData = await response.json().catch(() => ({}));
+             if (!response.ok || !responseData.success) {
+                 throw new Error(responseData.message || `HTTP ${response.status}: Server error`);
+             }
+             responseData.requestIds.forEach((requestId) => {
+                 this.trackDownload(requestId, null, responseData.batchId);
+             });
+             this.saveDownloads();
+             this.subscribeToBatchEvents(responseData.batchId);
+             return { success: true, batchId: responseData.batchId, count: responseData.requestIds.length };
+         } catch (error) {
+             return { success: false, message: error.message };
          }
+     }
+ 
+     trackDownload(requestId, title, batchId = null) {
          this.activeDownloads[requestId] = {
              status: "pending",
              message: "Request sent, waiting for server...",
              title,
+             batchId,
              timestamp: Date.now(),
              pollingInterval: null,
              download_url: null,
              retryCount: 0,
          };
+     }
+ 
+     startPolling(requestId, title) {
+         if (this.activeDownloads[requestId]?.pollingInterval || this.eventStreams[requestId]) {
+             return;
+         }
+         this.trackDownload(requestId, title);
+         this.saveDownloads();
+         this.subscribeToEvents(requestId);
+     }
+ 
+     startIntervalPolling(requestId) {
+         const download = this.activeDownloads[requestId];
+         if (!download || download.pollingInterval) return;
          this.pollStatus(requestId);
-         const intervalId = setInterval(() => this.pollStatus(requestId), CONFIG.POLL_INTERVALS.initial);
-         this.activeDownloads[requestId].pollingInterval = intervalId;
+         download.pollingInterval = setInterval(() => this.pollStatus(requestId), CONFIG.POLL_INTERVALS.initial);
          this.saveDownloads();
      }
  
+     // Reads a Server-Sent Events stream until it ends; returns false if it was aborted
+     async readEventStream(streamKey, url, onEvent) {
+         if (this.eventStreams[streamKey]) return false;
+         const controller = new AbortController();
+         this.eventStreams[streamKey] = controller;
+         try {
+             const response = await fetch(url, {
+                 signal: controller.signal,
+                 headers: { Accept: "text/event-stream" },
+             });
+             if (response.status === 404) {
+                 onEvent("not_found", null);
+                 return true;
+             }
+             if (!response.ok || !response.body) {
+                 throw new Error(`HTTP ${response.status}`);
+             }
+             const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+             let buffer = "";
+             while (true) {
+                 const { value, done } = await reader.read();
+                 if (done) break;
+                 buffer += value;
+                 let boundary;
+                 while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+                     const { eventName, data } = this.parseServerEvent(buffer.slice(0, boundary));
+                     buffer = buffer.slice(boundary + 2);
+                     onEvent(eventName, data);
+                 }
+             }
+         } catch (error) {
+             if (error.name === "AbortError") return false;
+             console.warn(`Event stream ${streamKey} failed, falling back to polling:`, error.message);
+         } finally {
+             delete this.eventStreams[streamKey];
+         }
+         return true;
+     }
+ 
+     parseServerEvent(rawEvent) {
+         let eventName = "message";
+         const dataLines = [];
+         for (const line of rawEvent.split("\n")) {
+             if (line.startsWith("event:")) eventName = line.slice(6).trim();
+             else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+         }
+         return { eventName, data: dataLines.length ? JSON.parse(dataLines.join("\n")) : null };
+     }
+ 
+     isSettled(download) {
+         return ["complete", "failed", "not_found", "error"].includes(download.status);
+     }
+ 
+     async subscribeToEvents(requestId) {
+         const ended = await this.readEventStream(requestId, `${CONFIG.SERVER_URL}/api/events/${requestId}`, (eventName, data) => {
+             if (eventName === "not_found") {
+                 this.handleNotFound(requestId);
+             } else if (eventName === "status" && data) {
+                 this.updateDownloadStatus(requestId, data);
+             }
+         });
+         const download = this.activeDownloads[requestId];
+         if (ended && download && !this.isSettled(download)) {
+             this.startIntervalPolling(requestId);
+         }
+     }
+ 
+     // One stream for every item of a batch instead of one per download
+     async subscribeToBatchEvents(batchId) {
+         const itemIds = () => Object.keys(this.activeDownloads).filter((id) => this.activeDownloads[id].batchId === batchId);
+         const ended = await this.readEventStream(`batch:${batchId}`, `${CONFIG.SERVER_URL}/api/events/batch/${batchId}`, (eventName, data) => {
+             if (eventName === "not_found") {
+                 itemIds().forEach((requestId) => this.handleNotFound(requestId));
+             } else if (eventName === "status" && data) {
+                 this.updateDownloadStatus(data.requestId, data);
+             } else if (eventName === "batch" && data && ["complete", "failed"].includes(data.status)) {
+                 this.notifyBatch(data);
+             }
+         });
+         if (ended) {
+             itemIds()
+                 .filter((requestId) => !this.isSettled(this.activeDownloads[requestId]))
+                 .forEach((requestId) => this.startIntervalPolling(requestId));
+         }
+     }
+ 
      async pollStatus(requestId) {
          const download = this.activeDownloads[requestId];
          if (!download) return;
@@ -136,6 +260,9 @@ const CONFIG = {
          download.download_url = data.download_url;
          download.file_size_mb = data.file_size_mb;
          download.type = data.type; // Add type tracking
+         download.title = download.title || data.title;
+         download.progress = data.progress;
+         download.stream_url = data.stream_url || null;
          download.retryCount = 0;
  
          if (data.status === "processing" || data.status === "uploading") {
@@ -143,7 +270,7 @@ const CONFIG = {
          }
          if (["complete", "failed"].includes(data.status)) {
              this.stopPolling(requestId);
-             this.notifyUser(requestId, data.status);
+             if (!download.batchId) this.notifyUser(requestId, data.status);
          }
          this.saveDownloads();
      }
@@ -177,6 +304,7 @@ const CONFIG = {
      }
  
      stopPolling(requestId) {
+         this.eventStreams[requestId]?.abort();
          const download = this.activeDownloads[requestId];
          if (download?.pollingInterval) {
              clearInterval(download.pollingInterval);
@@ -203,6 +331,18 @@ const CONFIG = {
          });
      }
  
+     notifyBatch(batch) {
+         const { complete, failed } = batch.counts;
+         chrome.notifications.create(`batch:${batch.batch_id}`, {
+             type: "basic",
+             iconUrl: "icon48.png",
+             title: batch.title || "Batch download",
+             message: failed
+                 ? `${complete} of ${batch.total} downloads complete, ${failed} failed.`
+                 : `All ${batch.total} downloads complete!`,
+         });
+     }
+ 
      async clearDownload(requestId) {
          const download = this.activeDownloads[requestId];
          if (download) {
@@ -213,7 +353,7 @@ const CONFIG = {
                     download.download_url
                 ) {
                  try {
-                     const urlParts = download.download_url.split("/");
+                     const urlParts = new URL(download.download_url).pathname.split("/");
                      let filenameFromServer = urlParts[urlParts.length - 1];
                      let decodedFilename = filenameFromServer;
  
@@ -266,6 +406,8 @@ const CONFIG = {
                      request.data.videoId,
                      request.data
                  );
+             case "startBatch":
+                 return await downloadManager.startBatch(request.data);
              case "getStatus":
                  return downloadManager.getStatus();
              case "clearDownload":
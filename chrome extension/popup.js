@@ -16,11 +16,13 @@ document.addEventListener("DOMContentLoaded", function () {
         videoThumbnail: document.getElementById("video-thumbnail"),
         videoDownloadBtn: document.getElementById("video-download-btn"),
         videoResolutionSelect: document.getElementById("video-resolution"),
+        videoPlaylistBtn: document.getElementById("video-playlist-btn"),
         audioContent: document.getElementById("audio-content"),
         audioTitleEl: document.getElementById("audio-title"),
         audioThumbnail: document.getElementById("audio-thumbnail"),
         audioDownloadBtn: document.getElementById("audio-download-btn"),
         audioQualitySelect: document.getElementById("audio-quality"),
+        audioPlaylistBtn: document.getElementById("audio-playlist-btn"),
         downloadsList: document.getElementById("downloads-list"),
         errorMessage: document.getElementById("error-message"),
         loadingIndicator: document.getElementById("loading-indicator"),
@@ -39,6 +41,7 @@ document.addEventListener("DOMContentLoaded", function () {
             this.activeTab = 'video';
             this.videoInfo = null;
             this.isLoadingVideoInfo = false;
+            this.refinementSource = null;
             this.init();
         }
 
@@ -147,7 +150,11 @@ document.addEventListener("DOMContentLoaded", function () {
                         console.log(`VID_INFO_FRONTEND: Attempt ${attempt} for ${videoId} - Data received, success: ${data.success}`);
                         if (data.success) {
                             this.videoInfo = data;
-                            await this.setCachedVideoInfo(videoId, data);
+                            if (data.refinement_token) {
+                                this.followInfoRefinement(videoId, data.refinement_token);
+                            } else {
+                                await this.setCachedVideoInfo(videoId, data);
+                            }
                             this.updateQualityOptions();
                             this.isLoadingVideoInfo = false; 
                             return; 
@@ -181,6 +188,37 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         }
 
+        // Sizes appear once the server knows the duration; exact ones replace the estimates as each format resolves
+        followInfoRefinement(videoId, token) {
+            this.refinementSource?.close();
+            const source = new EventSource(`${CONFIG.SERVER_URL}/api/events/video_info/${token}`);
+            this.refinementSource = source;
+            const apply = (event, done) => {
+                if (this.currentVideoId !== videoId) {
+                    source.close();
+                    return;
+                }
+                const { info } = JSON.parse(event.data);
+                if (info.video_formats || info.audio_formats) {
+                    this.videoInfo = {
+                        ...this.videoInfo,
+                        ...info,
+                        video_formats: { ...this.videoInfo.video_formats, ...info.video_formats },
+                        audio_formats: { ...this.videoInfo.audio_formats, ...info.audio_formats },
+                    };
+                    this.updateQualityOptions();
+                }
+                if (done) {
+                    source.close();
+                    if (info.success) this.setCachedVideoInfo(videoId, this.videoInfo);
+                }
+            };
+            source.addEventListener("partial", (event) => apply(event, false));
+            source.addEventListener("complete", (event) => apply(event, true));
+            source.addEventListener("failed", () => source.close());
+            source.onerror = () => source.close();
+        }
+
         showLoadingInDropdowns() {
             const videoSelect = elements.videoResolutionSelect;
             videoSelect.innerHTML = `
@@ -380,6 +418,12 @@ document.addEventListener("DOMContentLoaded", function () {
             elements.audioTitleEl.textContent = title || `Video ID: ${videoId}`;
             elements.audioThumbnail.src = thumbnailUrl;
             elements.audioDownloadBtn.onclick = () => this.handleDownload(videoId, title, 'audio');
+
+            const playlistMatch = tab.url.match(/[?&]list=([^&#]+)/);
+            [[elements.videoPlaylistBtn, 'video'], [elements.audioPlaylistBtn, 'audio']].forEach(([button, type]) => {
+                button.style.display = playlistMatch ? "inline-block" : "none";
+                button.onclick = playlistMatch ? () => this.handlePlaylistDownload(playlistMatch[1], type) : null;
+            });
             
             this.resetQualityOptions(); 
             this.loadVideoInfo(videoId);
@@ -421,6 +465,35 @@ document.addEventListener("DOMContentLoaded", function () {
             }
         }
 
+        async handlePlaylistDownload(playlistId, type) {
+            const button = type === 'video' ? elements.videoPlaylistBtn : elements.audioPlaylistBtn;
+            const data = { playlistId, type };
+            if (type === 'video') data.resolution = elements.videoResolutionSelect.value;
+            else data.quality = elements.audioQualitySelect.value;
+
+            this.setDownloadButtonState(button, true, "Sending...");
+            this.clearMessage();
+            try {
+                const response = await new Promise((resolve, reject) => {
+                    chrome.runtime.sendMessage({ action: "startBatch", data }, (result) => {
+                        if (chrome.runtime.lastError) reject(new Error(chrome.runtime.lastError.message));
+                        else resolve(result);
+                    });
+                });
+                if (response?.success) {
+                    this.showSuccess(`Playlist queued: ${response.count} downloads. Status below.`);
+                    this.lastDownloadsDataString = null;
+                    this.requestAndUpdateStatus(true);
+                } else {
+                    this.showError(response?.message || "Could not start playlist download");
+                }
+            } catch (error) {
+                this.showError(`Error: ${error.message}`);
+            } finally {
+                this.setDownloadButtonState(button, false, "Playlist");
+            }
+        }
+
         validateInputs(videoId) {
             if (!videoId) {
                 this.showError("Invalid YouTube video URL");
@@ -560,6 +633,13 @@ document.addEventListener("DOMContentLoaded", function () {
                 link.target = "_blank";
                 actionsDiv.appendChild(link);
             }
+            if (download.status === "processing" && download.stream_url) {
+                const streamLink = document.createElement("a");
+                streamLink.href = download.stream_url;
+                streamLink.textContent = "Save While Downloading";
+                streamLink.target = "_blank";
+                actionsDiv.appendChild(streamLink);
+            }
             if (["complete", "failed", "not_found", "error"].includes(download.status)) {
                 const clearButton = this.createClearButton(requestId);
                 actionsDiv.appendChild(clearButton);